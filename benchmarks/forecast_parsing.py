@@ -0,0 +1,68 @@
+"""
+Compares the batch parsing of the OpenWeatherMap forecast items with the item by item parsing.
+
+    PYTHONPATH=src poetry run python benchmarks/forecast_parsing.py
+"""
+
+import random
+import timeit
+from datetime import datetime, timedelta
+
+from weather_companion.weather_station import Forecast, OWMWeatherStation
+
+REPEAT = 5
+
+
+def _client_data(n_items: int) -> dict:
+    start = datetime(2023, 11, 10)
+    items = []
+    for i in range(n_items):
+        items.append(
+            {
+                "dt": int((start + timedelta(hours=3 * i)).timestamp()),
+                "main": {
+                    "temp": random.uniform(-10, 40),
+                    "humidity": random.randint(0, 100),
+                    "feels_like": random.uniform(-10, 40),
+                    "pressure": random.randint(980, 1040),
+                },
+                "wind": {"speed": random.uniform(0, 20), "gust": random.uniform(0, 30), "deg": random.randint(0, 360)},
+                "clouds": {"all": random.randint(0, 100)},
+                "rain": {"3h": random.uniform(0, 5)},
+            }
+        )
+    return {"city": {"timezone": -10800}, "list": items}
+
+
+def _parse_item_by_item(weather_station: OWMWeatherStation, client_data: dict) -> Forecast:
+    location_timezone = weather_station._get_timezone(client_data)
+    forecast = Forecast()
+    for data in weather_station._get_forecast_data(client_data):
+        forecast_datetime = weather_station._get_forecast_datetime(data, location_timezone)
+        weather_state = weather_station._build_weather_state(data)
+        forecast.add(weather_state, forecast_datetime)
+    return forecast
+
+
+def main() -> None:
+    weather_station = OWMWeatherStation(client=None)
+    for n_items in (40, 400, 4000):
+        client_data = _client_data(n_items)
+        assert _parse_item_by_item(weather_station, client_data).get_dates() == (
+            weather_station._build_full_forecast(client_data).get_dates()
+        ), "both paths should parse the same date times"
+        number = max(1, 40000 // n_items)
+        item_by_item = min(
+            timeit.repeat(lambda: _parse_item_by_item(weather_station, client_data), number=number, repeat=REPEAT)
+        )
+        batch = min(
+            timeit.repeat(lambda: weather_station._build_full_forecast(client_data), number=number, repeat=REPEAT)
+        )
+        print(
+            f"{n_items:>5} items: item by item {item_by_item / number * 1e3:8.3f} ms, "
+            f"batch {batch / number * 1e3:8.3f} ms, speedup x{item_by_item / batch:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measures the region queries (proximity filter) of the in memory journal repository: the full scan of the journal
+checking the geodesic distance of every entry, against the query served by the location grid, with the distances
+checked in a vectorized pass, refined with the geodesic near the radius or only spherical.
+
+    PYTHONPATH=src poetry run python benchmarks/journal_region_query.py
+"""
+
+import random
+import timeit
+from datetime import date
+
+from weather_companion.repository import InMemoryJournalRepository
+from weather_companion.weather_journal import (
+    AuthorID,
+    JournalEntry,
+    LocationProximityFilter,
+    Note,
+)
+from weather_companion.weather_station import DistanceAccuracy, Location
+
+JOURNAL_ENTRIES = 100_000
+FULL_SCAN_DISTANCE = 50
+AUTHOR = AuthorID("benchmark")
+
+
+def _repository() -> InMemoryJournalRepository:
+    repository = InMemoryJournalRepository()
+    for entry_id in range(JOURNAL_ENTRIES):
+        # Entries spread over a country, about 1000 km wide
+        location = Location(random.uniform(-40, -30), random.uniform(-65, -55))
+        repository.add(JournalEntry(location=location, date=date(2023, 1, 1), note=Note(f"note {entry_id}")), AUTHOR)
+    return repository
+
+
+def main() -> None:
+    random.seed(0)
+    repository = _repository()
+    center = Location(-34.6, -58.4)
+
+    def full_scan(max_distance: float):
+        return [
+            (entry_id, entry)
+            for entry_id, entry in repository.get_all_entries(AUTHOR)
+            if center.distance_to(entry.location()) <= max_distance
+        ]
+
+    # The full scan takes the same time for any distance, it is measured once
+    start = timeit.default_timer()
+    full_scan_result = full_scan(FULL_SCAN_DISTANCE)
+    full_scan_time = timeit.default_timer() - start
+    assert full_scan_result == repository.query(AUTHOR, LocationProximityFilter(center, FULL_SCAN_DISTANCE))
+    print(f"{JOURNAL_ENTRIES} entries, full scan {full_scan_time * 1000:.0f} ms")
+
+    for max_distance in (10, FULL_SCAN_DISTANCE, 200):
+        for accuracy in DistanceAccuracy:
+            location_filter = LocationProximityFilter(center, max_distance, accuracy)
+            matches = len(repository.query(AUTHOR, location_filter))
+            indexed_time = min(timeit.repeat(lambda: repository.query(AUTHOR, location_filter), number=5, repeat=3)) / 5
+            print(
+                f"{max_distance} km, {accuracy.value} ({matches} matches): indexed {indexed_time * 1000:.2f} ms "
+                f"({full_scan_time / indexed_time:.0f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Measures the latency and throughput of the OpenWeatherMap clients, over HTTP, against the local fake server.
+Networking, JSON decoding and connection pooling are included, no api key nor network access are needed.
+
+    PYTHONPATH=src poetry run python benchmarks/owm_client_latency.py
+"""
+
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from weather_companion.weather_station import AsyncOWMClient, Location, OWMClient
+from weather_companion.weather_station.fake_owm_server import FakeOWMServer
+
+N_REQUESTS = 400
+CONCURRENCY = 8
+SERVER_LATENCY = 0.005
+
+
+def _locations() -> List[Location]:
+    return [Location(latitude=-34 + i / 100, longitude=-58 + i / 100) for i in range(N_REQUESTS)]
+
+
+def _timed(request: Callable[[], dict]) -> float:
+    start = time.perf_counter()
+    request()
+    return time.perf_counter() - start
+
+
+def _report(name: str, latencies: List[float], elapsed: float) -> None:
+    latencies = sorted(latencies)
+    print(
+        f"{name}: {len(latencies) / elapsed:.0f} requests/s, "
+        f"p50 {statistics.median(latencies) * 1000:.1f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms"
+    )
+
+
+def _sync_client(base_url: str, resource: str) -> None:
+    client = OWMClient(api_key="benchmark", base_url=base_url)
+    fetch = client.get_current_state if resource == "weather" else client.get_forecast
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        latencies = list(executor.map(lambda location: _timed(lambda: fetch(location)), _locations()))
+    _report(f"sync client, {resource}", latencies, time.perf_counter() - start)
+
+
+async def _async_client(base_url: str, resource: str) -> None:
+    client = AsyncOWMClient(api_key="benchmark", base_url=base_url)
+    fetch = client.get_current_state if resource == "weather" else client.get_forecast
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def timed(location: Location) -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            await fetch(location)
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(location) for location in _locations()))
+    _report(f"async client, {resource}", latencies, time.perf_counter() - start)
+    await client.aclose()
+
+
+def main() -> None:
+    with FakeOWMServer(latency=SERVER_LATENCY) as server:
+        print(f"{N_REQUESTS} requests, {CONCURRENCY} concurrent, {SERVER_LATENCY * 1000:.0f} ms server latency")
+        for resource in ("weather", "forecast"):
+            _sync_client(server.base_url, resource)
+            asyncio.run(_async_client(server.base_url, resource))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Measures the CPU time per response of the forecast and journal payloads: the pydantic models path
+(domain object to dict, to model, then encoded by FastAPI) against the orjson fast path of app.encoders.
+
+    PYTHONPATH=src poetry run python benchmarks/response_serialization.py
+"""
+
+import json
+import random
+import timeit
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, List, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app import encoders
+from app.model import (
+    Forecast,
+    ForecastItem,
+    Journal,
+    JournalEntry,
+    JournalItem,
+    Location,
+    WeatherState,
+)
+from weather_companion import weather_journal as wj
+from weather_companion import weather_station as ws
+
+FORECAST_ITEMS = 40
+JOURNAL_ENTRIES = 5000
+
+
+def _forecast() -> ws.Forecast:
+    start = datetime(2023, 11, 10, tzinfo=timezone(timedelta(hours=-3)))
+    forecast = ws.Forecast()
+    for i in range(FORECAST_ITEMS):
+        weather_state = ws.WeatherState(
+            temperature=round(random.uniform(-10, 40), 2),
+            humidity=random.randint(0, 100),
+            feels_like=round(random.uniform(-10, 40), 2),
+            pressure=random.randint(980, 1040),
+            wind_speed=round(random.uniform(0, 20), 2),
+            wind_gust=round(random.uniform(0, 30), 2),
+            wind_direction=random.randint(0, 360),
+            clouds=random.randint(0, 100),
+            rain_3h=round(random.uniform(0, 5), 2) if i % 3 else None,
+        )
+        forecast.add(weather_state, start + timedelta(hours=3 * i))
+    return forecast
+
+
+def _journal() -> List[Tuple[int, wj.JournalEntry]]:
+    return [
+        (
+            entry_id,
+            wj.JournalEntry(
+                location=ws.Location(random.uniform(-90, 90), random.uniform(-90, 90)),
+                date=date(2023, 1, 1) + timedelta(days=entry_id % 365),
+                note=wj.Note(f"note number {entry_id} about the weather of the day"),
+            ),
+        )
+        for entry_id in range(JOURNAL_ENTRIES)
+    ]
+
+
+def _models_forecast(location: ws.Location, forecast: ws.Forecast) -> bytes:
+    # The path of the responses before the fast path, FastAPI encodes the returned model with exclude_none
+    items = [
+        ForecastItem(date_time=date_time, weather_state=WeatherState(**weather_state.to_dict()))
+        for date_time, weather_state in forecast
+    ]
+    model = Forecast(forecast=items, location=Location(**location.to_dict()))
+    return _render(model)
+
+
+def _models_journal(journal: List[Tuple[int, wj.JournalEntry]]) -> bytes:
+    items = [
+        JournalItem(
+            id=entry_id,
+            journal_entry=JournalEntry(
+                note=entry.note().content(), date=entry.date(), location=Location(**entry.location().to_dict())
+            ),
+        )
+        for entry_id, entry in journal
+    ]
+    return _render(Journal(entries=items))
+
+
+def _render(model) -> bytes:
+    content = jsonable_encoder(model, exclude_none=True)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def _measure(name: str, models_path: Callable[[], bytes], fast_path: Callable[[], bytes], number: int) -> None:
+    models_time = min(timeit.repeat(models_path, number=number, repeat=5)) / number
+    fast_time = min(timeit.repeat(fast_path, number=number, repeat=5)) / number
+    print(
+        f"{name}: models {models_time * 1e6:.0f} us, fast path {fast_time * 1e6:.0f} us "
+        f"({models_time / fast_time:.1f}x), {len(fast_path())} bytes"
+    )
+
+
+def main() -> None:
+    random.seed(0)
+    location = ws.Location(-34.61, -58.38)
+    forecast = _forecast()
+    journal = _journal()
+
+    _measure(
+        f"forecast of {FORECAST_ITEMS} items",
+        lambda: _models_forecast(location, forecast),
+        lambda: encoders.dumps(encoders.encode_forecast(location, forecast)),
+        number=200,
+    )
+    _measure(
+        f"journal of {JOURNAL_ENTRIES} entries",
+        lambda: _models_journal(journal),
+        lambda: encoders.dumps(encoders.encode_journal(journal)),
+        number=5,
+    )
+
+
+if __name__ == "__main__":
+    main()
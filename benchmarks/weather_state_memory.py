@@ -0,0 +1,78 @@
+"""
+Measures the memory taken by the weather states held in the caches and forecasts.
+
+    PYTHONPATH=src poetry run python benchmarks/weather_state_memory.py
+"""
+
+import random
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from weather_companion.weather_station import Forecast, PackedWeatherState, WeatherState
+
+N_STATES = 100000
+N_FORECASTS = 2000
+FORECAST_ITEMS = 40
+
+
+def _weather_state() -> WeatherState:
+    # Mandatory fields, wind, clouds and rain: a usual OpenWeatherMap state
+    return WeatherState(
+        temperature=round(random.uniform(-10, 40), 2),
+        humidity=random.randint(0, 100),
+        feels_like=round(random.uniform(-10, 40), 2),
+        pressure=random.randint(980, 1040),
+        wind_speed=round(random.uniform(0, 20), 2),
+        wind_direction=random.randint(0, 360),
+        clouds=random.randint(0, 100),
+        rain_3h=round(random.uniform(0, 5), 2),
+    )
+
+
+def _allocated(build: Callable[[], list]) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    values = build()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del values
+    return allocated
+
+
+def _forecast_items() -> list:
+    start = datetime(2023, 11, 10, tzinfo=timezone(timedelta(hours=-3)))
+    return [(start + timedelta(hours=3 * i), _weather_state()) for i in range(FORECAST_ITEMS)]
+
+
+def _columnar_forecast(items: list) -> Forecast:
+    forecast = Forecast()
+    forecast.add_all([weather_state for _, weather_state in items], [date_time for date_time, _ in items])
+    return forecast
+
+
+def main() -> None:
+    states = [_weather_state() for _ in range(N_STATES)]
+    # Copies, so the measured values are allocated inside the measure
+    tuples = _allocated(
+        lambda: [WeatherState._make(float(value) if value is not None else None for value in s) for s in states]
+    )
+    packed = _allocated(lambda: [PackedWeatherState.pack(s) for s in states])
+    print(f"weather state: tuple {tuples / N_STATES:.0f} bytes, packed {packed / N_STATES:.0f} bytes")
+
+    items = [_forecast_items() for _ in range(N_FORECASTS)]
+    tuples = _allocated(
+        lambda: [
+            [(date_time, WeatherState._make(float(v) if v is not None else None for v in s)) for date_time, s in f]
+            for f in items
+        ]
+    )
+    columnar = _allocated(lambda: [_columnar_forecast(f) for f in items])
+    print(
+        f"forecast of {FORECAST_ITEMS} states: tuples {tuples / N_FORECASTS:.0f} bytes, "
+        f"columnar {columnar / N_FORECASTS:.0f} bytes (date times are shared in this measure)"
+    )
+
+
+if __name__ == "__main__":
+    main()
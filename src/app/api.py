@@ -1,8 +1,10 @@
+import contextlib
 from datetime import date, datetime
-from typing import Dict, List, Optional, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
 import fastapi
-from fastapi import Body, Path, Query
+from fastapi import Body, Header, Path, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from weather_companion import repository as repo
@@ -10,30 +12,69 @@ from weather_companion import system as system
 from weather_companion import weather_journal as wj
 from weather_companion import weather_station as ws
 
-from . import utils
+from . import encoders, utils
 from .model import (
     Bookmark,
     Bookmarks,
+    BookmarksWeatherStates,
+    DailyForecast,
     Forecast,
     Journal,
     JournalEntry,
     Location,
+    LocationsBatch,
+    LocationsWeatherStates,
+    StreamedLocationsBatch,
     WeatherState,
 )
 from .user_repository import UserRepository
 
 APIKEY_DESCRIPTION = "user api key"
-
-
-def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
+IF_NONE_MATCH_DESCRIPTION = "etags of the cached responses, the response is 304 without body if one matches"
+# Journal entries and bookmarks are kept in memory, or in a SQLite file that survives the restarts
+MEMORY_REPOSITORY_BACKEND = "memory"
+SQLITE_REPOSITORY_BACKEND = "sqlite"
+DEFAULT_REPOSITORY_PATH = "weather_companion.db"
+
+
+def create_app(
+    weather_client_api_key: str,
+    weather_cache_path: str = None,
+    weather_client_calls_per_minute: float = 60,
+    bookmark_prefetch_interval: float = system.prefetcher.DEFAULT_PREFETCH_INTERVAL,
+    weather_client_base_url: str = ws.owm_client.OWM_BASE_URL,
+    repository_backend: str = MEMORY_REPOSITORY_BACKEND,
+    repository_path: str = DEFAULT_REPOSITORY_PATH,
+) -> fastapi.FastAPI:
     #  # Initialize System
+    weather_companion: system.WeatherCompanion = _initialize_weather_companion_system(
+        weather_client_api_key,
+        weather_cache_path,
+        weather_client_calls_per_minute,
+        weather_client_base_url,
+        repository_backend,
+        repository_path,
+    )
+    user_repository: UserRepository = _initialize_user_repository()
+    # Keeps the weather of the bookmarked locations warm, disabled if the interval is 0
+    bookmark_prefetcher = system.BookmarkPrefetcher(weather_companion, interval=bookmark_prefetch_interval)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: fastapi.FastAPI) -> AsyncIterator[None]:
+        if bookmark_prefetch_interval > 0:
+            bookmark_prefetcher.start()
+        try:
+            yield
+        finally:
+            await bookmark_prefetcher.stop()
+            await weather_companion.aclose()
+
     app = fastapi.FastAPI(
         title="Weather Companion API",
         version="0.1.0",
         description="Api that serves as a weather related info companion for your trips and day to day life",
+        lifespan=lifespan,
     )
-    weather_companion: system.WeatherCompanion = _initialize_weather_companion_system(weather_client_api_key)
-    user_repository: UserRepository = _initialize_user_repository()
 
     ########################################## Health Check #####################################################
 
@@ -50,16 +91,37 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
         response_model_exclude_none=True,
         tags=["Weather"],
         summary="Get current weather state for a specified location",
+        response_class=encoders.ORJSONResponse,
     )
     async def get_current_weather_state(
         lat: float = Query(..., description="coordinate between [-90, 90]"),
         long: float = Query(..., description="coordinate between [-90, 90]"),
         apikey: str = Query(..., description=APIKEY_DESCRIPTION),
+        if_none_match: Optional[str] = Header(None, description=IF_NONE_MATCH_DESCRIPTION),
     ) -> WeatherState:
         _ = utils._validate_user(user_repository=user_repository, apikey=apikey)
         location: ws.Location = utils._deserialize_location(lat, long)
-        weather_state: WeatherState = utils._get_current_weather_state(weather_companion, location)
-        return weather_state
+        weather_state, freshness = await utils._get_current_weather_state(weather_companion, location)
+        # The body only depends on the weather state
+        headers = utils._cache_validators(freshness)
+        if utils._is_not_modified(if_none_match, headers):
+            return fastapi.Response(status_code=304, headers=headers)
+        return encoders.ORJSONResponse(encoders.encode_weather_state(weather_state), headers=headers)
+
+    # Get current weather state for a batch of locations
+    @app.post(
+        "/weather-companion/weather/current/batch",
+        status_code=200,
+        response_model_exclude_none=True,
+        tags=["Weather"],
+        summary="Get current weather state for a batch of locations, with an error per location that failed",
+    )
+    async def get_current_weather_states(
+        batch: LocationsBatch = Body(..., description="locations, nearby ones are fetched once"),
+        apikey: str = Query(..., description=APIKEY_DESCRIPTION),
+    ) -> LocationsWeatherStates:
+        _ = utils._validate_user(user_repository=user_repository, apikey=apikey)
+        return await utils._get_current_weather_states(weather_companion, batch.locations)
 
     # Get weather forecast
     @app.get(
@@ -68,6 +130,7 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
         response_model_exclude_none=True,
         tags=["Weather"],
         summary="Get weather forecast for a specified location and date range",
+        response_class=encoders.ORJSONResponse,
     )
     async def get_weather_forecast(
         lat: float = Query(..., description="coordinate between [-90, 90]"),
@@ -75,11 +138,65 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
         start_date: date = Query(..., description="date in YYYY-MM-DD format"),
         end_date: date = Query(..., description="date in YYYY-MM-DD format"),
         apikey: str = Query(..., description=APIKEY_DESCRIPTION),
+        if_none_match: Optional[str] = Header(None, description=IF_NONE_MATCH_DESCRIPTION),
     ) -> Forecast:
         _ = utils._validate_user(user_repository=user_repository, apikey=apikey)
         location: ws.Location = utils._deserialize_location(lat, long)
-        weather_forecast: ws.Forecast = utils._get_weather_forecast(weather_companion, location, start_date, end_date)
-        return utils._serialize_weather_forecast(location, weather_forecast)
+        weather_forecast, freshness = await utils._get_weather_forecast(
+            weather_companion, location, start_date, end_date
+        )
+        # The body has the requested location
+        headers = utils._cache_validators(freshness, "forecast", location.latitude, location.longitude)
+        if utils._is_not_modified(if_none_match, headers):
+            return fastapi.Response(status_code=304, headers=headers)
+        return encoders.ORJSONResponse(encoders.encode_forecast(location, weather_forecast), headers=headers)
+
+    # Stream the weather forecasts of many locations
+    @app.post(
+        "/weather-companion/weather/forecast/stream",
+        status_code=200,
+        tags=["Weather"],
+        summary="Stream the weather forecasts of a batch of locations, one NDJSON record per location as it is ready",
+        response_class=StreamingResponse,
+    )
+    async def stream_weather_forecasts(
+        batch: StreamedLocationsBatch = Body(..., description="locations, nearby ones are fetched once"),
+        start_date: date = Query(..., description="date in YYYY-MM-DD format"),
+        end_date: date = Query(..., description="date in YYYY-MM-DD format"),
+        apikey: str = Query(..., description=APIKEY_DESCRIPTION),
+    ) -> StreamingResponse:
+        _ = utils._validate_user(user_repository=user_repository, apikey=apikey)
+        records = utils._stream_weather_forecasts(weather_companion, batch.locations, start_date, end_date)
+        return StreamingResponse(records, media_type="application/x-ndjson")
+
+    # Get daily weather forecast
+    @app.get(
+        "/weather-companion/weather/forecast/daily",
+        status_code=200,
+        response_model_exclude_none=True,
+        tags=["Weather"],
+        summary="Get the daily summaries of the weather forecast for a specified location and date range",
+        response_class=encoders.ORJSONResponse,
+    )
+    async def get_daily_weather_forecast(
+        lat: float = Query(..., description="coordinate between [-90, 90]"),
+        long: float = Query(..., description="coordinate between [-90, 90]"),
+        start_date: date = Query(..., description="date in YYYY-MM-DD format"),
+        end_date: date = Query(..., description="date in YYYY-MM-DD format"),
+        apikey: str = Query(..., description=APIKEY_DESCRIPTION),
+        if_none_match: Optional[str] = Header(None, description=IF_NONE_MATCH_DESCRIPTION),
+    ) -> DailyForecast:
+        _ = utils._validate_user(user_repository=user_repository, apikey=apikey)
+        location: ws.Location = utils._deserialize_location(lat, long)
+        weather_forecast, freshness = await utils._get_weather_forecast(
+            weather_companion, location, start_date, end_date
+        )
+        headers = utils._cache_validators(freshness, "daily", location.latitude, location.longitude)
+        if utils._is_not_modified(if_none_match, headers):
+            return fastapi.Response(status_code=304, headers=headers)
+        # Aggregated only when the client does not have the summaries yet
+        daily_forecast: List[ws.DailySummary] = ws.aggregate_daily(weather_forecast)
+        return encoders.ORJSONResponse(encoders.encode_daily_forecast(location, daily_forecast), headers=headers)
 
     ########################################## Journal #########################################################
 
@@ -97,7 +214,7 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
     ) -> int:
         author_id: wj.AuthorID = utils._get_author_for_key(user_repository=user_repository, apikey=apikey)
         journal_entry: wj.JournalEntry = utils._deserialize_journal_entry(journal_entry)
-        id = utils._add_journal_entry(
+        id = await utils._add_journal_entry(
             weather_companion=weather_companion, journal_entry=journal_entry, author_id=author_id
         )
         return id
@@ -109,16 +226,17 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
         response_model_exclude_none=True,
         tags=["Journal"],
         summary="Get a specific entry note from the journal",
+        response_class=encoders.ORJSONResponse,
     )
     async def get_entry(
         entry_id: int = Path(..., description="entry id to get"),
         apikey: str = Query(..., description=APIKEY_DESCRIPTION),
     ) -> JournalEntry:
         author_id: wj.AuthorID = utils._get_author_for_key(user_repository=user_repository, apikey=apikey)
-        journal_entry: wj.JournalEntry = utils._get_journal_entry(
+        journal_entry: wj.JournalEntry = await utils._get_journal_entry(
             weather_companion=weather_companion, entry_id=entry_id, author_id=author_id
         )
-        return utils._serialize_journal_entry(journal_entry)
+        return encoders.ORJSONResponse(encoders.encode_journal_entry(journal_entry))
 
     # Get all filtered journal entries
     @app.get(
@@ -127,6 +245,7 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
         response_model_exclude_none=True,
         tags=["Journal"],
         summary="Get all entry notes from the journal according to the specified filters",
+        response_class=encoders.ORJSONResponse,
     )
     async def get_filtered_entries(
         interval: str = Query(None, description="start_date,end_date in YYYY-MM-DD format"),
@@ -135,9 +254,11 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
         apikey: str = Query(..., description=APIKEY_DESCRIPTION),
     ) -> Journal:
         author_id: wj.AuthorID = utils._get_author_for_key(user_repository=user_repository, apikey=apikey)
-        journal = utils._get_entries(weather_companion=weather_companion, author_id=author_id)
-        filtered_journal = utils._filter_journal(region=region, interval=interval, content=content, journal=journal)
-        return utils._serialize_journal(filtered_journal)
+        entry_filter = utils._journal_filter(region=region, interval=interval, content=content)
+        journal = await utils._get_entries(
+            weather_companion=weather_companion, author_id=author_id, entry_filter=entry_filter
+        )
+        return encoders.ORJSONResponse(encoders.encode_journal(journal))
 
     # Delete a journal entry
     @app.delete(
@@ -152,7 +273,7 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
         apikey: str = Query(..., description=APIKEY_DESCRIPTION),
     ) -> str:
         author_id: wj.AuthorID = utils._get_author_for_key(user_repository=user_repository, apikey=apikey)
-        utils._delete_journal_entry(weather_companion=weather_companion, entry_id=entry_id, author_id=author_id)
+        await utils._delete_journal_entry(weather_companion=weather_companion, entry_id=entry_id, author_id=author_id)
         return "success"
 
     # Update a journal entry
@@ -170,7 +291,7 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
     ) -> JournalEntry:
         author_id: wj.AuthorID = utils._get_author_for_key(user_repository=user_repository, apikey=apikey)
         new_journal_entry = utils._deserialize_journal_entry(journal_entry)
-        utils._update_journal_entry(
+        await utils._update_journal_entry(
             weather_companion=weather_companion,
             entry_id=entry_id,
             author_id=author_id,
@@ -189,9 +310,7 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
     )
     async def get_all_bookmarks(apikey: str = Query(..., description=APIKEY_DESCRIPTION)):
         author_id: wj.AuthorID = utils._get_author_for_key(user_repository=user_repository, apikey=apikey)
-        bookmarks: List[Tuple[wj.Bookmark, ws.Location]] = weather_companion._bookmark_repository.get_all_bookmarks(
-            author_id
-        )
+        bookmarks: List[Tuple[wj.Bookmark, ws.Location]] = await weather_companion.get_bookmarks_async(author_id)
         return utils._serialize_bookmarks(bookmarks=bookmarks)
 
     @app.post(
@@ -207,7 +326,7 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
             lat=bookmark.location.latitude, long=bookmark.location.longitude
         )
         deserialized_bookmark: wj.Bookmark = utils._deserialize_bookmark(bookmark=bookmark)
-        utils._add_bookmark(
+        await utils._add_bookmark(
             weather_companion=weather_companion,
             bookmark=deserialized_bookmark,
             location=deserialized_location,
@@ -228,13 +347,28 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
     ) -> str:
         author_id: wj.AuthorID = utils._get_author_for_key(user_repository=user_repository, apikey=apikey)
         bookmark: repo.Bookmark = repo.Bookmark(name=name)
-        utils._delete_bookmark(
+        await utils._delete_bookmark(
             weather_companion=weather_companion,
             bookmark=bookmark,
             author_id=author_id,
         )
         return "success"
 
+    @app.get(
+        "/weather-companion/bookmarks/weather/current",
+        status_code=200,
+        response_model_exclude_none=True,
+        tags=["Bookmarks"],
+        summary="Get the current weather state for all the location bookmarks",
+    )
+    async def get_current_weather_for_all_bookmarks(
+        apikey: str = Query(..., description=APIKEY_DESCRIPTION)
+    ) -> BookmarksWeatherStates:
+        author_id: wj.AuthorID = utils._get_author_for_key(user_repository=user_repository, apikey=apikey)
+        return await utils._get_current_weather_states_for_bookmarks(
+            weather_companion=weather_companion, author_id=author_id
+        )
+
     @app.get(
         "/weather-companion/bookmarks/{name}/weather/current",
         status_code=200,
@@ -247,7 +381,7 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
     ) -> WeatherState:
         author_id: wj.AuthorID = utils._get_author_for_key(user_repository=user_repository, apikey=apikey)
         bookmark: wj.Bookmark = wj.Bookmark(name=name)
-        weather_state: ws.WeatherState = utils._get_current_weather_state_for_bookmark(
+        weather_state: ws.WeatherState = await utils._get_current_weather_state_for_bookmark(
             weather_companion=weather_companion,
             bookmark=bookmark,
             author_id=author_id,
@@ -257,18 +391,62 @@ def create_app(weather_client_api_key: str) -> fastapi.FastAPI:
     return app
 
 
-def _initialize_weather_companion_system(weather_client_api_key: str):
-    weather_station_client = ws.OWMClient(api_key=weather_client_api_key)
-    weather_station: ws.WeatherStation = ws.OWMWeatherStation(client=weather_station_client)
+def _initialize_weather_companion_system(
+    weather_client_api_key: str,
+    weather_cache_path: str = None,
+    weather_client_calls_per_minute: float = 60,
+    weather_client_base_url: str = ws.owm_client.OWM_BASE_URL,
+    repository_backend: str = MEMORY_REPOSITORY_BACKEND,
+    repository_path: str = DEFAULT_REPOSITORY_PATH,
+):
+    # Sync and async weather stations share the same cache, if a path is given the cache is shared by all
+    # the worker processes. Expired results are served up to 10 minutes more while they are refreshed in background
+    weather_cache: ws.WeatherCache = ws.InMemoryWeatherCache()
+    if weather_cache_path is not None:
+        weather_cache = ws.SQLiteWeatherCache(path=weather_cache_path)
+    # Both clients share the api key quota
+    rate_limiter = ws.RateLimiter(calls_per_minute=weather_client_calls_per_minute)
+    weather_station_client = ws.OWMClient(
+        api_key=weather_client_api_key, rate_limiter=rate_limiter, base_url=weather_client_base_url
+    )
+    weather_station: ws.WeatherStation = ws.CachingWeatherStation(
+        weather_station=ws.OWMWeatherStation(client=weather_station_client, forecast_cache=weather_cache),
+        cache=weather_cache,
+        stale_ttl=600,
+        refresh_ahead=60,
+    )
+    async_weather_station_client = ws.AsyncOWMClient(
+        api_key=weather_client_api_key, rate_limiter=rate_limiter, base_url=weather_client_base_url
+    )
+    async_weather_station: ws.AsyncWeatherStation = ws.AsyncCachingWeatherStation(
+        weather_station=ws.AsyncOWMWeatherStation(client=async_weather_station_client, forecast_cache=weather_cache),
+        cache=weather_cache,
+        stale_ttl=600,
+        refresh_ahead=60,
+    )
+    journal_repository, bookmark_repository = _initialize_repositories(repository_backend, repository_path)
     weather_companion: system.WeatherCompanion = system.WeatherCompanion(
         weather_station=weather_station,
-        journal_repository=repo.InMemoryJournalRepository(),
-        bookmark_repository=repo.InMemoryLocationBookmarkRepository(),
+        async_weather_station=async_weather_station,
+        journal_repository=journal_repository,
+        bookmark_repository=bookmark_repository,
+        weather_cache=weather_cache,
     )
 
     return weather_companion
 
 
+def _initialize_repositories(
+    repository_backend: str, repository_path: str
+) -> Tuple[repo.JournalRepository, repo.LocationBookmarkRepository]:
+    if repository_backend == MEMORY_REPOSITORY_BACKEND:
+        return repo.InMemoryJournalRepository(), repo.InMemoryLocationBookmarkRepository()
+    if repository_backend == SQLITE_REPOSITORY_BACKEND:
+        # Both repositories share the database file
+        return repo.SQLiteJournalRepository(repository_path), repo.SQLiteLocationBookmarkRepository(repository_path)
+    raise ValueError(f"unknown repository backend {repository_backend}")
+
+
 def _initialize_user_repository():
     user_repository: UserRepository = UserRepository()
     user_repository.add_user("test-user-1", "8fdce8a4-7d6b-11ee-b962-0242ac120001")
@@ -285,5 +463,29 @@ weather_client_api_key = os.getenv("WEATHER_CLIENT_API_KEY", None)
 if weather_client_api_key is None:
     raise ValueError("WEATHER_CLIENT_API_KEY environment variable not set")
 
+# optional, file of the weather cache shared by the worker processes
+weather_cache_path = os.getenv("WEATHER_CACHE_PATH", None)
+
+# calls per minute allowed by the OpenWeatherMap plan of the api key
+weather_client_calls_per_minute = float(os.getenv("WEATHER_CLIENT_CALLS_PER_MINUTE", 60))
+
+# seconds between the prefetches of the bookmarked locations weather, 0 disables them
+bookmark_prefetch_interval = float(os.getenv("WEATHER_PREFETCH_INTERVAL", system.prefetcher.DEFAULT_PREFETCH_INTERVAL))
+
+# optional, url of the OpenWeatherMap api, i.e. a local fake server for offline performance tests
+weather_client_base_url = os.getenv("WEATHER_CLIENT_BASE_URL", ws.owm_client.OWM_BASE_URL)
+
+# repositories backend, memory or sqlite, and the database file of the sqlite backend
+repository_backend = os.getenv("REPOSITORY_BACKEND", MEMORY_REPOSITORY_BACKEND)
+repository_path = os.getenv("REPOSITORY_PATH", DEFAULT_REPOSITORY_PATH)
+
 print(weather_client_api_key)
-app = create_app(weather_client_api_key)
+app = create_app(
+    weather_client_api_key,
+    weather_cache_path,
+    weather_client_calls_per_minute,
+    bookmark_prefetch_interval,
+    weather_client_base_url,
+    repository_backend,
+    repository_path,
+)
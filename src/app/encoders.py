@@ -0,0 +1,107 @@
+"""
+Fast path of the responses: the domain objects are written to JSON bytes with orjson, in a single pass.
+They are trusted internal data, so they skip the intermediate dicts, the pydantic models of the api and
+their validation. The JSON is the same as the one of the models (model.py) with the None values excluded.
+
+See benchmarks/response_serialization.py
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import fastapi
+import orjson
+
+from weather_companion import weather_journal as wj
+from weather_companion import weather_station as ws
+
+MANDATORY_FIELDS = ws.WeatherState._fields[:4]
+OPTIONAL_FIELDS = ws.WeatherState._fields[4:]
+
+
+class ORJSONResponse(fastapi.responses.JSONResponse):
+    """
+    JSON response rendered with orjson, content is a structure of primitive values or JSON bytes
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def dumps(content: Any) -> bytes:
+    # Same date times as pydantic: UTC as Z
+    return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+def encode_location(location: ws.Location) -> Dict[str, float]:
+    return {"latitude": float(location.latitude), "longitude": float(location.longitude)}
+
+
+def encode_weather_state(weather_state: ws.WeatherState) -> Dict[str, float]:
+    # Optional fields are left out when missing or 0, as WeatherState.to_dict does
+    encoded = {field: float(value) for field, value in zip(MANDATORY_FIELDS, weather_state)}
+    for field, value in zip(OPTIONAL_FIELDS, weather_state[4:]):
+        if value:
+            encoded[field] = float(value)
+    return encoded
+
+
+def encode_forecast_items(forecast: ws.Forecast) -> List[Dict[str, Any]]:
+    """
+    Encodes the forecast items straight from the forecast columns, without building the weather states
+    """
+    columns = forecast.columns()
+    mandatory = zip(*(columns[field].tolist() for field in MANDATORY_FIELDS))
+    optional = zip(*(columns[field].tolist() for field in OPTIONAL_FIELDS))
+    items = []
+    for date_time, mandatory_values, optional_values in zip(forecast.get_dates(), mandatory, optional):
+        weather_state = dict(zip(MANDATORY_FIELDS, mandatory_values))
+        for field, value in zip(OPTIONAL_FIELDS, optional_values):
+            # Missing values are NaN, the only value not equal to itself
+            if value and value == value:
+                weather_state[field] = value
+        items.append({"date_time": date_time, "weather_state": weather_state})
+    return items
+
+
+def encode_forecast(location: ws.Location, forecast: ws.Forecast) -> Dict[str, Any]:
+    return {"forecast": encode_forecast_items(forecast), "location": encode_location(location)}
+
+
+def encode_daily_forecast(location: ws.Location, daily_forecast: List[ws.DailySummary]) -> Dict[str, Any]:
+    days = []
+    for daily_summary in daily_forecast:
+        day = daily_summary._asdict()
+        if day["max_wind_gust"] is None:
+            del day["max_wind_gust"]
+        days.append(day)
+    return {"days": days, "location": encode_location(location)}
+
+
+def encode_location_forecast(
+    index: int, location: Dict[str, float], forecast: Optional[ws.Forecast], error: Optional[str]
+) -> Dict[str, Any]:
+    encoded = {"index": index, "location": location}
+    if forecast is not None:
+        encoded["forecast"] = encode_forecast_items(forecast)
+    if error is not None:
+        encoded["error"] = error
+    return encoded
+
+
+def encode_journal_entry(journal_entry: wj.JournalEntry) -> Dict[str, Any]:
+    return {
+        "note": journal_entry.note().content(),
+        "date": journal_entry.date(),
+        "location": encode_location(journal_entry.location()),
+    }
+
+
+def encode_journal(journal: List[Tuple[int, wj.JournalEntry]]) -> Dict[str, Any]:
+    return {
+        "entries": [
+            {"id": entry_id, "journal_entry": encode_journal_entry(journal_entry)}
+            for entry_id, journal_entry in journal
+        ]
+    }
@@ -1,7 +1,12 @@
 from datetime import date, datetime
 from typing import List, Optional, Tuple
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+# Max locations of a batch request
+MAX_BATCH_LOCATIONS = 500
+# Max locations of a streamed request, its records are sent as they are ready so it can be larger
+MAX_STREAMED_LOCATIONS = 5000
 
 
 class WeatherState(BaseModel):
@@ -34,6 +39,48 @@ class Forecast(BaseModel):
     location: Location
 
 
+class DailySummary(BaseModel):
+    date: date
+    min_temperature: float
+    max_temperature: float
+    mean_temperature: float
+    rain: float
+    snow: float
+    max_wind_gust: Optional[float] = None
+    weather_states: int
+
+
+class DailyForecast(BaseModel):
+    days: List[DailySummary]
+    location: Location
+
+
+class LocationsBatch(BaseModel):
+    locations: List[Location] = Field(..., max_length=MAX_BATCH_LOCATIONS)
+
+
+class StreamedLocationsBatch(BaseModel):
+    locations: List[Location] = Field(..., max_length=MAX_STREAMED_LOCATIONS)
+
+
+class LocationForecast(BaseModel):
+    # Index of the location in the request, records are streamed in completion order
+    index: int
+    location: Location
+    forecast: Optional[List[ForecastItem]] = None
+    error: Optional[str] = None
+
+
+class LocationWeatherState(BaseModel):
+    location: Location
+    weather_state: Optional[WeatherState] = None
+    error: Optional[str] = None
+
+
+class LocationsWeatherStates(BaseModel):
+    results: List[LocationWeatherState]
+
+
 class JournalEntry(BaseModel):
     note: str
     date: date
@@ -56,3 +103,14 @@ class Bookmark(BaseModel):
 
 class Bookmarks(BaseModel):
     bookmarks: List[Bookmark]
+
+
+class BookmarkWeatherState(BaseModel):
+    name: str
+    location: Location
+    weather_state: Optional[WeatherState] = None
+    error: Optional[str] = None
+
+
+class BookmarksWeatherStates(BaseModel):
+    bookmarks: List[BookmarkWeatherState]
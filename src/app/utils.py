@@ -1,5 +1,6 @@
+import hashlib
 from datetime import date, datetime
-from typing import Dict, List, Optional, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
 import fastapi
 
@@ -8,15 +9,16 @@ from weather_companion import system as system
 from weather_companion import weather_journal as wj
 from weather_companion import weather_station as ws
 
+from . import encoders
 from .model import (
     Bookmark,
     Bookmarks,
-    Forecast,
-    ForecastItem,
-    Journal,
+    BookmarksWeatherStates,
+    BookmarkWeatherState,
     JournalEntry,
-    JournalItem,
     Location,
+    LocationsWeatherStates,
+    LocationWeatherState,
     WeatherState,
 )
 from .user_repository import UserRepository
@@ -34,49 +36,103 @@ def _serialize_location(location: ws.Location) -> Location:
     return Location(**location.to_dict())
 
 
-def _get_current_weather_state(weather_companion: system.WeatherCompanion, location: ws.Location) -> WeatherState:
+async def _get_current_weather_state(
+    weather_companion: system.WeatherCompanion, location: ws.Location
+) -> Tuple[ws.WeatherState, ws.Freshness]:
     try:
-        weather_state: ws.WeatherState = weather_companion.get_current_state(location)
+        weather_state, freshness = await weather_companion.get_current_state_with_freshness_async(location)
     except Exception as e:
         raise fastapi.HTTPException(status_code=400, detail=str(e))
-    return WeatherState(**weather_state.to_dict())
+    return weather_state, freshness
+
 
+async def _get_current_weather_states(
+    weather_companion: system.WeatherCompanion, locations: List[Location]
+) -> LocationsWeatherStates:
+    # Invalid locations get their error, the rest are fetched in one batch
+    results: List[LocationWeatherState] = [None] * len(locations)
+    valid_locations: Dict[int, ws.Location] = {}
+    for index, location in enumerate(locations):
+        try:
+            valid_locations[index] = ws.Location(latitude=location.latitude, longitude=location.longitude)
+        except Exception as e:
+            results[index] = LocationWeatherState(location=location, error=str(e))
 
-def _get_weather_forecast(
+    batch: List[system.LocationWeatherState] = await weather_companion.get_current_states_async(
+        list(valid_locations.values())
+    )
+    for index, result in zip(valid_locations, batch):
+        weather_state = _serialize_weather_state(result.weather_state) if result.weather_state is not None else None
+        results[index] = LocationWeatherState(
+            location=locations[index], weather_state=weather_state, error=result.error
+        )
+    return LocationsWeatherStates(results=results)
+
+
+async def _get_weather_forecast(
     weather_companion: system.WeatherCompanion,
     location: ws.Location,
     start_date: date,
     end_date: date,
-) -> ws.Forecast:
+) -> Tuple[ws.Forecast, ws.Freshness]:
     try:
-        weather_forecast: ws.Forecast = weather_companion.get_forecast(
+        weather_forecast, freshness = await weather_companion.get_forecast_with_freshness_async(
             location=location, start_date=start_date, end_date=end_date
         )
     except Exception as e:
         raise fastapi.HTTPException(status_code=400, detail=str(e))
 
-    return weather_forecast
+    return weather_forecast, freshness
+
+
+def _cache_validators(freshness: ws.Freshness, *representation) -> Dict[str, str]:
+    """
+    Returns the ETag and Cache-Control headers of a response.
+    The etag is derived from the result freshness digest and the representation values the body depends on,
+    so it is known before the result is serialized.
+    """
+    etag_hash = hashlib.blake2b(freshness.digest.encode(), digest_size=16)
+    for value in representation:
+        etag_hash.update(repr(value).encode())
+    return {"ETag": f'"{etag_hash.hexdigest()}"', "Cache-Control": f"max-age={int(freshness.max_age)}"}
+
+
+def _is_not_modified(if_none_match: Optional[str], headers: Dict[str, str]) -> bool:
+    if if_none_match is None:
+        return False
+    # Weak comparison, as required for If-None-Match
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or headers["ETag"] in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
 
 
 def _serialize_weather_state(weather_state: ws.WeatherState) -> WeatherState:
     return WeatherState(**weather_state.to_dict())
 
 
-def _serialize_weather_forecast(location: ws.Location, weather_forecast: ws.Forecast) -> Forecast:
-    serialized_forecast = []
-    for wf in weather_forecast:
-        date_time = wf[0]
-        weather_state = wf[1]
-        forecast_item = ForecastItem(date_time=date_time, weather_state=WeatherState(**weather_state.to_dict()))
-        serialized_forecast.append(forecast_item)
-    return Forecast(forecast=serialized_forecast, location=Location(**location.to_dict()))
+async def _stream_weather_forecasts(
+    weather_companion: system.WeatherCompanion, locations: List[Location], start_date: date, end_date: date
+) -> AsyncIterator[bytes]:
+    # One NDJSON record per location, sent as soon as its forecast is fetched: only the forecasts in flight are held
+    valid_locations: List[ws.Location] = []
+    valid_indexes: List[int] = []
+    for index, location in enumerate(locations):
+        try:
+            valid_locations.append(ws.Location(latitude=location.latitude, longitude=location.longitude))
+            valid_indexes.append(index)
+        except Exception as e:
+            yield encoders.dumps(encoders.encode_location_forecast(index, location.model_dump(), None, str(e))) + b"\n"
+
+    async for result in weather_companion.iter_forecasts_async(valid_locations, start_date, end_date):
+        index = valid_indexes[result.index]
+        record = encoders.encode_location_forecast(index, locations[index].model_dump(), result.forecast, result.error)
+        yield encoders.dumps(record) + b"\n"
 
 
-def _add_journal_entry(
+async def _add_journal_entry(
     weather_companion: system.WeatherCompanion, journal_entry: wj.JournalEntry, author_id: wj.AuthorID
 ) -> int:
     try:
-        id = weather_companion.add_journal_entry(author=author_id, journal_entry=journal_entry)
+        id = await weather_companion.add_journal_entry_async(author=author_id, journal_entry=journal_entry)
     except Exception as e:
         raise fastapi.HTTPException(status_code=400, detail=str(e))
     return id
@@ -94,12 +150,12 @@ def _deserialize_journal_entry(journal_entry: JournalEntry) -> wj.JournalEntry:
     return deserialized_journal_entry
 
 
-def _get_journal_entry(
+async def _get_journal_entry(
     weather_companion: system.WeatherCompanion, entry_id: int, author_id: wj.AuthorID
 ) -> wj.JournalEntry:
     journal_entry: wj.JournalEntry = None
     try:
-        journal_entry: wj.JournalEntry = weather_companion.get_journal_entry(
+        journal_entry: wj.JournalEntry = await weather_companion.get_journal_entry_async(
             author=author_id, journal_entry_id=entry_id
         )
     except Exception as e:
@@ -107,53 +163,35 @@ def _get_journal_entry(
     return journal_entry
 
 
-def _serialize_journal_entry(journal_entry: wj.JournalEntry) -> JournalEntry:
-    serialized_journal_entry = JournalEntry(
-        note=journal_entry.note().content(),
-        date=journal_entry.date(),
-        location=Location(**journal_entry.location().to_dict()),
-    )
-    return serialized_journal_entry
-
-
-def _serialize_journal(journal: List[Tuple[int, wj.JournalEntry]]) -> Journal:
-    serialized_journal = []
-    for item in journal:
-        entry_id = item[0]
-        entry = item[1]
-        location = Location(**entry.location().to_dict())
-        serialized_item = JournalItem(
-            id=entry_id, journal_entry=JournalEntry(note=entry.note().content(), date=entry.date(), location=location)
-        )
-        serialized_journal.append(serialized_item)
-    return Journal(entries=serialized_journal)
-
-
-def _get_entries(
-    weather_companion: system.WeatherCompanion, author_id: wj.AuthorID
+async def _get_entries(
+    weather_companion: system.WeatherCompanion, author_id: wj.AuthorID, entry_filter: Optional[wj.JournalEntryFilter]
 ) -> List[Tuple[int, wj.JournalEntry]]:
     try:
-        journal: List[Tuple[int, JournalEntry]] = weather_companion.get_all_journal_entries(author=author_id)
+        journal: List[Tuple[int, JournalEntry]] = await weather_companion.query_journal_entries_async(
+            author=author_id, entry_filter=entry_filter
+        )
     except Exception as e:
         raise fastapi.HTTPException(status_code=400, detail=str(e))
     return journal
 
 
-def _delete_journal_entry(weather_companion: system.WeatherCompanion, entry_id: int, author_id: wj.AuthorID) -> None:
+async def _delete_journal_entry(
+    weather_companion: system.WeatherCompanion, entry_id: int, author_id: wj.AuthorID
+) -> None:
     try:
-        weather_companion.remove_journal_entry(author=author_id, journal_entry_id=entry_id)
+        await weather_companion.remove_journal_entry_async(author=author_id, journal_entry_id=entry_id)
     except Exception as e:
         raise fastapi.HTTPException(status_code=400, detail=str(e))
 
 
-def _update_journal_entry(
+async def _update_journal_entry(
     weather_companion: system.WeatherCompanion,
     entry_id: int,
     author_id: wj.AuthorID,
     new_journal_entry: wj.JournalEntry,
 ):
     try:
-        weather_companion.update_journal_entry(
+        await weather_companion.update_journal_entry_async(
             journal_entry_id=entry_id, author=author_id, new_journal_entry=new_journal_entry
         )
     except Exception as e:
@@ -174,7 +212,7 @@ def _get_author_for_key(user_repository: UserRepository, apikey: str) -> wj.Auth
     return author_id
 
 
-def _filter_journal(region: str, interval: str, content: str, journal: List[Tuple[int, wj.JournalEntry]]):
+def _journal_filter(region: str, interval: str, content: str) -> Optional[wj.JournalEntryFilter]:
     filters = []
     if content is not None:
         content_filter: wj.JournalEntryFilter = wj.NoteContentFilter(content)
@@ -208,11 +246,9 @@ def _filter_journal(region: str, interval: str, content: str, journal: List[Tupl
         interval_filter: wj.JournalEntryFilter = wj.DateRangeFilter(start_date=start_date, end_date=end_date)
         filters.append(interval_filter)
 
-    and_filter = wj.AndFilter(filters=filters)
-    filtered_journal = [
-        (entry_id, journal_entry) for entry_id, journal_entry in journal if and_filter.condition(journal_entry)
-    ]
-    return filtered_journal
+    if not filters:
+        return None
+    return wj.AndFilter(filters=filters)
 
 
 def _serialize_bookmarks(bookmarks: List[Tuple[repo.Bookmark, ws.Location]]) -> Bookmarks:
@@ -225,33 +261,57 @@ def _serialize_bookmarks(bookmarks: List[Tuple[repo.Bookmark, ws.Location]]) ->
     return Bookmarks(bookmarks=serialized_bookmarks)
 
 
+async def _get_current_weather_states_for_bookmarks(
+    weather_companion: system.WeatherCompanion, author_id: wj.AuthorID
+) -> BookmarksWeatherStates:
+    try:
+        results: List[
+            Tuple[wj.Bookmark, system.LocationWeatherState]
+        ] = await weather_companion.get_current_weather_states_for_bookmarks_async(author=author_id)
+    except Exception as e:
+        raise fastapi.HTTPException(status_code=400, detail=str(e))
+
+    serialized_bookmarks = []
+    for bookmark, result in results:
+        weather_state = _serialize_weather_state(result.weather_state) if result.weather_state is not None else None
+        bookmark_item = BookmarkWeatherState(
+            name=bookmark.name(),
+            location=Location(**result.location.to_dict()),
+            weather_state=weather_state,
+            error=result.error,
+        )
+        serialized_bookmarks.append(bookmark_item)
+    return BookmarksWeatherStates(bookmarks=serialized_bookmarks)
+
+
 def _deserialize_bookmark(bookmark: Bookmark) -> repo.Bookmark:
     deserialized_bookmark = repo.Bookmark(name=bookmark.name)
     return deserialized_bookmark
 
 
-def _add_bookmark(
+async def _add_bookmark(
     weather_companion: system.WeatherCompanion, bookmark: Bookmark, location: ws.Location, author_id: wj.AuthorID
 ):
     try:
-        weather_companion._bookmark_repository.add(bookmark=bookmark, location=location, author_id=author_id)
+        await weather_companion.add_bookmark_async(bookmark=bookmark, location=location, author=author_id)
     except repo.RepositoryError as e:
         raise fastapi.HTTPException(status_code=400, detail=str(e))
 
 
-def _delete_bookmark(weather_companion: system.WeatherCompanion, bookmark: Bookmark, author_id: wj.AuthorID):
+async def _delete_bookmark(weather_companion: system.WeatherCompanion, bookmark: Bookmark, author_id: wj.AuthorID):
     try:
-        weather_companion._bookmark_repository.remove(bookmark=bookmark, author_id=author_id)
+        await weather_companion.remove_bookmark_async(bookmark=bookmark, author=author_id)
     except repo.RepositoryError as e:
         raise fastapi.HTTPException(status_code=400, detail=str(e))
 
 
-def _get_current_weather_state_for_bookmark(
+async def _get_current_weather_state_for_bookmark(
     weather_companion: system.WeatherCompanion, bookmark: repo.Bookmark, author_id: wj.AuthorID
 ) -> ws.WeatherState:
     try:
-        location = weather_companion._bookmark_repository.get(bookmark=bookmark, author_id=author_id)
-        weather_state = weather_companion.get_current_state(location=location)
+        weather_state = await weather_companion.get_current_weather_state_for_bookmark_async(
+            bookmark=bookmark, author=author_id
+        )
     except repo.RepositoryError as e:
         raise fastapi.HTTPException(status_code=400, detail=str(e))
     return weather_state
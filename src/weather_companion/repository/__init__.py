@@ -1,7 +1,8 @@
 from .errors import RepositoryError
-from .journal import InMemoryJournalRepository, JournalRepository
+from .journal import InMemoryJournalRepository, JournalOrder, JournalRepository
 from .location_bookmark import (
     Bookmark,
     InMemoryLocationBookmarkRepository,
     LocationBookmarkRepository,
 )
+from .sqlite import SQLiteJournalRepository, SQLiteLocationBookmarkRepository
@@ -4,16 +4,38 @@ In Memory implementation of the journal repository.
 """
 
 
-from typing import List, Tuple
+import heapq
+import itertools
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
 
 from weather_companion import weather_journal
 
 from .errors import RepositoryError
+from .location_grid import LocationGrid
+
+
+class JournalOrder(Enum):
+    """
+    Order of the journal entries returned by a query
+    """
+
+    # By entry id, i.e. in insertion order
+    OLDEST_FIRST = "oldest_first"
+    NEWEST_FIRST = "newest_first"
+    # By entry date, entries of the same date in insertion order
+    DATE_ASCENDING = "date_ascending"
+    DATE_DESCENDING = "date_descending"
 
 
 class JournalRepository:
     """Interface for a journal repository"""
 
+    # True if the calls can block on I/O or on locks held by other processes, asyncio callers run them in a thread
+    blocking = False
+
     def add(self, entry: weather_journal.JournalEntry, author_id: weather_journal.AuthorID) -> int:
         pass
 
@@ -34,39 +56,71 @@ class JournalRepository:
     def get_all_entries(self, author_id: weather_journal.AuthorID) -> List[Tuple[int, weather_journal.JournalEntry]]:
         pass
 
+    def query(
+        self,
+        author_id: weather_journal.AuthorID,
+        entry_filter: Optional[weather_journal.JournalEntryFilter] = None,
+        limit: Optional[int] = None,
+        order: JournalOrder = JournalOrder.OLDEST_FIRST,
+    ) -> List[Tuple[int, weather_journal.JournalEntry]]:
+        """
+        Gets the entries of an author that match the filter (all of them if None), in the given order,
+        at most limit entries (no limit if None).
+        Implementations translate the filter to their own lookups, this default one filters the entire journal.
+        """
+        entries = self.get_all_entries(author_id)
+        if order == JournalOrder.NEWEST_FIRST:
+            entries = reversed(entries)
+        return _select(entries, entry_filter, limit, order)
+
+    def close(self) -> None:
+        """
+        Releases the resources held by the repository, if any
+        """
+        pass
+
 
 class InMemoryJournalRepository(JournalRepository):
+    """
+    Entries are partitioned per author, each partition maps the entry ids to the entries (in insertion order):
+    single entry operations are O(1) and the journal of an author is listed in O(k) of its own entries.
+    Ids are allocated from a monotonic counter, ids of removed entries are not reused.
+    The locations of each partition are indexed in a grid, so proximity queries only check the entries of the
+    cells near their location.
+    """
+
     def __init__(self):
-        self._container = []
+        self._next_id = 0
+        self._journals: Dict[weather_journal.AuthorID, Dict[int, weather_journal.JournalEntry]] = {}
+        self._location_grids: Dict[weather_journal.AuthorID, LocationGrid] = {}
 
     def add(self, entry: weather_journal.JournalEntry, author_id: weather_journal.AuthorID) -> int:
         """
         Adds the entry to the container and returns the unique assigned id
         """
-        max_id = max([entry[0] for entry in self._container] + [-1])
-        self._container.append([max_id + 1, entry, author_id])
-        return max_id + 1
+        entry_id = self._next_id
+        self._next_id += 1
+        self._journals.setdefault(author_id, {})[entry_id] = entry
+        self._location_grids.setdefault(author_id, LocationGrid()).add(entry_id, entry.location())
+        return entry_id
 
     def get(self, entry_id: int, author_id: weather_journal.AuthorID) -> weather_journal.JournalEntry:
         """
         Gets the entry with the given id from the container
         Throws RepositoryError if value not found
         """
-        for entry in self._container:
-            if entry[0] == entry_id and entry[2] == author_id:
-                return entry[1]
-        raise RepositoryError("Journal entry not found")
+        return self._journal_with_entry(entry_id, author_id)[entry_id]
 
     def remove(self, entry_id: int, author_id: weather_journal.AuthorID) -> None:
         """
         Removes the entry with the given id from the container
         Throws RepositoryError if value not found
         """
-        for entry in self._container:
-            if entry[0] == entry_id and entry[2] == author_id:
-                self._container.remove(entry)
-                return
-        raise RepositoryError("Journal entry not found")
+        journal = self._journal_with_entry(entry_id, author_id)
+        self._location_grids[author_id].remove(entry_id, journal.pop(entry_id).location())
+        if not journal:
+            del self._journals[author_id]
+            del self._location_grids[author_id]
 
     def update(
         self,
@@ -78,18 +132,98 @@ class InMemoryJournalRepository(JournalRepository):
         Updates the entry with the fiven id for an author
         Throws RepositoryError if value not found
         """
-        for entry in self._container:
-            if entry[0] == entry_id and entry[2] == author_id:
-                entry[1] = new_journal_entry
-                return
-        raise RepositoryError("Journal entry not found")
+        journal = self._journal_with_entry(entry_id, author_id)
+        location_grid = self._location_grids[author_id]
+        location_grid.remove(entry_id, journal[entry_id].location())
+        location_grid.add(entry_id, new_journal_entry.location())
+        journal[entry_id] = new_journal_entry
 
     def get_all_entries(self, author_id: weather_journal.AuthorID) -> List[Tuple[int, weather_journal.JournalEntry]]:
         """
         Gets the entire journal for an author
         """
-        journal = []
-        for entry in self._container:
-            if entry[2] == author_id:
-                journal.append((entry[0], entry[1]))
+        return list(self._journals.get(author_id, {}).items())
+
+    def query(
+        self,
+        author_id: weather_journal.AuthorID,
+        entry_filter: Optional[weather_journal.JournalEntryFilter] = None,
+        limit: Optional[int] = None,
+        order: JournalOrder = JournalOrder.OLDEST_FIRST,
+    ) -> List[Tuple[int, weather_journal.JournalEntry]]:
+        """
+        Gets the entries of an author that match the filter, in the given order, at most limit entries.
+        Only the partition of the author is scanned, and the scan stops at the limit when the order is by id.
+        Queries with a proximity filter only scan the entries within its bounding box, found in the location grid,
+        and check their distances in a single vectorized pass.
+        """
+        journal = self._journals.get(author_id, {})
+        proximity_filter, remaining_filter = _split_proximity_filter(entry_filter)
+        if proximity_filter is not None and journal:
+            entry_ids, latitudes, longitudes = self._location_grids[author_id].within(*proximity_filter.bounding_box())
+            entry_ids = np.sort(entry_ids[proximity_filter.contains_all(latitudes, longitudes)])
+            if order == JournalOrder.NEWEST_FIRST:
+                entry_ids = entry_ids[::-1]
+            entries = ((entry_id, journal[entry_id]) for entry_id in entry_ids.tolist())
+            return _select(entries, remaining_filter, limit, order)
+        elif order == JournalOrder.NEWEST_FIRST:
+            # Dicts keep the insertion order, that is the order of the ids
+            entries = reversed(journal.items())
+        else:
+            entries = journal.items()
+        return _select(entries, entry_filter, limit, order)
+
+    def _journal_with_entry(
+        self, entry_id: int, author_id: weather_journal.AuthorID
+    ) -> Dict[int, weather_journal.JournalEntry]:
+        journal = self._journals.get(author_id)
+        if journal is None or entry_id not in journal:
+            raise RepositoryError("Journal entry not found")
         return journal
+
+
+def _split_proximity_filter(
+    entry_filter: Optional[weather_journal.JournalEntryFilter],
+) -> Tuple[Optional[weather_journal.LocationProximityFilter], Optional[weather_journal.JournalEntryFilter]]:
+    """
+    Splits the filter into a proximity filter that every selected entry has to match, if the filter has one,
+    and the filter of the remaining conditions (None if there are none)
+    """
+    if isinstance(entry_filter, weather_journal.LocationProximityFilter):
+        return entry_filter, None
+    if isinstance(entry_filter, weather_journal.AndFilter):
+        child_filters = list(entry_filter.filters())
+        for i, child_filter in enumerate(child_filters):
+            proximity_filter, remaining_child_filter = _split_proximity_filter(child_filter)
+            if proximity_filter is not None:
+                remaining_filters = child_filters[:i] + child_filters[i + 1 :]
+                if remaining_child_filter is not None:
+                    remaining_filters.append(remaining_child_filter)
+                return proximity_filter, weather_journal.AndFilter(remaining_filters) if remaining_filters else None
+    return None, entry_filter
+
+
+def _select(
+    entries: Iterable[Tuple[int, weather_journal.JournalEntry]],
+    entry_filter: Optional[weather_journal.JournalEntryFilter],
+    limit: Optional[int],
+    order: JournalOrder,
+) -> List[Tuple[int, weather_journal.JournalEntry]]:
+    """
+    Selects the entries that match the filter from entries in id order (ascending, or descending for NEWEST_FIRST)
+    """
+    if entry_filter is not None:
+        entries = (entry for entry in entries if entry_filter.condition(entry[1]))
+    if order == JournalOrder.OLDEST_FIRST or order == JournalOrder.NEWEST_FIRST:
+        return list(itertools.islice(entries, limit))
+    descending = order == JournalOrder.DATE_DESCENDING
+    # Entries of the same date are kept in insertion order, in both directions
+    id_sign = -1 if descending else 1
+
+    def date_key(entry: Tuple[int, weather_journal.JournalEntry]):
+        return entry[1].date(), id_sign * entry[0]
+
+    if limit is None:
+        return sorted(entries, key=date_key, reverse=descending)
+    select = heapq.nlargest if descending else heapq.nsmallest
+    return select(limit, entries, key=date_key)
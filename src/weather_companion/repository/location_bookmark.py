@@ -11,6 +11,9 @@ from .errors import RepositoryError
 
 
 class LocationBookmarkRepository:
+    # True if the calls can block on I/O or on locks held by other processes, asyncio callers run them in a thread
+    blocking = False
+
     def add(self, bookmark: Bookmark, location: Location, author_id: AuthorID) -> None:
         pass
 
@@ -23,8 +26,20 @@ class LocationBookmarkRepository:
     def get_all_bookmarks(self, author_id: AuthorID) -> List[Tuple[Bookmark, Location]]:
         pass
 
+    def get_all_locations(self) -> List[Location]:
+        """
+        Gets the locations of the bookmarks of all the authors
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        Releases the resources held by the repository, if any
+        """
+        pass
+
 
-class InMemoryLocationBookmarkRepository:
+class InMemoryLocationBookmarkRepository(LocationBookmarkRepository):
     def __init__(self):
         self._container = []
 
@@ -62,3 +77,9 @@ class InMemoryLocationBookmarkRepository:
         Gets all bookmarks for an author
         """
         return [(entry[0], entry[1]) for entry in self._container if entry[2] == author_id]
+
+    def get_all_locations(self) -> List[Location]:
+        """
+        Gets the locations of the bookmarks of all the authors
+        """
+        return [entry[1] for entry in self._container]
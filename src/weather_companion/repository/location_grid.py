@@ -0,0 +1,84 @@
+"""
+Spatial index of the journal entry locations, a grid of cells of CELL_SIZE degrees.
+The proximity queries only visit the cells that overlap their bounding box, instead of every entry.
+"""
+
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from weather_companion.weather_station import Location
+
+# About 11 km of latitude, a city spans a few cells
+CELL_SIZE = 0.1
+
+Cell = Tuple[int, int]
+
+
+class LocationGrid:
+    """
+    Entry ids bucketed by the grid cell of their location
+    """
+
+    def __init__(self):
+        self._cells: Dict[Cell, Dict[int, Tuple[float, float]]] = {}
+
+    def add(self, entry_id: int, location: Location) -> None:
+        self._cells.setdefault(self._cell(location.latitude, location.longitude), {})[entry_id] = (
+            location.latitude,
+            location.longitude,
+        )
+
+    def remove(self, entry_id: int, location: Location) -> None:
+        cell = self._cell(location.latitude, location.longitude)
+        entries = self._cells[cell]
+        del entries[entry_id]
+        if not entries:
+            del self._cells[cell]
+
+    def within(
+        self, min_latitude: float, max_latitude: float, min_longitude: float, max_longitude: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the ids, latitudes and longitudes of the entries located in the box, in no particular order
+        """
+        min_cell = self._cell(min_latitude, min_longitude)
+        max_cell = self._cell(max_latitude, max_longitude)
+        box_cells = (max_cell[0] - min_cell[0] + 1) * (max_cell[1] - min_cell[1] + 1)
+        if box_cells <= len(self._cells):
+            cells = (
+                self._cells.get((latitude_cell, longitude_cell))
+                for latitude_cell in range(min_cell[0], max_cell[0] + 1)
+                for longitude_cell in range(min_cell[1], max_cell[1] + 1)
+            )
+        else:
+            # Wide boxes over a sparse grid, visiting the occupied cells is cheaper
+            cells = (
+                entries
+                for (latitude_cell, longitude_cell), entries in self._cells.items()
+                if min_cell[0] <= latitude_cell <= max_cell[0] and min_cell[1] <= longitude_cell <= max_cell[1]
+            )
+        entry_ids: List[int] = []
+        coordinates: List[Tuple[float, float]] = []
+        for entries in cells:
+            if entries is not None:
+                entry_ids.extend(entries.keys())
+                coordinates.extend(entries.values())
+        ids = np.array(entry_ids, dtype=np.int64)
+        latitudes, longitudes = np.array(coordinates, dtype=np.float64).reshape(-1, 2).T
+        # The cells on the edges of the box are partially out of it
+        in_box = (
+            (min_latitude <= latitudes)
+            & (latitudes <= max_latitude)
+            & (min_longitude <= longitudes)
+            & (longitudes <= max_longitude)
+        )
+        return ids[in_box], latitudes[in_box], longitudes[in_box]
+
+    def __bool__(self) -> bool:
+        return bool(self._cells)
+
+    @staticmethod
+    def _cell(latitude: float, longitude: float) -> Cell:
+        return math.floor(latitude / CELL_SIZE), math.floor(longitude / CELL_SIZE)
@@ -0,0 +1,473 @@
+"""
+SQLite implementations of the journal and location bookmark repositories.
+The data lives in a local file in WAL mode, it survives the restarts and is shared by every worker process
+of a host. Both repositories can use the same file.
+
+Writes are group committed: a write opens (or joins) a transaction that is committed commit_delay seconds
+later, or as soon as max_batch writes are pending, so a burst of writes pays a single commit.
+A write returns once its group is committed, so it is durable and seen by the other processes when it returns.
+Statements are constant SQL strings, they are prepared once and reused from the statement cache of the connection.
+Journal queries translate their filters to SQL predicates, the ones without a SQL equivalent are evaluated on the
+selected rows.
+"""
+
+import contextlib
+import itertools
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import Any, Callable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from weather_companion.weather_journal import (
+    AndFilter,
+    AuthorID,
+    Bookmark,
+    DateRangeFilter,
+    JournalEntry,
+    JournalEntryFilter,
+    LocationProximityFilter,
+    Note,
+    NoteContentFilter,
+)
+from weather_companion.weather_station import Location
+
+from .errors import RepositoryError
+from .journal import JournalOrder, JournalRepository, _split_proximity_filter
+from .location_bookmark import LocationBookmarkRepository
+
+DEFAULT_COMMIT_DELAY = 0.01
+DEFAULT_MAX_BATCH = 100
+STATEMENT_CACHE_SIZE = 64
+# Rows fetched at once to check their distances in a vectorized pass
+PROXIMITY_BATCH_SIZE = 512
+
+
+class _CommitGroup:
+    """
+    Writes of a transaction, they wait for its commit
+    """
+
+    def __init__(self):
+        self.committed = threading.Event()
+        self.error: Optional[sqlite3.Error] = None
+
+    def wait(self) -> None:
+        self.committed.wait()
+        if self.error is not None:
+            raise RepositoryError(f"Write not committed - {self.error}")
+
+
+class _SQLiteDatabase:
+    """
+    Connection shared by the threads of a process, with the group commit of the writes
+    """
+
+    def __init__(
+        self,
+        path: str,
+        schema: Sequence[str],
+        commit_delay: float,
+        max_batch: int,
+        busy_timeout: float,
+        functions: Optional[Mapping[str, Callable[[Any], Any]]] = None,
+    ):
+        if max_batch < 1:
+            raise ValueError("max batch should be a positive number")
+        self._commit_delay = commit_delay
+        self._max_batch = max_batch
+        self._lock = threading.RLock()
+        self._pending_writes = 0
+        self._commit_timer = None
+        self._commit_group = _CommitGroup()
+        self._connection = sqlite3.connect(
+            path,
+            timeout=busy_timeout,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        for name, function in (functions or {}).items():
+            self._connection.create_function(name, 1, function, deterministic=True)
+        with self._lock:
+            for statement in schema:
+                self._connection.execute(statement)
+
+    def read(self, statement: str, parameters: Sequence[Any] = ()) -> List[tuple]:
+        with self._lock:
+            return self._connection.execute(statement, parameters).fetchall()
+
+    @contextlib.contextmanager
+    def rows(self, statement: str, parameters: Sequence[Any] = ()) -> Iterator[sqlite3.Cursor]:
+        """
+        Gives the cursor of the statement, to fetch the rows one by one until the end of the block
+        """
+        with self._lock:
+            cursor = self._connection.execute(statement, parameters)
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    def write(self, statement: str, parameters: Sequence[Any] = ()) -> sqlite3.Cursor:
+        """
+        Executes the statement in the transaction of the current group, and waits for the group commit
+        Throws RepositoryError if the commit fails, the writes of the group are rolled back
+        """
+        with self._lock:
+            if not self._connection.in_transaction:
+                # Takes the write lock at once, so the other processes wait for it instead of failing mid transaction
+                self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._connection.execute(statement, parameters)
+            except sqlite3.Error:
+                if self._pending_writes == 0:
+                    self._connection.execute("ROLLBACK")
+                raise
+            commit_group = self._commit_group
+            self._pending_writes += 1
+            if self._pending_writes >= self._max_batch or self._commit_delay <= 0:
+                self.commit()
+            elif self._commit_timer is None:
+                self._commit_timer = threading.Timer(self._commit_delay, self.commit)
+                self._commit_timer.daemon = True
+                self._commit_timer.start()
+        # Out of the lock, so the writes of the other threads join the group meanwhile
+        commit_group.wait()
+        return cursor
+
+    def commit(self) -> None:
+        """
+        Commits the pending writes, a commit error is raised to their writers
+        """
+        with self._lock:
+            if self._commit_timer is not None:
+                self._commit_timer.cancel()
+                self._commit_timer = None
+            commit_group, self._commit_group = self._commit_group, _CommitGroup()
+            try:
+                if self._connection.in_transaction:
+                    self._connection.execute("COMMIT")
+            except sqlite3.Error as ex:
+                commit_group.error = ex
+                if self._connection.in_transaction:
+                    self._connection.execute("ROLLBACK")
+            finally:
+                self._pending_writes = 0
+                commit_group.committed.set()
+
+    def close(self) -> None:
+        with self._lock:
+            self.commit()
+            self._connection.close()
+
+
+class SQLiteJournalRepository(JournalRepository):
+    """
+    Journal entries stored in a SQLite file.
+    Entries are indexed by (author, id), by (author, date) and by (author, latitude, longitude), ids are not reused.
+    """
+
+    # Disk I/O, and the writes wait for their group commit and up to busy_timeout for the other processes
+    blocking = True
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS journal_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            author TEXT NOT NULL,
+            date TEXT NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            note TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS journal_entries_author_id ON journal_entries (author, id)",
+        "CREATE INDEX IF NOT EXISTS journal_entries_author_date ON journal_entries (author, date)",
+        # Range of latitudes of a bounding box, the longitudes are checked on the index entries
+        "CREATE INDEX IF NOT EXISTS journal_entries_author_location ON journal_entries (author, latitude, longitude)",
+    )
+    ORDER_BY = {
+        JournalOrder.OLDEST_FIRST: "id",
+        JournalOrder.NEWEST_FIRST: "id DESC",
+        JournalOrder.DATE_ASCENDING: "date, id",
+        JournalOrder.DATE_DESCENDING: "date DESC, id",
+    }
+
+    def __init__(
+        self,
+        path: str,
+        commit_delay: float = DEFAULT_COMMIT_DELAY,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        busy_timeout: float = 5.0,
+    ):
+        """
+        path is the SQLite database file, created if it does not exist
+        commit_delay is the number of seconds writes wait to be committed together, 0 commits every write
+        busy_timeout is the number of seconds to wait for the locks held by other processes
+        """
+        # Notes are searched with the case folding of python, the lower of SQLite only folds ASCII letters
+        functions = {"python_lower": str.lower}
+        self._database = _SQLiteDatabase(path, self.SCHEMA, commit_delay, max_batch, busy_timeout, functions)
+
+    def add(self, entry: JournalEntry, author_id: AuthorID) -> int:
+        """
+        Adds the entry and returns the unique assigned id
+        """
+        location = entry.location()
+        cursor = self._database.write(
+            "INSERT INTO journal_entries (author, date, latitude, longitude, note) VALUES (?, ?, ?, ?, ?)",
+            (author_id.id(), entry.date().isoformat(), location.latitude, location.longitude, entry.note().content()),
+        )
+        return cursor.lastrowid
+
+    def get(self, entry_id: int, author_id: AuthorID) -> JournalEntry:
+        """
+        Gets the entry with the given id
+        Throws RepositoryError if value not found
+        """
+        rows = self._database.read(
+            "SELECT id, date, latitude, longitude, note FROM journal_entries WHERE author = ? AND id = ?",
+            (author_id.id(), entry_id),
+        )
+        if not rows:
+            raise RepositoryError("Journal entry not found")
+        return self._journal_entry(rows[0])
+
+    def remove(self, entry_id: int, author_id: AuthorID) -> None:
+        """
+        Removes the entry with the given id
+        Throws RepositoryError if value not found
+        """
+        cursor = self._database.write(
+            "DELETE FROM journal_entries WHERE author = ? AND id = ?", (author_id.id(), entry_id)
+        )
+        if cursor.rowcount == 0:
+            raise RepositoryError("Journal entry not found")
+
+    def update(self, entry_id: int, author_id: AuthorID, new_journal_entry: JournalEntry) -> None:
+        """
+        Updates the entry with the given id for an author
+        Throws RepositoryError if value not found
+        """
+        location = new_journal_entry.location()
+        cursor = self._database.write(
+            "UPDATE journal_entries SET date = ?, latitude = ?, longitude = ?, note = ? WHERE author = ? AND id = ?",
+            (
+                new_journal_entry.date().isoformat(),
+                location.latitude,
+                location.longitude,
+                new_journal_entry.note().content(),
+                author_id.id(),
+                entry_id,
+            ),
+        )
+        if cursor.rowcount == 0:
+            raise RepositoryError("Journal entry not found")
+
+    def get_all_entries(self, author_id: AuthorID) -> List[Tuple[int, JournalEntry]]:
+        """
+        Gets the entire journal for an author, in insertion order
+        """
+        rows = self._database.read(
+            "SELECT id, date, latitude, longitude, note FROM journal_entries WHERE author = ? ORDER BY id",
+            (author_id.id(),),
+        )
+        return [(row[0], self._journal_entry(row)) for row in rows]
+
+    def query(
+        self,
+        author_id: AuthorID,
+        entry_filter: Optional[JournalEntryFilter] = None,
+        limit: Optional[int] = None,
+        order: JournalOrder = JournalOrder.OLDEST_FIRST,
+    ) -> List[Tuple[int, JournalEntry]]:
+        """
+        Gets the entries of an author that match the filter, in the given order, at most limit entries.
+        Date ranges use the (author, date) index, proximities are narrowed to their bounding box with the
+        (author, latitude, longitude) index.
+        The distances of the rows in the box are checked in vectorized batches, as the rows are fetched.
+        """
+        proximity_filter, remaining_filter = _split_proximity_filter(entry_filter)
+        predicates, parameters, residual_filters = _journal_predicates(remaining_filter)
+        if proximity_filter is not None:
+            predicates += ["latitude BETWEEN ? AND ?", "longitude BETWEEN ? AND ?"]
+            parameters += list(proximity_filter.bounding_box())
+        statement = (
+            "SELECT id, date, latitude, longitude, note FROM journal_entries WHERE "
+            + " AND ".join(["author = ?"] + predicates)
+            + " ORDER BY "
+            + self.ORDER_BY[order]
+        )
+        parameters = [author_id.id()] + parameters
+        if limit is not None and not residual_filters and proximity_filter is None:
+            statement += " LIMIT ?"
+            parameters.append(limit)
+        with self._database.rows(statement, parameters) as rows:
+            if proximity_filter is not None:
+                rows = _rows_within(rows, proximity_filter)
+            entries = ((row[0], self._journal_entry(row)) for row in rows)
+            if residual_filters:
+                entries = (entry for entry in entries if all(filter.condition(entry[1]) for filter in residual_filters))
+            return list(itertools.islice(entries, limit))
+
+    def close(self) -> None:
+        """
+        Commits the pending writes and closes the database
+        """
+        self._database.close()
+
+    @staticmethod
+    def _journal_entry(row: tuple) -> JournalEntry:
+        _, entry_date, latitude, longitude, note = row
+        # Dates are stored in ISO format, date times have a time part
+        parsed_date = datetime.fromisoformat(entry_date) if "T" in entry_date else date.fromisoformat(entry_date)
+        return JournalEntry(location=Location(latitude, longitude), date=parsed_date, note=Note(note))
+
+
+def _journal_predicates(
+    entry_filter: Optional[JournalEntryFilter],
+) -> Tuple[List[str], List[Any], List[JournalEntryFilter]]:
+    """
+    Translates a filter to the SQL predicates on the journal_entries table and their parameters,
+    and returns the filters that still have to be evaluated on the selected entries
+    """
+    if entry_filter is None:
+        return [], [], []
+    if isinstance(entry_filter, AndFilter):
+        predicates, parameters, residual_filters = [], [], []
+        for child_filter in entry_filter.filters():
+            child_predicates, child_parameters, child_residual_filters = _journal_predicates(child_filter)
+            predicates += child_predicates
+            parameters += child_parameters
+            residual_filters += child_residual_filters
+        return predicates, parameters, residual_filters
+    if isinstance(entry_filter, DateRangeFilter) and _is_date(entry_filter.start_date(), entry_filter.end_date()):
+        # ISO dates are ordered as their text
+        return (
+            ["date >= ?", "date <= ?"],
+            [entry_filter.start_date().isoformat(), entry_filter.end_date().isoformat()],
+            [],
+        )
+    if isinstance(entry_filter, NoteContentFilter):
+        return ["instr(python_lower(note), ?) > 0"], [entry_filter.content().lower().strip()], []
+    if isinstance(entry_filter, LocationProximityFilter):
+        # The box has the locations within the distance and some more, the distance is checked on the box ones
+        return (
+            ["latitude BETWEEN ? AND ?", "longitude BETWEEN ? AND ?"],
+            list(entry_filter.bounding_box()),
+            [entry_filter],
+        )
+    return [], [], [entry_filter]
+
+
+def _rows_within(cursor: sqlite3.Cursor, proximity_filter: LocationProximityFilter) -> Iterator[tuple]:
+    """
+    Yields the journal_entries rows of the cursor located within the distance of the filter
+    """
+    while True:
+        rows = cursor.fetchmany(PROXIMITY_BATCH_SIZE)
+        if not rows:
+            return
+        latitudes = [row[2] for row in rows]
+        longitudes = [row[3] for row in rows]
+        yield from itertools.compress(rows, proximity_filter.contains_all(latitudes, longitudes).tolist())
+
+
+def _is_date(*values: Any) -> bool:
+    # Date times are also dates, their ISO text has a time part and a timezone
+    return all(isinstance(value, date) and not isinstance(value, datetime) for value in values)
+
+
+class SQLiteLocationBookmarkRepository(LocationBookmarkRepository):
+    """
+    Location bookmarks stored in a SQLite file, indexed by (author, bookmark name)
+    """
+
+    # Disk I/O, and the writes wait for their group commit and up to busy_timeout for the other processes
+    blocking = True
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS location_bookmarks (
+            author TEXT NOT NULL,
+            name TEXT NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            PRIMARY KEY (author, name)
+        )
+        """,
+    )
+
+    def __init__(
+        self,
+        path: str,
+        commit_delay: float = DEFAULT_COMMIT_DELAY,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        busy_timeout: float = 5.0,
+    ):
+        """
+        path is the SQLite database file, created if it does not exist
+        commit_delay is the number of seconds writes wait to be committed together, 0 commits every write
+        busy_timeout is the number of seconds to wait for the locks held by other processes
+        """
+        self._database = _SQLiteDatabase(path, self.SCHEMA, commit_delay, max_batch, busy_timeout)
+
+    def add(self, bookmark: Bookmark, location: Location, author_id: AuthorID) -> None:
+        """
+        Adds the bookmark
+        Throws RepositoryError if the author already has a bookmark with the same name
+        """
+        try:
+            self._database.write(
+                "INSERT INTO location_bookmarks (author, name, latitude, longitude) VALUES (?, ?, ?, ?)",
+                (author_id.id(), bookmark.name(), location.latitude, location.longitude),
+            )
+        except sqlite3.IntegrityError:
+            raise RepositoryError("Bookmark already exists")
+
+    def get(self, bookmark: Bookmark, author_id: AuthorID) -> Location:
+        """
+        Gets the location of the bookmark
+        """
+        rows = self._database.read(
+            "SELECT latitude, longitude FROM location_bookmarks WHERE author = ? AND name = ?",
+            (author_id.id(), bookmark.name()),
+        )
+        if not rows:
+            raise RepositoryError("Bookmark not found")
+        return Location(*rows[0])
+
+    def remove(self, bookmark: Bookmark, author_id: AuthorID) -> None:
+        """
+        Removes the bookmark
+        """
+        cursor = self._database.write(
+            "DELETE FROM location_bookmarks WHERE author = ? AND name = ?", (author_id.id(), bookmark.name())
+        )
+        if cursor.rowcount == 0:
+            raise RepositoryError("Bookmark not found")
+
+    def get_all_bookmarks(self, author_id: AuthorID) -> List[Tuple[Bookmark, Location]]:
+        """
+        Gets all bookmarks for an author, in insertion order
+        """
+        rows = self._database.read(
+            "SELECT name, latitude, longitude FROM location_bookmarks WHERE author = ? ORDER BY rowid",
+            (author_id.id(),),
+        )
+        return [(Bookmark(name), Location(latitude, longitude)) for name, latitude, longitude in rows]
+
+    def get_all_locations(self) -> List[Location]:
+        """
+        Gets the locations of the bookmarks of all the authors
+        """
+        rows = self._database.read("SELECT latitude, longitude FROM location_bookmarks ORDER BY rowid")
+        return [Location(latitude, longitude) for latitude, longitude in rows]
+
+    def close(self) -> None:
+        """
+        Commits the pending writes and closes the database
+        """
+        self._database.close()
@@ -1 +1,7 @@
-from .system import WeatherCompanion, WeatherCompanionError
+from .prefetcher import BookmarkPrefetcher
+from .system import (
+    LocationForecast,
+    LocationWeatherState,
+    WeatherCompanion,
+    WeatherCompanionError,
+)
@@ -0,0 +1,126 @@
+"""
+Keeps the weather of the bookmarked locations warm in the weather station caches.
+Every interval the bookmarked locations are collapsed into grid cells and their current state and forecast
+are read, with prefetch priority: the reads fill the missing cache entries and refresh the ones about to expire,
+so the bookmark reads of the users hit warm data.
+"""
+
+import asyncio
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+from weather_companion.weather_station import Location, Priority, request_priority
+
+from .system import WeatherCompanion, WeatherCompanionError
+
+DEFAULT_PREFETCH_INTERVAL = 300
+DEFAULT_MAX_CELLS_PER_CYCLE = 50
+DEFAULT_PREFETCH_PRECISION = 2
+DEFAULT_PREFETCH_CONCURRENCY = 4
+# OpenWeatherMap forecasts cover 5 days
+DEFAULT_FORECAST_DAYS = 5
+
+
+class BookmarkPrefetcher:
+    """
+    Asyncio scheduler that prefetches the weather of the bookmarked locations.
+    Each cycle reads up to max_cells_per_cycle cells (two upstream calls at most per cell), the quota budget
+    of the prefetches. When there are more cells, the next cycle continues where the previous one stopped.
+    """
+
+    def __init__(
+        self,
+        weather_companion: WeatherCompanion,
+        interval: float = DEFAULT_PREFETCH_INTERVAL,
+        max_cells_per_cycle: int = DEFAULT_MAX_CELLS_PER_CYCLE,
+        precision: int = DEFAULT_PREFETCH_PRECISION,
+        max_concurrency: int = DEFAULT_PREFETCH_CONCURRENCY,
+        forecast_days: int = DEFAULT_FORECAST_DAYS,
+    ):
+        """
+        interval is in seconds, it should be shorter than the cache ttls to keep the entries warm
+        precision should be the one of the caching weather station, so cells match its cache keys
+        """
+        if max_cells_per_cycle < 1:
+            raise ValueError("max cells per cycle should be a positive number")
+        self._weather_companion = weather_companion
+        self._interval = interval
+        self._max_cells_per_cycle = max_cells_per_cycle
+        self._precision = precision
+        self._max_concurrency = max_concurrency
+        self._forecast_days = forecast_days
+        self._next_cell = 0
+        self._task = None
+
+    def start(self) -> None:
+        """
+        Starts prefetching in background, must be called from the event loop
+        """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stops prefetching, the prefetches in flight are cancelled
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def prefetch(self) -> Tuple[int, int]:
+        """
+        Runs a prefetch cycle, returns the number of cells read and the number that failed
+        """
+        with request_priority(Priority.PREFETCH):
+            cells = await self._next_cells()
+            semaphore = asyncio.Semaphore(self._max_concurrency)
+
+            async def prefetch_cell(cell: Location) -> bool:
+                async with semaphore:
+                    return await self._prefetch_cell(cell)
+
+            results = await asyncio.gather(*(prefetch_cell(cell) for cell in cells))
+        return len(cells), results.count(False)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.prefetch()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Unexpected errors (i.e. the bookmark repository) must not stop the scheduler
+                pass
+            await asyncio.sleep(self._interval)
+
+    async def _prefetch_cell(self, cell: Location) -> bool:
+        today = date.today()
+        try:
+            await self._weather_companion.get_current_state_async(cell)
+            await self._weather_companion.get_forecast_async(cell, today, today + timedelta(days=self._forecast_days))
+        except WeatherCompanionError:
+            return False
+        return True
+
+    async def _next_cells(self) -> List[Location]:
+        cells = self._cells(await self._weather_companion.get_bookmarked_locations_async())
+        if len(cells) <= self._max_cells_per_cycle:
+            self._next_cell = 0
+            return cells
+
+        # Round robin over the cells, within the budget of the cycle
+        start = self._next_cell % len(cells)
+        selected = (cells + cells)[start : start + self._max_cells_per_cycle]
+        self._next_cell = start + self._max_cells_per_cycle
+        return selected
+
+    def _cells(self, locations: List[Location]) -> List[Location]:
+        cells: Dict[Tuple[float, float], Location] = {}
+        for location in locations:
+            cell = location.rounded(self._precision)
+            cells.setdefault((cell.latitude, cell.longitude), cell)
+        return list(cells.values())
@@ -1,18 +1,32 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-from typing import List, Tuple
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
 
 from weather_companion.repository import (
+    JournalOrder,
     JournalRepository,
     LocationBookmarkRepository,
     RepositoryError,
 )
-from weather_companion.weather_journal import AuthorID, Bookmark, JournalEntry
+from weather_companion.weather_journal import (
+    AuthorID,
+    Bookmark,
+    JournalEntry,
+    JournalEntryFilter,
+)
 from weather_companion.weather_station import (
+    AsyncWeatherStation,
+    DailySummary,
     Forecast,
+    Freshness,
     Location,
+    WeatherCache,
     WeatherState,
     WeatherStation,
     WeatherStationError,
+    aggregate_daily,
 )
 
 
@@ -28,14 +42,48 @@ class WeatherCompanionError(Exception):
         super().__init__(message)
 
 
+# Batches of locations are fetched once per grid cell of this precision (~1km), with this many fetches in flight
+DEFAULT_BATCH_PRECISION = 2
+DEFAULT_BATCH_CONCURRENCY = 20
+
+
+class LocationWeatherState(NamedTuple):
+    """
+    Result of a location in a batch, the weather state or the error message
+    """
+
+    location: Location
+    weather_state: Optional[WeatherState] = None
+    error: Optional[str] = None
+
+
+class LocationForecast(NamedTuple):
+    """
+    Result of a location in a streamed batch, its index in the batch and the forecast or the error message
+    """
+
+    index: int
+    location: Location
+    forecast: Optional[Forecast] = None
+    error: Optional[str] = None
+
+
 class WeatherCompanion:
     def __init__(
         self,
         weather_station: WeatherStation,
         journal_repository: JournalRepository,
         bookmark_repository: LocationBookmarkRepository,
+        async_weather_station: AsyncWeatherStation = None,
+        weather_cache: WeatherCache = None,
     ):
+        """
+        async_weather_station is optional, if not given the async methods run the weather station in a thread
+        weather_cache is optional, the cache shared by the weather stations, it is closed after them
+        """
         self._weather_station = weather_station
+        self._async_weather_station = async_weather_station
+        self._weather_cache = weather_cache
         self._journal_repository = journal_repository
         self._bookmark_repository = bookmark_repository
 
@@ -65,6 +113,215 @@ class WeatherCompanion:
             raise WeatherCompanionError("Unable to get weather forecast") from ex
         return forecast
 
+    def get_daily_forecast(self, location: Location, start_date: date, end_date: date) -> List[DailySummary]:
+        """
+        Gets the daily summaries (temperature range, rain, snow, gusts) of the weather forecast
+        for a given location for a given date range, days are in the timezone of the location
+        Throws WeatherCompanionError if the weather station is unable to provide the weather forecast.
+        """
+        return aggregate_daily(self.get_forecast(location, start_date, end_date))
+
+    def get_current_states(
+        self,
+        locations: List[Location],
+        precision: int = DEFAULT_BATCH_PRECISION,
+        max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    ) -> List[LocationWeatherState]:
+        """
+        Gets the current weather state of each location, in the same order.
+        Locations in the same grid cell of the given precision are fetched once, up to max_concurrency at a time.
+        Errors are returned per location.
+        """
+        cells = self._batch_cells(locations, precision)
+        if not cells:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(cells))) as executor:
+            results = dict(zip(cells, executor.map(self._get_cell_current_state, cells.values())))
+        return self._batch_results(locations, precision, results)
+
+    async def get_current_state_async(self, location: Location) -> WeatherState:
+        """
+        Asyncio version of get_current_state, does not block the event loop.
+        Throws WeatherCompanionError if the weather station is unable to provide the weather state.
+        """
+        try:
+            if self._async_weather_station is not None:
+                weather_state = await self._async_weather_station.get_current_state(location)
+            else:
+                weather_state = await self._run_in_thread(self._weather_station.get_current_state, location)
+        except WeatherStationError as ex:
+            raise WeatherCompanionError("Unable to get current weather state") from ex
+        return weather_state
+
+    async def get_forecast_async(self, location: Location, start_date: date, end_date: date) -> Forecast:
+        """
+        Asyncio version of get_forecast, does not block the event loop.
+        Throws WeatherCompanionError if the weather station is unable to provide the weather forecast.
+        """
+        try:
+            if self._async_weather_station is not None:
+                forecast = await self._async_weather_station.get_forecast(location, start_date, end_date)
+            else:
+                forecast = await self._run_in_thread(self._weather_station.get_forecast, location, start_date, end_date)
+        except WeatherStationError as ex:
+            raise WeatherCompanionError("Unable to get weather forecast") from ex
+        return forecast
+
+    async def get_current_state_with_freshness_async(self, location: Location) -> Tuple[WeatherState, Freshness]:
+        """
+        Same as get_current_state_async, also returns the freshness of the weather state for conditional requests
+        """
+        try:
+            if self._async_weather_station is not None:
+                return await self._async_weather_station.get_current_state_with_freshness(location)
+            return await self._run_in_thread(self._weather_station.get_current_state_with_freshness, location)
+        except WeatherStationError as ex:
+            raise WeatherCompanionError("Unable to get current weather state") from ex
+
+    async def get_forecast_with_freshness_async(
+        self, location: Location, start_date: date, end_date: date
+    ) -> Tuple[Forecast, Freshness]:
+        """
+        Same as get_forecast_async, also returns the freshness of the forecast for conditional requests
+        """
+        try:
+            if self._async_weather_station is not None:
+                return await self._async_weather_station.get_forecast_with_freshness(location, start_date, end_date)
+            return await self._run_in_thread(
+                self._weather_station.get_forecast_with_freshness, location, start_date, end_date
+            )
+        except WeatherStationError as ex:
+            raise WeatherCompanionError("Unable to get weather forecast") from ex
+
+    async def get_daily_forecast_async(
+        self, location: Location, start_date: date, end_date: date
+    ) -> List[DailySummary]:
+        """
+        Asyncio version of get_daily_forecast, does not block the event loop.
+        Throws WeatherCompanionError if the weather station is unable to provide the weather forecast.
+        """
+        return aggregate_daily(await self.get_forecast_async(location, start_date, end_date))
+
+    async def get_current_states_async(
+        self,
+        locations: List[Location],
+        precision: int = DEFAULT_BATCH_PRECISION,
+        max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    ) -> List[LocationWeatherState]:
+        """
+        Asyncio version of get_current_states, does not block the event loop.
+        """
+        cells = self._batch_cells(locations, precision)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def get_cell_current_state(cell: Location) -> Tuple[Optional[WeatherState], Optional[str]]:
+            async with semaphore:
+                try:
+                    return await self.get_current_state_async(cell), None
+                except WeatherCompanionError as ex:
+                    return None, str(ex)
+
+        cell_results = await asyncio.gather(*(get_cell_current_state(cell) for cell in cells.values()))
+        return self._batch_results(locations, precision, dict(zip(cells, cell_results)))
+
+    async def iter_forecasts_async(
+        self,
+        locations: List[Location],
+        start_date: date,
+        end_date: date,
+        precision: int = DEFAULT_BATCH_PRECISION,
+        max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    ) -> AsyncIterator[LocationForecast]:
+        """
+        Yields the forecast of each location as soon as it is fetched, in completion order.
+        Locations in the same grid cell of the given precision are fetched once, up to max_concurrency at a time.
+        A new fetch starts only when a finished one is taken, so the forecasts held are bounded by max_concurrency
+        whatever the number of locations: a slow consumer slows the fetches down. Errors are returned per location.
+        """
+        # Indexes of the locations of each cell
+        cells: Dict[Tuple[float, float], Tuple[Location, List[int]]] = {}
+        for index, location in enumerate(locations):
+            cell = location.rounded(precision)
+            cells.setdefault((cell.latitude, cell.longitude), (cell, []))[1].append(index)
+        pending_cells = iter(cells.values())
+        in_flight: Dict[asyncio.Future, List[int]] = {}
+
+        def fetch_next_cell() -> None:
+            for cell, indexes in pending_cells:
+                task = asyncio.ensure_future(self.get_forecast_async(cell, start_date, end_date))
+                in_flight[task] = indexes
+                return
+
+        try:
+            for _ in range(max_concurrency):
+                fetch_next_cell()
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    indexes = in_flight.pop(task)
+                    fetch_next_cell()
+                    try:
+                        forecast, error = task.result(), None
+                    except WeatherCompanionError as ex:
+                        forecast, error = None, str(ex)
+                    for index in indexes:
+                        yield LocationForecast(index=index, location=locations[index], forecast=forecast, error=error)
+        finally:
+            # The consumer went away (i.e. the client disconnected), the fetches in flight are not needed
+            for task in in_flight:
+                task.cancel()
+
+    async def aclose(self) -> None:
+        """
+        Releases the resources held by the weather stations, their cache and the repositories, if any
+        """
+        if self._async_weather_station is not None:
+            await self._async_weather_station.aclose()
+        # Waits for the background refreshes of the sync weather station, off the event loop
+        await self._run_in_thread(self._weather_station.close)
+        if self._weather_cache is not None:
+            await self._run_repository_call(self._weather_cache, self._weather_cache.close)
+        await self._run_repository_call(self._journal_repository, self._journal_repository.close)
+        await self._run_repository_call(self._bookmark_repository, self._bookmark_repository.close)
+
+    def _get_cell_current_state(self, cell: Location) -> Tuple[Optional[WeatherState], Optional[str]]:
+        try:
+            return self.get_current_state(cell), None
+        except WeatherCompanionError as ex:
+            return None, str(ex)
+
+    @staticmethod
+    def _batch_cells(locations: List[Location], precision: int) -> Dict[Tuple[float, float], Location]:
+        # Distinct grid cells of the locations, keyed by their coordinates
+        cells = {}
+        for location in locations:
+            cell = location.rounded(precision)
+            cells.setdefault((cell.latitude, cell.longitude), cell)
+        return cells
+
+    @staticmethod
+    def _batch_results(
+        locations: List[Location], precision: int, results: Dict[Tuple[float, float], Tuple]
+    ) -> List[LocationWeatherState]:
+        batch_results = []
+        for location in locations:
+            cell = location.rounded(precision)
+            weather_state, error = results[(cell.latitude, cell.longitude)]
+            batch_results.append(LocationWeatherState(location=location, weather_state=weather_state, error=error))
+        return batch_results
+
+    @staticmethod
+    async def _run_in_thread(function, *args):
+        loop = asyncio.get_running_loop()
+        # The context is copied so the thread keeps the upstream calls priority
+        return await loop.run_in_executor(None, contextvars.copy_context().run, function, *args)
+
+    async def _run_repository_call(self, repository, function, *args):
+        # The calls of a blocking repository or cache (SQLite) run in a thread, the in memory ones on the event loop
+        if repository.blocking:
+            return await self._run_in_thread(function, *args)
+        return function(*args)
+
     #########################################################################################################
     ############################################ Journal ####################################################
     #########################################################################################################
@@ -122,13 +379,80 @@ class WeatherCompanion:
             raise WeatherCompanionError("Unable to get journal") from ex
         return entries
 
+    def query_journal_entries(
+        self,
+        author: AuthorID,
+        entry_filter: Optional[JournalEntryFilter] = None,
+        limit: Optional[int] = None,
+        order: JournalOrder = JournalOrder.OLDEST_FIRST,
+    ) -> List[Tuple[int, JournalEntry]]:
+        """
+        Gets the weather journal entries of an author that match the filter, in the given order, at most limit entries
+        The filter is evaluated by the repository, the entries that do not match are never loaded
+        """
+        try:
+            entries = self._journal_repository.query(author, entry_filter, limit, order)
+        except RepositoryError as ex:
+            raise WeatherCompanionError("Unable to get journal") from ex
+        return entries
+
+    async def add_journal_entry_async(self, journal_entry: JournalEntry, author: AuthorID) -> int:
+        """
+        Asyncio version of add_journal_entry
+        """
+        return await self._run_repository_call(self._journal_repository, self.add_journal_entry, journal_entry, author)
+
+    async def get_journal_entry_async(self, journal_entry_id: int, author: AuthorID) -> JournalEntry:
+        """
+        Asyncio version of get_journal_entry
+        """
+        return await self._run_repository_call(
+            self._journal_repository, self.get_journal_entry, journal_entry_id, author
+        )
+
+    async def remove_journal_entry_async(self, journal_entry_id: int, author: AuthorID):
+        """
+        Asyncio version of remove_journal_entry
+        """
+        await self._run_repository_call(self._journal_repository, self.remove_journal_entry, journal_entry_id, author)
+
+    async def update_journal_entry_async(
+        self, journal_entry_id: int, author: AuthorID, new_journal_entry: JournalEntry
+    ):
+        """
+        Asyncio version of update_journal_entry
+        """
+        await self._run_repository_call(
+            self._journal_repository, self.update_journal_entry, journal_entry_id, author, new_journal_entry
+        )
+
+    async def query_journal_entries_async(
+        self,
+        author: AuthorID,
+        entry_filter: Optional[JournalEntryFilter] = None,
+        limit: Optional[int] = None,
+        order: JournalOrder = JournalOrder.OLDEST_FIRST,
+    ) -> List[Tuple[int, JournalEntry]]:
+        """
+        Asyncio version of query_journal_entries
+        """
+        return await self._run_repository_call(
+            self._journal_repository, self.query_journal_entries, author, entry_filter, limit, order
+        )
+
     #########################################################################################################
     ########################################### Bookmarks ###################################################
     #########################################################################################################
 
+    def get_bookmarked_locations(self) -> List[Location]:
+        """
+        Gets the locations bookmarked by all the authors
+        """
+        return self._bookmark_repository.get_all_locations()
+
     # Get bookmarks for an author from the repository
     def get_bookmarks(self, author: AuthorID) -> List[Tuple[Bookmark, Location]]:
-        self._bookmark_repository.get_all_bookmarks(author)
+        return self._bookmark_repository.get_all_bookmarks(author)
 
     # Add a new bookmark for an author into the repository
     def add_bookmark(self, bookmark: Bookmark, location: Location, author: AuthorID):
@@ -138,9 +462,61 @@ class WeatherCompanion:
     def remove_bookmark(self, bookmark: Bookmark, author: AuthorID):
         self._bookmark_repository.remove(bookmark=bookmark, author_id=author)
 
+    async def get_bookmarked_locations_async(self) -> List[Location]:
+        """
+        Asyncio version of get_bookmarked_locations
+        """
+        return await self._run_repository_call(self._bookmark_repository, self.get_bookmarked_locations)
+
+    async def get_bookmarks_async(self, author: AuthorID) -> List[Tuple[Bookmark, Location]]:
+        """
+        Asyncio version of get_bookmarks
+        """
+        return await self._run_repository_call(self._bookmark_repository, self.get_bookmarks, author)
+
+    async def add_bookmark_async(self, bookmark: Bookmark, location: Location, author: AuthorID):
+        """
+        Asyncio version of add_bookmark
+        """
+        await self._run_repository_call(self._bookmark_repository, self.add_bookmark, bookmark, location, author)
+
+    async def remove_bookmark_async(self, bookmark: Bookmark, author: AuthorID):
+        """
+        Asyncio version of remove_bookmark
+        """
+        await self._run_repository_call(self._bookmark_repository, self.remove_bookmark, bookmark, author)
+
     def get_current_weather_state_for_bookmark(self, bookmark: Bookmark, author: AuthorID) -> WeatherState:
         """
         Gets the current weather state for a bookmark
         """
         location = self._bookmark_repository.get(bookmark=bookmark, author_id=author)
         return self.get_current_state(location=location)
+
+    def get_current_weather_states_for_bookmarks(self, author: AuthorID) -> List[Tuple[Bookmark, LocationWeatherState]]:
+        """
+        Gets the current weather state of every bookmark of an author, with an error for the ones that failed
+        Bookmarks are read once and their locations fetched as a batch, see get_current_states
+        """
+        bookmarks = self._bookmark_repository.get_all_bookmarks(author)
+        results = self.get_current_states([location for _, location in bookmarks])
+        return [(bookmark, result) for (bookmark, _), result in zip(bookmarks, results)]
+
+    async def get_current_weather_states_for_bookmarks_async(
+        self, author: AuthorID
+    ) -> List[Tuple[Bookmark, LocationWeatherState]]:
+        """
+        Asyncio version of get_current_weather_states_for_bookmarks
+        """
+        bookmarks = await self.get_bookmarks_async(author)
+        results = await self.get_current_states_async([location for _, location in bookmarks])
+        return [(bookmark, result) for (bookmark, _), result in zip(bookmarks, results)]
+
+    async def get_current_weather_state_for_bookmark_async(self, bookmark: Bookmark, author: AuthorID) -> WeatherState:
+        """
+        Asyncio version of get_current_weather_state_for_bookmark
+        """
+        location = await self._run_repository_call(
+            self._bookmark_repository, self._bookmark_repository.get, bookmark, author
+        )
+        return await self.get_current_state_async(location=location)
@@ -6,6 +6,9 @@ class AuthorID:
         self._validate_id(id)
         self._id: str = id
 
+    def id(self) -> str:
+        return self._id
+
     def _validate_id(self, id: str):
         """check if id is valid"""
         if not id:
@@ -15,3 +18,6 @@ class AuthorID:
 
     def __eq__(self, other):
         return self._id == other._id
+
+    def __hash__(self):
+        return hash(self._id)
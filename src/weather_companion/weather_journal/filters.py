@@ -1,10 +1,23 @@
+import math
 from datetime import datetime
-from typing import Iterable, List
+from typing import Iterable, List, Tuple
 
-from weather_companion.weather_station import Location
+import numpy as np
+from numpy.typing import ArrayLike
+
+from weather_companion.weather_station import (
+    DistanceAccuracy,
+    Location,
+    within_distance,
+)
+from weather_companion.weather_station.location import SPHERICAL_DISTANCE_ERROR
 
 from .weather_journal import JournalEntry
 
+# Smaller than every radius of curvature of the earth ellipsoid (6335 km is the least, along the meridian at the
+# equator), so the bounding boxes of the proximity filters always contain the locations within their distance
+BOUNDING_EARTH_RADIUS = 6300.0
+
 
 class JournalEntryFilter:
     """
@@ -22,6 +35,12 @@ class DateRangeFilter(JournalEntryFilter):
         self._start_date = start_date
         self._end_date = end_date
 
+    def start_date(self) -> datetime:
+        return self._start_date
+
+    def end_date(self) -> datetime:
+        return self._end_date
+
     def condition(self, journal_entry: JournalEntry) -> bool:
         return self._start_date <= journal_entry.date() <= self._end_date
 
@@ -31,6 +50,9 @@ class NoteContentFilter(JournalEntryFilter):
     def __init__(self, content: str):
         self._content = content
 
+    def content(self) -> str:
+        return self._content
+
     def condition(self, journal_entry: JournalEntry) -> bool:
         searched_content = self._content.lower().strip()
         return searched_content in journal_entry.note().content().lower()
@@ -38,12 +60,65 @@ class NoteContentFilter(JournalEntryFilter):
 
 # Filters weather entry journals by location proximity (in km)
 class LocationProximityFilter(JournalEntryFilter):
-    def __init__(self, location: Location, max_distance: float):
+    def __init__(self, location: Location, max_distance: float, accuracy: DistanceAccuracy = DistanceAccuracy.GEODESIC):
         self._location = location
         self._max_distance = max_distance
+        self._accuracy = accuracy
+
+    def location(self) -> Location:
+        return self._location
+
+    def max_distance(self) -> float:
+        return self._max_distance
+
+    def accuracy(self) -> DistanceAccuracy:
+        return self._accuracy
+
+    def bounding_box(self) -> Tuple[float, float, float, float]:
+        """
+        Returns (min latitude, max latitude, min longitude, max longitude) of a box that contains every location
+        within the max distance, so the repositories can discard the locations out of the box before computing
+        the distances. Longitudes are not bounded if the box reaches a pole or crosses the antimeridian.
+        """
+        angle = max(self._max_distance, 0) / BOUNDING_EARTH_RADIUS
+        min_latitude = self._location.latitude - math.degrees(angle)
+        max_latitude = self._location.latitude + math.degrees(angle)
+        if angle >= math.pi / 2 or min_latitude <= -90 or max_latitude >= 90:
+            return max(min_latitude, -90.0), min(max_latitude, 90.0), -180.0, 180.0
+        # Widest longitude difference of the points of the circle, reached away from the latitude of its center
+        sin_longitude_delta = math.sin(angle) / math.cos(math.radians(self._location.latitude))
+        if sin_longitude_delta >= 1:
+            return min_latitude, max_latitude, -180.0, 180.0
+        longitude_delta = math.degrees(math.asin(sin_longitude_delta))
+        min_longitude = self._location.longitude - longitude_delta
+        max_longitude = self._location.longitude + longitude_delta
+        if min_longitude < -180 or max_longitude > 180:
+            return min_latitude, max_latitude, -180.0, 180.0
+        return min_latitude, max_latitude, min_longitude, max_longitude
 
     def condition(self, journal_entry: JournalEntry) -> bool:
-        return self._location.distance_to(journal_entry.location()) <= self._max_distance
+        return self.contains(journal_entry.location())
+
+    def contains(self, location: Location) -> bool:
+        """
+        Returns true if the location is within the max distance (the great circle one with the spherical accuracy)
+        The cheap great circle distance decides, the geodesic one is only computed near the max distance,
+        where the error of the great circle distance could change the result
+        """
+        distance = self._location.great_circle_distance_to(location)
+        if self._accuracy == DistanceAccuracy.SPHERICAL:
+            return distance <= self._max_distance
+        if distance <= self._max_distance * (1 - SPHERICAL_DISTANCE_ERROR):
+            return True
+        if distance > self._max_distance * (1 + SPHERICAL_DISTANCE_ERROR):
+            return False
+        return self._location.distance_to(location) <= self._max_distance
+
+    def contains_all(self, latitudes: ArrayLike, longitudes: ArrayLike) -> np.ndarray:
+        """
+        Returns a boolean mask of the locations within the max distance, computed in a single vectorized pass
+        """
+        return within_distance(self._location, latitudes, longitudes, self._max_distance, self._accuracy)
 
 
 # And filter that combines multiple filters
@@ -51,5 +126,8 @@ class AndFilter(JournalEntryFilter):
     def __init__(self, filters: Iterable[JournalEntryFilter]):
         self._filters = filters
 
+    def filters(self) -> Iterable[JournalEntryFilter]:
+        return self._filters
+
     def condition(self, journal_entry: JournalEntry) -> bool:
         return all([filter.condition(journal_entry) for filter in self._filters])
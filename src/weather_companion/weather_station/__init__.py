@@ -1,6 +1,22 @@
+from .cache import CacheEntry, CacheStats, InMemoryWeatherCache, WeatherCache
+from .caching_weather_station import AsyncCachingWeatherStation, CachingWeatherStation
+from .daily import DailySummary, aggregate_daily
+from .distance import DistanceAccuracy, great_circle_distances, within_distance
 from .forecast import Forecast
+from .freshness import Freshness
 from .location import Location
-from .owm_client import ClientError, OWMClient
-from .owm_weather_station import OWMWeatherStation
-from .weather_state import WeatherState, WeatherStateBuilder
-from .weather_station import WeatherStation, WeatherStationError
+from .owm_client import (
+    AsyncOWMClient,
+    CircuitOpenError,
+    ClientError,
+    OWMClient,
+    RateLimitedError,
+)
+from .owm_weather_station import AsyncOWMWeatherStation, OWMWeatherStation
+from .rate_limiter import Priority, RateLimiter, current_priority, request_priority
+from .resilience import Admission, CircuitBreaker, RetryBudget, RetryPolicy
+from .single_flight import AsyncSingleFlight, SingleFlight
+from .sqlite_cache import SQLiteWeatherCache
+from .transport import AsyncHTTPTransport, HTTPTransport
+from .weather_state import PackedWeatherState, WeatherState, WeatherStateBuilder
+from .weather_station import AsyncWeatherStation, WeatherStation, WeatherStationError
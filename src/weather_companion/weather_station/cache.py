@@ -0,0 +1,142 @@
+"""
+Definition of the WeatherCache interface
+In Memory implementation of the cache, with TTL expiration and LRU eviction.
+Expired entries can be kept for a while, so callers can serve them stale while they are refreshed.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, NamedTuple, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    stale_hits: int = 0
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    # Seconds until the entry expires, negative if already expired (stale)
+    expires_in: float
+
+
+class WeatherCache:
+    """Interface for a cache of weather results"""
+
+    # True if the calls can block on I/O or on locks held by other processes, asyncio callers run them in a thread
+    blocking = False
+
+    def get(self, key: str) -> Any:
+        """
+        Gets the value stored for the key, None if not present or expired
+        """
+        pass
+
+    def get_entry(self, key: str) -> Optional[CacheEntry]:
+        """
+        Gets the entry stored for the key, expired entries are returned while they are kept (stale).
+        None if not present
+        """
+        pass
+
+    def set(self, key: str, value: Any, ttl: float, stale_ttl: float = 0) -> None:
+        """
+        Stores the value for the key, it expires after ttl seconds and is kept stale_ttl seconds more
+        """
+        pass
+
+    def stats(self) -> CacheStats:
+        pass
+
+    def close(self) -> None:
+        """
+        Releases the resources held by the cache, if any
+        """
+        pass
+
+
+async def call_async(cache: WeatherCache, method: Callable[..., T], *args) -> T:
+    """
+    Calls a method of the cache from a coroutine, in the default executor if the cache is blocking,
+    so the event loop keeps serving the other requests meanwhile
+    """
+    if not cache.blocking:
+        return method(*args)
+    return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+
+class InMemoryWeatherCache(WeatherCache):
+    """
+    Thread safe in memory cache, the least recently used entries are evicted when max_size is reached
+    """
+
+    def __init__(self, max_size: int = 10000, clock: Callable[[], float] = time.time):
+        if max_size < 1:
+            raise ValueError("max size should be a positive number")
+        self._max_size = max_size
+        self._clock = clock
+        self._container = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._stale_hits = 0
+
+    def get(self, key: str) -> Any:
+        entry = self._get_entry(key, allow_stale=False)
+        return entry.value if entry is not None else None
+
+    def get_entry(self, key: str) -> Optional[CacheEntry]:
+        return self._get_entry(key, allow_stale=True)
+
+    def set(self, key: str, value: Any, ttl: float, stale_ttl: float = 0) -> None:
+        with self._lock:
+            expires_at = self._clock() + ttl
+            self._container[key] = (expires_at, expires_at + stale_ttl, value)
+            self._container.move_to_end(key)
+            while len(self._container) > self._max_size:
+                self._container.popitem(last=False)
+                self._evictions += 1
+
+    def _get_entry(self, key: str, allow_stale: bool) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._container.get(key, None)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            now = self._clock()
+            expires_at, kept_until, value = entry
+            if kept_until <= now:
+                del self._container[key]
+                self._misses += 1
+                return None
+
+            is_stale = expires_at <= now
+            if is_stale and not allow_stale:
+                self._misses += 1
+                return None
+
+            self._container.move_to_end(key)
+            if is_stale:
+                self._stale_hits += 1
+            else:
+                self._hits += 1
+            return CacheEntry(value=value, expires_in=expires_at - now)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                size=len(self._container),
+                stale_hits=self._stale_hits,
+            )
@@ -0,0 +1,309 @@
+"""
+Weather stations that wrap another weather station and cache its results.
+Results are keyed by the location rounded to a grid precision, so close locations share the same entry.
+Concurrent misses for the same key are coalesced into a single fetch to the wrapped weather station.
+
+Stale while revalidate: expired entries are kept stale_ttl seconds more, they are served immediately
+while a background refresh, deduplicated per key, fetches a fresh result. Entries that are read
+during the last refresh_ahead seconds before they expire are also refreshed in background,
+so locations that stay hot never expire. Background refreshes run with background priority.
+
+Weather states are cached packed (PackedWeatherState), they are unpacked when read.
+The asyncio weather station runs the calls of a blocking cache (SQLite) in a thread, off the event loop.
+The freshness of a result is the digest of the cached value and its key, and the seconds until the entry expires.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Callable, Dict, Tuple
+
+from .cache import (
+    CacheEntry,
+    CacheStats,
+    InMemoryWeatherCache,
+    WeatherCache,
+    call_async,
+)
+from .forecast import Forecast
+from .freshness import Freshness, digest
+from .location import Location
+from .rate_limiter import Priority, current_priority, request_priority
+from .single_flight import AsyncSingleFlight, SingleFlight
+from .weather_state import PackedWeatherState, WeatherState
+from .weather_station import AsyncWeatherStation, WeatherStation
+
+CURRENT_STATE = "current"
+FORECAST = "forecast"
+
+DEFAULT_PRECISION = 2
+DEFAULT_CURRENT_STATE_TTL = 600
+DEFAULT_FORECAST_TTL = 1800
+DEFAULT_REFRESH_WORKERS = 4
+
+
+class _WeatherStationCache:
+    """
+    Cache configuration and keys, shared by the sync and the asyncio caching weather stations.
+    """
+
+    def __init__(
+        self,
+        cache: WeatherCache = None,
+        precision: int = DEFAULT_PRECISION,
+        current_state_ttl: float = DEFAULT_CURRENT_STATE_TTL,
+        forecast_ttl: float = DEFAULT_FORECAST_TTL,
+        stale_ttl: float = 0,
+        refresh_ahead: float = 0,
+    ):
+        self._cache = cache if cache is not None else InMemoryWeatherCache()
+        self._precision = precision
+        self._ttls = {CURRENT_STATE: current_state_ttl, FORECAST: forecast_ttl}
+        self._stale_ttl = stale_ttl
+        self._refresh_ahead = refresh_ahead
+
+    def stats(self) -> CacheStats:
+        """
+        Returns the hit, miss and eviction counters of the cache
+        """
+        return self._cache.stats()
+
+    def _cell(self, location: Location) -> Location:
+        return location.rounded(self._precision)
+
+    def _store(self, kind: str, key: str, value: Any) -> None:
+        self._cache.set(key, self._packed(value), self._ttls[kind], self._stale_ttl)
+
+    async def _store_async(self, kind: str, key: str, value: Any) -> None:
+        await call_async(self._cache, self._cache.set, key, self._packed(value), self._ttls[kind], self._stale_ttl)
+
+    @staticmethod
+    def _packed(value: Any) -> Any:
+        return PackedWeatherState.pack(value) if isinstance(value, WeatherState) else value
+
+    @staticmethod
+    def _unpack(value: Any) -> Any:
+        return value.unpack() if isinstance(value, PackedWeatherState) else value
+
+    def _fetched_entry(self, key: str, value: Any) -> CacheEntry:
+        # Entry of a value just fetched, keys start with the kind of result
+        return CacheEntry(value=value, expires_in=self._ttls[key.split(":", 1)[0]])
+
+    def _with_freshness(self, key: str, entry: CacheEntry) -> Tuple[Any, Freshness]:
+        freshness = Freshness(digest=digest(entry.value, key), max_age=max(entry.expires_in, 0))
+        return self._unpack(entry.value), freshness
+
+    def _needs_refresh(self, expires_in: float) -> bool:
+        # Stale entries, and the fresh ones about to expire, are refreshed in background
+        return expires_in <= self._refresh_ahead
+
+    @staticmethod
+    def _refresh_priority() -> Priority:
+        # Background, unless the read that triggered the refresh had a lower priority (prefetches)
+        return max(current_priority(), Priority.BACKGROUND)
+
+    @staticmethod
+    def _current_state_key(cell: Location) -> str:
+        return f"{CURRENT_STATE}:{cell.latitude}:{cell.longitude}"
+
+    @staticmethod
+    def _forecast_key(cell: Location, start_date: date, end_date: date) -> str:
+        return f"{FORECAST}:{cell.latitude}:{cell.longitude}:{start_date}:{end_date}"
+
+
+class CachingWeatherStation(_WeatherStationCache, WeatherStation):
+    """
+    Weather station that caches the weather states and forecasts of the wrapped weather station
+    """
+
+    def __init__(
+        self,
+        weather_station: WeatherStation,
+        cache: WeatherCache = None,
+        precision: int = DEFAULT_PRECISION,
+        current_state_ttl: float = DEFAULT_CURRENT_STATE_TTL,
+        forecast_ttl: float = DEFAULT_FORECAST_TTL,
+        stale_ttl: float = 0,
+        refresh_ahead: float = 0,
+        refresh_workers: int = DEFAULT_REFRESH_WORKERS,
+    ):
+        """
+        precision is the number of decimal places the coordinates are rounded to (2 is a ~1km grid)
+        ttls are in seconds, an in memory cache is used if cache is not given
+        stale_ttl and refresh_ahead (seconds) enable the background refreshes, done by refresh_workers threads
+        """
+        super().__init__(cache, precision, current_state_ttl, forecast_ttl, stale_ttl, refresh_ahead)
+        self._weather_station = weather_station
+        self._single_flight = SingleFlight()
+        self._refresh_executor = None
+        self._refresh_workers = refresh_workers
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+
+    def get_current_state(self, location: Location) -> WeatherState:
+        cell = self._cell(location)
+        key = self._current_state_key(cell)
+        return self._get(key, self._fetch_current_state, key, cell)
+
+    def get_forecast(self, location: Location, start_date: date, end_date: date) -> Forecast:
+        cell = self._cell(location)
+        key = self._forecast_key(cell, start_date, end_date)
+        return self._get(key, self._fetch_forecast, key, cell, start_date, end_date)
+
+    def get_current_state_with_freshness(self, location: Location) -> Tuple[WeatherState, Freshness]:
+        cell = self._cell(location)
+        key = self._current_state_key(cell)
+        return self._with_freshness(key, self._get_entry(key, self._fetch_current_state, key, cell))
+
+    def get_forecast_with_freshness(
+        self, location: Location, start_date: date, end_date: date
+    ) -> Tuple[Forecast, Freshness]:
+        cell = self._cell(location)
+        key = self._forecast_key(cell, start_date, end_date)
+        return self._with_freshness(key, self._get_entry(key, self._fetch_forecast, key, cell, start_date, end_date))
+
+    def close(self) -> None:
+        """
+        Waits for the background refreshes in flight, stops the refresh threads and closes the wrapped weather station
+        """
+        if self._refresh_executor is not None:
+            self._refresh_executor.shutdown(wait=True)
+            self._refresh_executor = None
+        self._weather_station.close()
+
+    def _get(self, key: str, fetch: Callable[..., Any], *args) -> Any:
+        return self._unpack(self._get_entry(key, fetch, *args).value)
+
+    def _get_entry(self, key: str, fetch: Callable[..., Any], *args) -> CacheEntry:
+        entry = self._cache.get_entry(key)
+        if entry is None:
+            return self._fetched_entry(key, self._single_flight.do(key, fetch, *args))
+        if self._needs_refresh(entry.expires_in):
+            self._schedule_refresh(key, fetch, *args)
+        return entry
+
+    def _schedule_refresh(self, key: str, fetch: Callable[..., Any], *args) -> None:
+        with self._refreshing_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(max_workers=self._refresh_workers)
+            self._refresh_executor.submit(self._refresh, self._refresh_priority(), key, fetch, *args)
+
+    def _refresh(self, priority: Priority, key: str, fetch: Callable[..., Any], *args) -> None:
+        try:
+            with request_priority(priority):
+                self._single_flight.do(key, fetch, *args)
+        except Exception:
+            # The stale entry is kept, the next read schedules a new refresh
+            pass
+        finally:
+            with self._refreshing_lock:
+                self._refreshing.discard(key)
+
+    def _fetch_current_state(self, key: str, cell: Location) -> WeatherState:
+        weather_state = self._weather_station.get_current_state(cell)
+        self._store(CURRENT_STATE, key, weather_state)
+        return weather_state
+
+    def _fetch_forecast(self, key: str, cell: Location, start_date: date, end_date: date) -> Forecast:
+        forecast = self._weather_station.get_forecast(cell, start_date, end_date)
+        self._store(FORECAST, key, forecast)
+        return forecast
+
+
+class AsyncCachingWeatherStation(_WeatherStationCache, AsyncWeatherStation):
+    """
+    Asyncio weather station that caches the weather states and forecasts of the wrapped weather station
+    """
+
+    def __init__(
+        self,
+        weather_station: AsyncWeatherStation,
+        cache: WeatherCache = None,
+        precision: int = DEFAULT_PRECISION,
+        current_state_ttl: float = DEFAULT_CURRENT_STATE_TTL,
+        forecast_ttl: float = DEFAULT_FORECAST_TTL,
+        stale_ttl: float = 0,
+        refresh_ahead: float = 0,
+    ):
+        """
+        precision is the number of decimal places the coordinates are rounded to (2 is a ~1km grid)
+        ttls are in seconds, an in memory cache is used if cache is not given
+        stale_ttl and refresh_ahead (seconds) enable the background refreshes, done in asyncio tasks
+        """
+        super().__init__(cache, precision, current_state_ttl, forecast_ttl, stale_ttl, refresh_ahead)
+        self._weather_station = weather_station
+        self._single_flight = AsyncSingleFlight()
+        self._refresh_tasks: Dict[str, asyncio.Task] = {}
+
+    async def get_current_state(self, location: Location) -> WeatherState:
+        cell = self._cell(location)
+        key = self._current_state_key(cell)
+        return await self._get(key, self._fetch_current_state, key, cell)
+
+    async def get_forecast(self, location: Location, start_date: date, end_date: date) -> Forecast:
+        cell = self._cell(location)
+        key = self._forecast_key(cell, start_date, end_date)
+        return await self._get(key, self._fetch_forecast, key, cell, start_date, end_date)
+
+    async def get_current_state_with_freshness(self, location: Location) -> Tuple[WeatherState, Freshness]:
+        cell = self._cell(location)
+        key = self._current_state_key(cell)
+        return self._with_freshness(key, await self._get_entry(key, self._fetch_current_state, key, cell))
+
+    async def get_forecast_with_freshness(
+        self, location: Location, start_date: date, end_date: date
+    ) -> Tuple[Forecast, Freshness]:
+        cell = self._cell(location)
+        key = self._forecast_key(cell, start_date, end_date)
+        entry = await self._get_entry(key, self._fetch_forecast, key, cell, start_date, end_date)
+        return self._with_freshness(key, entry)
+
+    async def aclose(self) -> None:
+        """
+        Cancels the background refreshes, waits for them to finish and closes the wrapped weather station
+        """
+        tasks = list(self._refresh_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._weather_station.aclose()
+
+    async def _get(self, key: str, fetch: Callable[..., Any], *args) -> Any:
+        return self._unpack((await self._get_entry(key, fetch, *args)).value)
+
+    async def _get_entry(self, key: str, fetch: Callable[..., Any], *args) -> CacheEntry:
+        entry = await call_async(self._cache, self._cache.get_entry, key)
+        if entry is None:
+            return self._fetched_entry(key, await self._single_flight.do(key, fetch, *args))
+        if self._needs_refresh(entry.expires_in):
+            self._schedule_refresh(key, fetch, *args)
+        return entry
+
+    def _schedule_refresh(self, key: str, fetch: Callable[..., Any], *args) -> None:
+        if key in self._refresh_tasks:
+            return
+        # The task copies the context, its upstream calls have background priority
+        with request_priority(self._refresh_priority()):
+            task = asyncio.ensure_future(self._single_flight.do(key, fetch, *args))
+        self._refresh_tasks[key] = task
+        task.add_done_callback(lambda done_task: self._forget_refresh(key, done_task))
+
+    def _forget_refresh(self, key: str, task: asyncio.Task) -> None:
+        del self._refresh_tasks[key]
+        # The stale entry is kept on errors, the next read schedules a new refresh
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch_current_state(self, key: str, cell: Location) -> WeatherState:
+        weather_state = await self._weather_station.get_current_state(cell)
+        await self._store_async(CURRENT_STATE, key, weather_state)
+        return weather_state
+
+    async def _fetch_forecast(self, key: str, cell: Location, start_date: date, end_date: date) -> Forecast:
+        forecast = await self._weather_station.get_forecast(cell, start_date, end_date)
+        await self._store_async(FORECAST, key, forecast)
+        return forecast
@@ -0,0 +1,79 @@
+"""
+Daily summaries of a forecast.
+The forecast columns are grouped by day, in the timezone of the forecast date times, and reduced with numpy,
+without building the weather states.
+"""
+
+from datetime import date
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from .forecast import Forecast
+
+
+class DailySummary(NamedTuple):
+    date: date
+    min_temperature: float
+    max_temperature: float
+    mean_temperature: float
+    # Totals of the 3h accumulations, 0 if there is no rain or snow
+    rain: float
+    snow: float
+    # None if the forecast does not include gusts for the day
+    max_wind_gust: Optional[float]
+    weather_states: int
+
+
+def aggregate_daily(forecast: Forecast) -> List[DailySummary]:
+    """
+    Returns the summary of each day of the forecast, ordered by date
+    """
+    if len(forecast) == 0:
+        return []
+
+    columns = forecast.columns()
+    days = np.asarray(columns["day"])
+    temperature = np.asarray(columns["temperature"])
+    rain = np.asarray(columns["rain_3h"])
+    snow = np.asarray(columns["snow_3h"])
+    wind_gust = np.asarray(columns["wind_gust"])
+
+    # Columns are sorted by time, days are sorted too unless the date times have different timezones
+    if np.any(days[1:] < days[:-1]):
+        order = np.argsort(days, kind="stable")
+        days, temperature, rain, snow, wind_gust = (
+            column[order] for column in (days, temperature, rain, snow, wind_gust)
+        )
+
+    unique_days, starts, counts = np.unique(days, return_index=True, return_counts=True)
+    min_temperature = np.minimum.reduceat(temperature, starts)
+    max_temperature = np.maximum.reduceat(temperature, starts)
+    mean_temperature = np.add.reduceat(temperature, starts) / counts
+    total_rain = np.add.reduceat(np.nan_to_num(rain), starts)
+    total_snow = np.add.reduceat(np.nan_to_num(snow), starts)
+    # fmax ignores NaN, the day max is NaN only if all the gusts are missing
+    max_wind_gust = np.fmax.reduceat(wind_gust, starts)
+
+    return [
+        DailySummary(
+            date=date.fromordinal(int(day)),
+            min_temperature=float(day_min),
+            max_temperature=float(day_max),
+            mean_temperature=float(day_mean),
+            rain=float(day_rain),
+            snow=float(day_snow),
+            max_wind_gust=None if np.isnan(day_gust) else float(day_gust),
+            weather_states=int(count),
+        )
+        for day, day_min, day_max, day_mean, day_rain, day_snow, day_gust, count in zip(
+            unique_days.tolist(),
+            min_temperature.tolist(),
+            max_temperature.tolist(),
+            mean_temperature.tolist(),
+            total_rain.tolist(),
+            total_snow.tolist(),
+            max_wind_gust.tolist(),
+            counts.tolist(),
+        )
+    ]
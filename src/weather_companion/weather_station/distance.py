@@ -0,0 +1,60 @@
+"""
+Distances from one origin to many locations, computed by numpy in a single vectorized pass.
+
+The great circle distance (haversine on the mean sphere) is within SPHERICAL_DISTANCE_ERROR of the geodesic
+distance on the ellipsoid of Location.distance_to. The geodesic accuracy refines it with the exact geodesic
+distance, only for the locations close enough to the threshold for that error to change the result.
+"""
+
+from enum import Enum
+
+import numpy as np
+from geopy.distance import geodesic
+from numpy.typing import ArrayLike
+
+from .location import EARTH_RADIUS, SPHERICAL_DISTANCE_ERROR, Location
+
+
+class DistanceAccuracy(Enum):
+    # Great circle distances only, the fastest
+    SPHERICAL = "spherical"
+    # Great circle distances, with the exact geodesic near the threshold: same results as Location.distance_to
+    GEODESIC = "geodesic"
+
+
+def great_circle_distances(origin: Location, latitudes: ArrayLike, longitudes: ArrayLike) -> np.ndarray:
+    """
+    Returns the great circle distances in km from the origin to each of the locations
+    """
+    latitudes = np.radians(np.asarray(latitudes, dtype=np.float64))
+    longitudes = np.radians(np.asarray(longitudes, dtype=np.float64))
+    origin_latitude = np.radians(origin.latitude)
+    haversines = (
+        np.sin((latitudes - origin_latitude) / 2) ** 2
+        + np.cos(origin_latitude) * np.cos(latitudes) * np.sin((longitudes - np.radians(origin.longitude)) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.minimum(np.sqrt(haversines), 1.0))
+
+
+def within_distance(
+    origin: Location,
+    latitudes: ArrayLike,
+    longitudes: ArrayLike,
+    max_distance: float,
+    accuracy: DistanceAccuracy = DistanceAccuracy.GEODESIC,
+) -> np.ndarray:
+    """
+    Returns a boolean mask of the locations within max_distance km of the origin
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    distances = great_circle_distances(origin, latitudes, longitudes)
+    if accuracy == DistanceAccuracy.SPHERICAL:
+        return distances <= max_distance
+    within = distances <= max_distance * (1 - SPHERICAL_DISTANCE_ERROR)
+    # Locations where the spherical error could change the result
+    (uncertain,) = np.nonzero(~within & (distances <= max_distance * (1 + SPHERICAL_DISTANCE_ERROR)))
+    origin_coordinates = (origin.latitude, origin.longitude)
+    for i in uncertain.tolist():
+        within[i] = geodesic(origin_coordinates, (latitudes[i], longitudes[i])).km <= max_distance
+    return within
@@ -0,0 +1,294 @@
+"""
+Local stand-in for the OpenWeatherMap api, to test and benchmark the OWM clients without network access.
+Serves /weather and /forecast with a configurable latency, error rate and forecast size, the OWM clients
+are pointed to it with their base_url.
+
+Responses are generated from the coordinates, or replayed from a recording file. Recordings are made
+by proxying the requests to the real api (or any other upstream):
+
+    python -m weather_companion.weather_station.fake_owm_server --port 8081 --latency 0.05
+    python -m weather_companion.weather_station.fake_owm_server --record owm.json
+    python -m weather_companion.weather_station.fake_owm_server --replay owm.json
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+from .owm_client import OWM_BASE_URL
+
+RESOURCES = ("weather", "forecast")
+DEFAULT_FORECAST_ITEMS = 40
+FORECAST_STEP = 3 * 3600
+# Query parameters that do not identify the response, left out of the recording keys
+UNRECORDED_PARAMETERS = ("appid",)
+
+
+class FakeOWMServer:
+    """
+    Threaded HTTP server that fakes the OpenWeatherMap api, usable as a context manager.
+    Generated responses are deterministic for a seed and a start time, so are the replayed ones.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        forecast_items: int = DEFAULT_FORECAST_ITEMS,
+        seed: int = 0,
+        start_time: int = None,
+        replay_path: str = None,
+        record_path: str = None,
+        upstream_url: str = OWM_BASE_URL,
+    ):
+        """
+        port 0 picks a free port, see base_url
+        latency is in seconds, error_rate is the ratio of requests answered with error_status
+        forecast_items is the number of 3 hour items of the forecasts, unless the request sets cnt
+        start_time is the timestamp of the first forecast item, defaults to the current 3 hour slot
+        replay_path replays the recorded responses, record_path records the responses of upstream_url
+        """
+        if replay_path is not None and record_path is not None:
+            raise ValueError("a server can not replay and record at the same time")
+        if not 0 <= error_rate <= 1:
+            raise ValueError("error rate should be a value between 0 and 1")
+        self._latency = latency
+        self._error_rate = error_rate
+        self._error_status = error_status
+        self._forecast_items = forecast_items
+        self._seed = seed
+        self._start_time = start_time if start_time is not None else int(time.time()) // FORECAST_STEP * FORECAST_STEP
+        self._record_path = record_path
+        self._upstream_url = upstream_url
+        self._recordings: Dict[str, dict] = {}
+        if replay_path is not None:
+            with open(replay_path) as file:
+                self._recordings = json.load(file)
+        self._replay = replay_path is not None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        """
+        Serves in a background thread, returns the base url
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self) -> None:
+        """
+        Serves in the current thread, until interrupted
+        """
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        """
+        Stops serving, the recordings are saved if recording
+        """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        self.save()
+
+    def save(self) -> None:
+        if self._record_path is not None:
+            with self._lock:
+                recordings = dict(self._recordings)
+            with open(self._record_path, "w") as file:
+                json.dump(recordings, file, indent=1, sort_keys=True)
+
+    def __enter__(self) -> "FakeOWMServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def respond(self, resource: str, query: Dict[str, str]) -> Tuple[int, dict]:
+        """
+        Returns the status and body of the response to a request of the resource with the query parameters
+        """
+        if self._latency > 0:
+            time.sleep(self._latency)
+        with self._lock:
+            failed = self._error_rate > 0 and self._random.random() < self._error_rate
+        if failed:
+            return self._error_status, {"cod": self._error_status, "message": "fake server error"}
+
+        key = self._recording_key(resource, query)
+        if self._replay:
+            recording = self._recordings.get(key)
+            if recording is None:
+                return 404, {"cod": "404", "message": f"not recorded - {key}"}
+            return recording["status"], recording["body"]
+
+        if self._record_path is not None:
+            status, body = self._fetch_upstream(resource, query)
+            with self._lock:
+                self._recordings[key] = {"status": status, "body": body}
+            return status, body
+
+        try:
+            latitude, longitude = float(query["lat"]), float(query["lon"])
+        except (KeyError, ValueError):
+            return 400, {"cod": "400", "message": "wrong latitude or longitude"}
+        if resource == "weather":
+            return 200, self._current_state(latitude, longitude)
+        return 200, self._forecast(latitude, longitude, int(query.get("cnt", self._forecast_items)))
+
+    def _fetch_upstream(self, resource: str, query: Dict[str, str]) -> Tuple[int, dict]:
+        response = requests.get(f"{self._upstream_url}/{resource}?{urlencode(query)}", timeout=30)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {"cod": response.status_code, "message": response.text}
+        return response.status_code, body
+
+    @staticmethod
+    def _recording_key(resource: str, query: Dict[str, str]) -> str:
+        parameters = sorted((name, value) for name, value in query.items() if name not in UNRECORDED_PARAMETERS)
+        return f"{resource}?{urlencode(parameters)}"
+
+    def _location_random(self, latitude: float, longitude: float) -> random.Random:
+        # Same values for the same seed and coordinates
+        return random.Random(f"{self._seed}:{latitude}:{longitude}")
+
+    def _current_state(self, latitude: float, longitude: float) -> dict:
+        location_random = self._location_random(latitude, longitude)
+        current_state = {
+            "coord": {"lon": longitude, "lat": latitude},
+            "dt": self._start_time,
+            "timezone": 0,
+            "name": "Fake",
+            "cod": 200,
+        }
+        current_state.update(self._weather_data(location_random))
+        return current_state
+
+    def _forecast(self, latitude: float, longitude: float, items: int) -> dict:
+        location_random = self._location_random(latitude, longitude)
+        forecast_items = []
+        for i in range(items):
+            forecast_item = {"dt": self._start_time + i * FORECAST_STEP}
+            forecast_item.update(self._weather_data(location_random))
+            forecast_items.append(forecast_item)
+        return {
+            "cod": "200",
+            "cnt": items,
+            "list": forecast_items,
+            "city": {"name": "Fake", "coord": {"lat": latitude, "lon": longitude}, "timezone": 0},
+        }
+
+    @staticmethod
+    def _weather_data(location_random: random.Random) -> dict:
+        temperature = round(location_random.uniform(-10, 40), 2)
+        weather_data = {
+            "main": {
+                "temp": temperature,
+                "feels_like": round(temperature + location_random.uniform(-3, 3), 2),
+                "pressure": location_random.randint(980, 1040),
+                "humidity": location_random.randint(0, 100),
+            },
+            "wind": {
+                "speed": round(location_random.uniform(0, 15), 2),
+                "deg": location_random.randint(0, 360),
+                "gust": round(location_random.uniform(0, 25), 2),
+            },
+            "clouds": {"all": location_random.randint(0, 100)},
+        }
+        if location_random.random() < 0.3:
+            weather_data["rain"] = {"3h": round(location_random.uniform(0, 5), 2)}
+        return weather_data
+
+    def _handler_class(self):
+        server = self
+
+        class FakeOWMRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written apart, Nagle would delay the body of keep alive responses
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:
+                url = urlsplit(self.path)
+                resource = url.path.rstrip("/").rsplit("/", 1)[-1]
+                if resource not in RESOURCES:
+                    status, body = 404, {"cod": "404", "message": "Internal error"}
+                else:
+                    status, body = server.respond(resource, dict(parse_qsl(url.query)))
+
+                data = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json; charset=utf-8")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except ConnectionError:
+                    # The client went away, i.e. it timed out or was closed
+                    self.close_connection = True
+
+            def log_message(self, format: str, *args) -> None:
+                # Quiet, the server is used in tests and benchmarks
+                pass
+
+        return FakeOWMRequestHandler
+
+
+def main(arguments: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Fake OpenWeatherMap api server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="ratio of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--forecast-items", type=int, default=DEFAULT_FORECAST_ITEMS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", help="file of the recorded responses to replay")
+    parser.add_argument("--record", help="file where the responses of the upstream are recorded")
+    parser.add_argument("--upstream-url", default=OWM_BASE_URL)
+    options = parser.parse_args(arguments)
+
+    server = FakeOWMServer(
+        host=options.host,
+        port=options.port,
+        latency=options.latency,
+        error_rate=options.error_rate,
+        error_status=options.error_status,
+        forecast_items=options.forecast_items,
+        seed=options.seed,
+        replay_path=options.replay,
+        record_path=options.record,
+        upstream_url=options.upstream_url,
+    )
+    print(f"Fake OpenWeatherMap api serving on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,151 @@
+"""
+Defines the forecast class, the weather states of a location sorted by date and time.
+
+The forecast is columnar: the date times, their timestamps and days, and every weather state field
+are kept in parallel columns sorted by timestamp. Date ranges and days are looked up by bisection
+and the numeric columns can be exported without copies.
+Weather states are not kept, they are created from the columns when needed: values come back as floats.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
 from datetime import date, datetime, timezone
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 from .weather_state import WeatherState
 
+# Missing optional fields are stored as NaN in the numeric columns
+MISSING = float("nan")
+
 
 class Forecast:
     def __init__(self):
-        self._forecasts = []
+        self._date_times: List[datetime] = []
+        self._timestamps = array("d")
+        self._days = array("l")
+        self._fields = {field: array("d") for field in WeatherState._fields}
+        # Days are sorted as timestamps unless date times with different timezones cross midnight
+        self._days_sorted = True
 
     def add(self, weather_state: WeatherState, date_time: datetime, tz: timezone = None) -> None:
         if tz:
             date_time = date_time.replace(tzinfo=tz)
 
-        # Check datetime is not allready in the list, use sets
-        dates_inserted = set([forecast[0] for forecast in self._forecasts])
-        if date_time in dates_inserted:
-            ValueError("Weather state for this date and time already exists")
+        timestamp = date_time.timestamp()
+        index = bisect_left(self._timestamps, timestamp)
+        if index < len(self._timestamps) and self._timestamps[index] == timestamp:
+            raise ValueError("Weather state for this date and time already exists")
+        self._insert(index, weather_state, date_time, timestamp)
+
+    def add_all(self, weather_states: Iterable[WeatherState], date_times: Iterable[datetime]) -> None:
+        """
+        Adds the weather states of several date times at once, date times should include their timezone
+        Date times sorted after the ones of the forecast are appended column by column, without bisection
+        Throws ValueError if there is not one date time per weather state
+        """
+        weather_states = list(weather_states)
+        date_times = list(date_times)
+        if len(weather_states) != len(date_times):
+            raise ValueError("There should be one date time per weather state")
+        if not date_times:
+            return
 
-        forecast = (date_time, weather_state)
-        self._forecasts.append(forecast)
+        timestamps = array("d", [date_time.timestamp() for date_time in date_times])
+        previous_timestamp = self._timestamps[-1] if self._timestamps else float("-inf")
+        if not all(previous < timestamp for previous, timestamp in zip([previous_timestamp, *timestamps], timestamps)):
+            # Not sorted after ours, or duplicated date times
+            for weather_state, date_time in zip(weather_states, date_times):
+                self.add(weather_state, date_time)
+            return
+
+        days = array("l", [date_time.toordinal() for date_time in date_times])
+        if self._days_sorted:
+            previous_day = self._days[-1] if self._days else days[0]
+            self._days_sorted = all(previous <= day for previous, day in zip([previous_day, *days], days))
+        self._date_times.extend(date_times)
+        self._timestamps.extend(timestamps)
+        self._days.extend(days)
+        for column, values in zip(self._fields.values(), zip(*weather_states)):
+            column.extend([value if value is not None else MISSING for value in values])
 
     def get_dates(self) -> List[datetime]:
         # returns a list of datetimes, ordered by date
-        dates = [forecast[0] for forecast in self._forecasts]
-        dates.sort()
-        return dates
+        return list(self._date_times)
 
     def get_weather_states_for_date(self, date: date) -> List[WeatherState]:
         # Returns a list of weather states for the date specified
-        weather_states = []
-        for forecast in self._forecasts:
-            if forecast[0].date() == date:
-                weather_states.append(forecast[1])
-        return weather_states
+        start, end = self._day_range(date, date)
+        return [self._weather_state(index) for index in range(start, end) if self._days[index] == date.toordinal()]
+
+    def between(self, start_date: date, end_date: date):
+        """
+        Returns a new forecast with the weather states between both dates, included
+        """
+        start, end = self._day_range(start_date, end_date)
+        forecast = Forecast()
+        if self._days_sorted:
+            forecast._extend(self, start, end)
+            return forecast
+
+        for index in range(start, end):
+            if start_date.toordinal() <= self._days[index] <= end_date.toordinal():
+                forecast._insert(
+                    len(forecast), self._weather_state(index), self._date_times[index], self._timestamps[index]
+                )
+        return forecast
+
+    def columns(self) -> Dict[str, memoryview]:
+        """
+        Returns read only views, without copies, of the numeric columns sorted by date and time:
+        "timestamp" (seconds since the epoch), "day" (ordinal of the date in the date time timezone)
+        and one column per weather state field, NaN where missing.
+        The forecast can not be added to while the views are alive.
+        """
+        columns = {"timestamp": memoryview(self._timestamps).toreadonly(), "day": memoryview(self._days).toreadonly()}
+        for field, column in self._fields.items():
+            columns[field] = memoryview(column).toreadonly()
+        return columns
 
     def __len__(self):
-        return len(self._forecasts)
+        return len(self._date_times)
+
+    def __iter__(self) -> Iterator[Tuple[datetime, WeatherState]]:
+        rows = zip(*self._fields.values())
+        return zip(self._date_times, (WeatherState._make(_missing_to_none(row)) for row in rows))
+
+    def _insert(self, index: int, weather_state: WeatherState, date_time: datetime, timestamp: float) -> None:
+        day = date_time.toordinal()
+        if self._days_sorted:
+            before = self._days[index - 1] if index > 0 else day
+            after = self._days[index] if index < len(self._days) else day
+            self._days_sorted = before <= day <= after
+
+        self._date_times.insert(index, date_time)
+        self._timestamps.insert(index, timestamp)
+        self._days.insert(index, day)
+        for field, value in zip(WeatherState._fields, weather_state):
+            self._fields[field].insert(index, value if value is not None else MISSING)
+
+    def _extend(self, forecast: "Forecast", start: int, end: int) -> None:
+        # Appends the entries from start to end of the given forecast, they should be sorted after ours
+        self._date_times.extend(forecast._date_times[start:end])
+        self._timestamps.extend(forecast._timestamps[start:end])
+        self._days.extend(forecast._days[start:end])
+        for field, column in self._fields.items():
+            column.extend(forecast._fields[field][start:end])
+
+    def _weather_state(self, index: int) -> WeatherState:
+        return WeatherState._make(_missing_to_none(column[index] for column in self._fields.values()))
+
+    def _day_range(self, start_date: date, end_date: date) -> Tuple[int, int]:
+        """
+        Returns the indexes range of the entries between both dates, or all of them if the days are not sorted
+        """
+        if not self._days_sorted:
+            return 0, len(self._days)
+        return bisect_left(self._days, start_date.toordinal()), bisect_right(self._days, end_date.toordinal())
+
 
-    def __iter__(self):
-        self._forecasts.sort(key=lambda x: x[0])
-        return iter(self._forecasts)
+def _missing_to_none(values: Iterable[float]) -> Iterator[float]:
+    # NaN is the only value not equal to itself
+    return (value if value == value else None for value in values)
@@ -0,0 +1,97 @@
+"""
+Batch parser of the OpenWeatherMap forecast items.
+Each field is extracted for all the items at once and validated per column,
+then the weather states are created straight from the columns, without a builder per item.
+
+Invalid payloads are not reported here: parse_forecast_items returns None and the caller parses
+the items one by one with the WeatherStateBuilder, so the errors raised are the per item ones.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from .forecast import Forecast
+from .weather_state import WeatherState
+
+# Client data section and key of each weather state field, in the WeatherState field order
+FIELDS = (
+    ("main", "temp"),
+    ("main", "humidity"),
+    ("main", "feels_like"),
+    ("main", "pressure"),
+    ("wind", "speed"),
+    ("wind", "gust"),
+    ("wind", "deg"),
+    ("clouds", "all"),
+    ("rain", "1h"),
+    ("rain", "3h"),
+    ("snow", "1h"),
+    ("snow", "3h"),
+)
+
+# Column indexes of the WeatherStateBuilder validations
+MANDATORY = (0, 1, 2, 3)
+POSITIVE = (3, 5, 8, 9, 10, 11)
+PERCENTAGE = (1, 7)
+ANGLE = (6,)
+
+
+def parse_forecast_items(forecast_data: List[Dict], tz: timezone) -> Optional[Forecast]:
+    """
+    Returns the forecast of the client data items, or None if any item is not valid
+    """
+    try:
+        # Local date times of the location, dt is a UTC timestamp
+        date_times = [datetime.fromtimestamp(item["dt"], tz) for item in forecast_data]
+        columns = _extract_columns(forecast_data)
+        if not _are_valid(columns):
+            return None
+    except Exception:
+        # Malformed items, the per item parsing raises the right error
+        return None
+
+    forecast = Forecast()
+    try:
+        forecast.add_all(map(WeatherState._make, zip(*columns)), date_times)
+    except ValueError:
+        # Duplicated date times, the per item parsing raises the right error
+        return None
+    return forecast
+
+
+def _extract_columns(forecast_data: List[Dict]) -> List[list]:
+    sections = {}
+    columns = []
+    for section, key in FIELDS:
+        if section not in sections:
+            sections[section] = [item.get(section, {}) for item in forecast_data]
+        columns.append([data.get(key, None) for data in sections[section]])
+    return columns
+
+
+def _are_valid(columns: List[list]) -> bool:
+    for index in MANDATORY:
+        if None in columns[index]:
+            return False
+    for indexes, low, high in ((POSITIVE, 0, None), (PERCENTAGE, 0, 100), (ANGLE, 0, 360)):
+        for index in indexes:
+            bounds = _bounds(columns[index])
+            if bounds is None:
+                return False
+            if bounds and (bounds[0] < low or (high is not None and bounds[1] > high)):
+                return False
+    return True
+
+
+def _bounds(column: list) -> Optional[tuple]:
+    """
+    Returns the min and max of the column values, an empty tuple if all are missing
+    None if the bounds are not reliable (NaN values), the column is then validated item by item
+    """
+    values = column if None not in column else [value for value in column if value is not None]
+    if not values:
+        return ()
+    total = sum(values)
+    if total != total:
+        return None
+    return min(values), max(values)
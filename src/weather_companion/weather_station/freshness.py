@@ -0,0 +1,40 @@
+"""
+Freshness of the weather results, for conditional requests: a digest that changes only when the result values
+change, and the seconds the result stays fresh in the caches.
+"""
+
+import hashlib
+from typing import NamedTuple, Union
+
+from .forecast import Forecast
+from .weather_state import PackedWeatherState, WeatherState
+
+
+class Freshness(NamedTuple):
+    # Equal digests mean equal results
+    digest: str
+    # Seconds the result stays fresh, 0 if it is stale or it is not cached
+    max_age: float = 0
+
+
+def digest(value: Union[WeatherState, PackedWeatherState, Forecast], *parts: str) -> str:
+    """
+    Returns the digest of a weather state or a forecast values, and of the given parts (i.e. the cache key).
+    Hashes the packed weather state or the forecast columns, so it is cheaper than serializing the value.
+    """
+    value_hash = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        value_hash.update(part.encode())
+        value_hash.update(b"\0")
+    if isinstance(value, Forecast):
+        for column in value.columns().values():
+            with column:
+                value_hash.update(column)
+        # Date times are serialized with their timezone, the columns only have their timestamps
+        offsets = sorted({str(date_time.utcoffset()) for date_time in value.get_dates()})
+        value_hash.update(",".join(offsets).encode())
+    elif isinstance(value, PackedWeatherState):
+        value_hash.update(value)
+    else:
+        value_hash.update(PackedWeatherState.pack(value))
+    return value_hash.hexdigest()
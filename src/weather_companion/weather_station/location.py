@@ -1,5 +1,12 @@
+import math
+
 from geopy.distance import geodesic
 
+# Mean radius of the earth in km
+EARTH_RADIUS = 6371.0088
+# The great circle distance on the mean sphere differs from the geodesic one on the ellipsoid by less than 0.6%
+SPHERICAL_DISTANCE_ERROR = 0.01
+
 
 class Location:
     """
@@ -24,6 +31,28 @@ class Location:
         """
         return geodesic((self.latitude, self.longitude), (other.latitude, other.longitude)).km
 
+    def great_circle_distance_to(self, other) -> float:
+        """
+        Returns the great circle distance (haversine) to another location in km, on a spherical earth
+        It is an approximation of distance_to, within SPHERICAL_DISTANCE_ERROR, and much cheaper
+        """
+        latitude, other_latitude = math.radians(self.latitude), math.radians(other.latitude)
+        haversine = (
+            math.sin((other_latitude - latitude) / 2) ** 2
+            + math.cos(latitude)
+            * math.cos(other_latitude)
+            * math.sin(math.radians(other.longitude - self.longitude) / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS * math.asin(min(math.sqrt(haversine), 1.0))
+
+    def rounded(self, precision: int):
+        """
+        Returns the location with its coordinates rounded to precision decimal places
+        Close locations share the same rounded location, i.e. the same grid cell
+        """
+        # Adding 0.0 turns -0.0 into 0.0, so both sides of the equator/meridian map to the same cell
+        return Location(round(self.latitude, precision) + 0.0, round(self.longitude, precision) + 0.0)
+
     def to_dict(self):
         return {"latitude": self.latitude, "longitude": self.longitude}
 
@@ -1,27 +1,157 @@
-import requests
+import asyncio
+import time
+from typing import Tuple
 
 from .location import Location
+from .rate_limiter import RateLimiter
+from .resilience import Admission, CircuitBreaker, RetryBudget, RetryPolicy
+from .transport import AsyncHTTPTransport, HTTPTransport
+
+OWM_BASE_URL = "https://api.openweathermap.org/data/2.5"
+
+# Seconds the calls are paused when the api answers 429 without a Retry-After header
+DEFAULT_RETRY_AFTER = 60
 
 
 class ClientError(Exception):
     pass
 
 
-class OWMClient:
-    def __init__(self, api_key: str):
-        self._api_key = api_key
-        self._base_url = "https://api.openweathermap.org/data/2.5"
+class CircuitOpenError(ClientError):
+    """
+    Raised without calling the upstream api, while the circuit breaker is open
+    """
+
+    pass
+
+
+class RateLimitedError(ClientError):
+    """
+    Raised when the quota is exhausted, either by the api (429) or by the rate limiter before the deadline
+    """
+
+    pass
+
+
+class _RetryableError(ClientError):
+    pass
+
+
+class _ResilientClient:
+    """
+    Deadline, retries, circuit breaker and quota bookkeeping, shared by the sync and the asyncio clients.
+    """
+
+    def __init__(
+        self,
+        retry_policy: RetryPolicy = None,
+        retry_budget: RetryBudget = None,
+        circuit_breaker: CircuitBreaker = None,
+        rate_limiter: RateLimiter = None,
+    ):
+        self._retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self._retry_budget = retry_budget if retry_budget is not None else RetryBudget()
+        self._circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self._rate_limiter = rate_limiter
+
+    def _start_call(self) -> Tuple[float, Admission]:
+        """
+        Returns the deadline of the call and its circuit breaker admission
+        Raises CircuitOpenError if the circuit is open
+        """
+        admission = self._circuit_breaker.allow_request()
+        if admission is None:
+            raise CircuitOpenError("OpenWeatherMap API circuit is open, failing fast")
+        self._retry_budget.deposit()
+        return time.monotonic() + self._retry_policy.deadline, admission
+
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ClientError("OpenWeatherMap API error - deadline exceeded")
+        return remaining
+
+    def _check_response(self, response):
+        """
+        Records the attempt result in the circuit breaker, returns the response if successful
+        Server errors and rate limiting are retryable, other errors are not and do not count as upstream failures
+        """
+        if response.status_code == 200:
+            self._circuit_breaker.record_success()
+            return response
+
+        message = f"OpenWeatherMap API returned an error - {response.status_code} - {response.text}"
+        if response.status_code == 429:
+            # Quota exhausted, the upstream is alive: pause the calls instead of opening the circuit
+            self._circuit_breaker.record_success()
+            if self._rate_limiter is not None:
+                self._rate_limiter.pause(self._retry_after(response))
+            raise _RetryableError(message)
+        if response.status_code >= 500:
+            self._circuit_breaker.record_failure()
+            raise _RetryableError(message)
+        self._circuit_breaker.record_success()
+        raise ClientError(message)
+
+    @staticmethod
+    def _retry_after(response) -> float:
+        try:
+            return float(response.headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+        except ValueError:
+            return DEFAULT_RETRY_AFTER
+
+    @staticmethod
+    def _quota_exhausted() -> ClientError:
+        return RateLimitedError("OpenWeatherMap API quota exhausted before the deadline")
+
+    def _transport_error(self, ex: Exception) -> ClientError:
+        self._circuit_breaker.record_failure()
+        return _RetryableError(f"OpenWeatherMap API error - {ex}")
+
+    def _backoff(self, retry: int, deadline: float, error: _RetryableError) -> Tuple[float, Admission]:
+        """
+        Returns the seconds to wait before retrying and the circuit breaker admission of the retry,
+        raises the error if the call can not be retried
+        """
+        backoff = self._retry_policy.backoff(retry)
+        admission = None
+        if retry < self._retry_policy.max_retries and time.monotonic() + backoff < deadline:
+            admission = self._circuit_breaker.allow_request()
+        if admission is None or not self._retry_budget.withdraw():
+            if admission is not None:
+                self._circuit_breaker.release_probe(admission)
+            raise ClientError(str(error))
+        return backoff, admission
 
-        # @TODO: add retry and timeout policy
+
+class OWMClient(_ResilientClient):
+    def __init__(
+        self,
+        api_key: str,
+        transport: HTTPTransport = None,
+        retry_policy: RetryPolicy = None,
+        retry_budget: RetryBudget = None,
+        circuit_breaker: CircuitBreaker = None,
+        rate_limiter: RateLimiter = None,
+        base_url: str = OWM_BASE_URL,
+    ):
+        """
+        transport is optional, a pooled transport with the default timeouts is used if not given
+        retry_policy, retry_budget and circuit_breaker are optional, the defaults are used if not given
+        rate_limiter is optional, calls are not rate limited if not given
+        base_url is the api url, it can point to a local stand-in like the FakeOWMServer
+        """
+        super().__init__(retry_policy, retry_budget, circuit_breaker, rate_limiter)
+        self._api_key = api_key
+        self._base_url = base_url.rstrip("/")
+        self._transport = transport if transport is not None else HTTPTransport()
 
     def get_current_state(self, location: Location) -> dict:
         """
         Gets the current weather state for a given location.
         """
-        endpoint = (
-            self._base_url
-            + f"/weather?lat={location.latitude}&lon={location.longitude}&appid={self._api_key}&units=metric"
-        )
+        endpoint = _build_endpoint(self._base_url, "weather", location, self._api_key)
         response = self._request(endpoint)
         return response.json()
 
@@ -29,18 +159,121 @@ class OWMClient:
         """
         Gets the weather forecast for a location, given a start and end date.
         """
-        endpoint = (
-            self._base_url
-            + f"/forecast?lat={location.latitude}&lon={location.longitude}&appid={self._api_key}&units=metric"
-        )
+        endpoint = _build_endpoint(self._base_url, "forecast", location, self._api_key)
         response = self._request(endpoint)
         return response.json()
 
+    def close(self) -> None:
+        """
+        Closes the transport connections
+        """
+        self._transport.close()
+
     def _request(self, endpoint):
+        deadline, admission = self._start_call()
+        retry = 0
+        try:
+            while True:
+                try:
+                    return self._attempt(endpoint, deadline)
+                except _RetryableError as ex:
+                    backoff, admission = self._backoff(retry, deadline, ex)
+                    time.sleep(backoff)
+                    retry += 1
+        except BaseException:
+            # No-op unless the call holds the probe of a half open circuit and it recorded no outcome
+            self._circuit_breaker.release_probe(admission)
+            raise
+
+    def _attempt(self, endpoint: str, deadline: float):
+        if self._rate_limiter is not None and not self._rate_limiter.acquire(timeout=self._remaining(deadline)):
+            raise self._quota_exhausted()
+        timeout = self._remaining(deadline)
+        try:
+            response = self._transport.get(endpoint, timeout=timeout)
+        except Exception as ex:
+            raise self._transport_error(ex)
+        return self._check_response(response)
+
+
+class AsyncOWMClient(_ResilientClient):
+    """
+    Asyncio version of the OWMClient, same surface but the methods must be awaited.
+    Requests do not block the event loop, so concurrency scales with the in flight upstream calls.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        transport: AsyncHTTPTransport = None,
+        retry_policy: RetryPolicy = None,
+        retry_budget: RetryBudget = None,
+        circuit_breaker: CircuitBreaker = None,
+        rate_limiter: RateLimiter = None,
+        base_url: str = OWM_BASE_URL,
+    ):
+        """
+        transport is optional, a pooled transport with the default timeouts is used if not given
+        retry_policy, retry_budget and circuit_breaker are optional, the defaults are used if not given
+        rate_limiter is optional, calls are not rate limited if not given
+        base_url is the api url, it can point to a local stand-in like the FakeOWMServer
+        """
+        super().__init__(retry_policy, retry_budget, circuit_breaker, rate_limiter)
+        self._api_key = api_key
+        self._base_url = base_url.rstrip("/")
+        self._transport = transport if transport is not None else AsyncHTTPTransport()
+
+    async def get_current_state(self, location: Location) -> dict:
+        """
+        Gets the current weather state for a given location.
+        """
+        endpoint = _build_endpoint(self._base_url, "weather", location, self._api_key)
+        response = await self._request(endpoint)
+        return response.json()
+
+    async def get_forecast(self, location: Location) -> dict:
+        """
+        Gets the weather forecast for a location.
+        """
+        endpoint = _build_endpoint(self._base_url, "forecast", location, self._api_key)
+        response = await self._request(endpoint)
+        return response.json()
+
+    async def aclose(self) -> None:
+        """
+        Closes the transport connections
+        """
+        await self._transport.aclose()
+
+    async def _request(self, endpoint):
+        deadline, admission = self._start_call()
+        retry = 0
         try:
-            response = requests.get(endpoint)
-            if response.status_code != 200:
-                raise ClientError(f"OpenWeatherMap API returned an error - {response.status_code} - {response.text}")
+            while True:
+                try:
+                    return await self._attempt(endpoint, deadline)
+                except _RetryableError as ex:
+                    backoff, admission = self._backoff(retry, deadline, ex)
+                    await asyncio.sleep(backoff)
+                    retry += 1
+        except BaseException:
+            # No-op unless the call holds the probe of a half open circuit and it recorded no outcome
+            self._circuit_breaker.release_probe(admission)
+            raise
+
+    async def _attempt(self, endpoint: str, deadline: float):
+        if self._rate_limiter is not None and not await self._rate_limiter.acquire_async(
+            timeout=self._remaining(deadline)
+        ):
+            raise self._quota_exhausted()
+        timeout = self._remaining(deadline)
+        try:
+            # wait_for also bounds the time spent waiting for a free request slot
+            response = await asyncio.wait_for(self._transport.get(endpoint, timeout=timeout), timeout)
         except Exception as ex:
-            raise ClientError(f"OpenWeatherMap API error - {ex}")
-        return response
+            raise self._transport_error(ex)
+        return self._check_response(response)
+
+
+def _build_endpoint(base_url: str, resource: str, location: Location, api_key: str) -> str:
+    return base_url + f"/{resource}?lat={location.latitude}&lon={location.longitude}&appid={api_key}&units=metric"
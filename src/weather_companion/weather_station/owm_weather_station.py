@@ -1,69 +1,58 @@
 from datetime import date, datetime, timedelta, timezone
 from typing import Dict
 
+from .cache import InMemoryWeatherCache, WeatherCache, call_async
 from .forecast import Forecast
-from .owm_client import ClientError, OWMClient
+from .forecast_parser import parse_forecast_items
+from .owm_client import AsyncOWMClient, ClientError, OWMClient
+from .single_flight import AsyncSingleFlight, SingleFlight
 from .weather_state import WeatherState, WeatherStateBuilder
-from .weather_station import Location, WeatherStationError
+from .weather_station import (
+    AsyncWeatherStation,
+    Location,
+    WeatherStation,
+    WeatherStationError,
+)
 
+DEFAULT_FULL_FORECAST_TTL = 1800
 
-class OWMWeatherStation:
+
+class _OWMDataParser:
     """
-    Defines a weather forecast provider that uses OpenWeatherMap.
+    Builds weather states and forecasts from OpenWeatherMap client data.
+    Shared by the sync and the asyncio weather stations.
     """
 
-    def __init__(self, client: OWMClient):
-        """
-        Creates a new instance of the OpenWeatherMap class.
-        """
-        self._client = client
-
-    def get_current_state(self, location) -> WeatherState:
-        """
-        Gets the current weather state for a given location.
-        """
-        try:
-            client_data = self._client.get_current_state(location)
-        except ClientError as ex:
-            raise WeatherStationError(f"Client error: {ex}")
-
-        weather_state = self._build_weather_state(client_data)
-        return weather_state
-
-    def get_forecast(self, location: Location, start_date: date, end_date: date) -> Forecast:
-        """
-        Gets the weather forecast for a given latitude and longitude for a given date and time.
-        """
-        try:
-            client_data = self._client.get_forecast(location)
-        except ClientError as ex:
-            raise WeatherStationError(f"Client error: {ex}")
-
-        forecast = self._build_forecast(client_data, start_date, end_date)
-        return forecast
-
-    def _build_forecast(self, client_data: Dict, start_date: date, end_date: date):
+    def _build_full_forecast(self, client_data: Dict) -> Forecast:
         location_timezone = self._get_timezone(client_data)
         forecast_data = self._get_forecast_data(client_data)
 
-        # Get weather state for each datetime inside the range specified
+        # Fast path, all the items parsed at once
+        forecast = parse_forecast_items(forecast_data, location_timezone)
+        if forecast is not None:
+            return forecast
+
+        # Some item is not valid, parse them one by one to raise its error
         forecast = Forecast()
         for data in forecast_data:
-            # Filter date range
-            forecast_datetime = self._get_forecast_datetime(data)
-            in_date_range = start_date <= forecast_datetime.date() <= end_date
-            if not in_date_range:
-                continue
-
             # Create weather state and add forecast with its date and timezone to the forecast
+            forecast_datetime = self._get_forecast_datetime(data, location_timezone)
             weather_state = self._build_weather_state(data)
-            forecast.add(weather_state, forecast_datetime, location_timezone)
+            try:
+                forecast.add(weather_state, forecast_datetime)
+            except ValueError as ex:
+                raise WeatherStationError(f"Client data error, {ex}")
 
         return forecast
 
-    def _get_forecast_datetime(self, forecast) -> datetime:
+    @staticmethod
+    def _full_forecast_key(location: Location) -> str:
+        return f"full_forecast:{location.latitude}:{location.longitude}"
+
+    def _get_forecast_datetime(self, forecast, tz: timezone) -> datetime:
         try:
-            forecast_date_time = datetime.fromtimestamp(forecast["dt"])
+            # The local date time of the location, dt is a UTC timestamp
+            forecast_date_time = datetime.fromtimestamp(forecast["dt"], tz)
         except KeyError:
             raise WeatherStationError("Client data error, missing forecast date")
         return forecast_date_time
@@ -114,3 +103,120 @@ class OWMWeatherStation:
         except ValueError as ex:
             raise WeatherStationError(f"Error creating weather state - {ex}")
         return weather_state
+
+
+class OWMWeatherStation(_OWMDataParser, WeatherStation):
+    """
+    Defines a weather forecast provider that uses OpenWeatherMap.
+    """
+
+    def __init__(
+        self, client: OWMClient, forecast_cache: WeatherCache = None, forecast_ttl: float = DEFAULT_FULL_FORECAST_TTL
+    ):
+        """
+        Creates a new instance of the OpenWeatherMap class.
+        The full forecast of a location is fetched once per forecast_ttl seconds and kept in the forecast_cache,
+        date ranges are sliced from it.
+        """
+        self._client = client
+        self._forecast_cache = forecast_cache if forecast_cache is not None else InMemoryWeatherCache()
+        self._forecast_ttl = forecast_ttl
+        self._single_flight = SingleFlight()
+
+    def get_current_state(self, location) -> WeatherState:
+        """
+        Gets the current weather state for a given location.
+        """
+        try:
+            client_data = self._client.get_current_state(location)
+        except ClientError as ex:
+            raise WeatherStationError(f"Client error: {ex}")
+
+        weather_state = self._build_weather_state(client_data)
+        return weather_state
+
+    def get_forecast(self, location: Location, start_date: date, end_date: date) -> Forecast:
+        """
+        Gets the weather forecast for a given latitude and longitude for a given date and time.
+        """
+        key = self._full_forecast_key(location)
+        full_forecast = self._forecast_cache.get(key)
+        if full_forecast is None:
+            full_forecast = self._single_flight.do(key, self._fetch_full_forecast, key, location)
+        return full_forecast.between(start_date, end_date)
+
+    def _fetch_full_forecast(self, key: str, location: Location) -> Forecast:
+        try:
+            client_data = self._client.get_forecast(location)
+        except ClientError as ex:
+            raise WeatherStationError(f"Client error: {ex}")
+
+        full_forecast = self._build_full_forecast(client_data)
+        self._forecast_cache.set(key, full_forecast, self._forecast_ttl)
+        return full_forecast
+
+    def close(self) -> None:
+        """
+        Closes the client connections
+        """
+        self._client.close()
+
+
+class AsyncOWMWeatherStation(_OWMDataParser, AsyncWeatherStation):
+    """
+    Defines an asyncio weather forecast provider that uses OpenWeatherMap.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOWMClient,
+        forecast_cache: WeatherCache = None,
+        forecast_ttl: float = DEFAULT_FULL_FORECAST_TTL,
+    ):
+        """
+        Creates a new instance of the asyncio OpenWeatherMap station.
+        The full forecast of a location is fetched once per forecast_ttl seconds and kept in the forecast_cache,
+        date ranges are sliced from it.
+        """
+        self._client = client
+        self._forecast_cache = forecast_cache if forecast_cache is not None else InMemoryWeatherCache()
+        self._forecast_ttl = forecast_ttl
+        self._single_flight = AsyncSingleFlight()
+
+    async def get_current_state(self, location: Location) -> WeatherState:
+        """
+        Gets the current weather state for a given location.
+        """
+        try:
+            client_data = await self._client.get_current_state(location)
+        except ClientError as ex:
+            raise WeatherStationError(f"Client error: {ex}")
+
+        weather_state = self._build_weather_state(client_data)
+        return weather_state
+
+    async def get_forecast(self, location: Location, start_date: date, end_date: date) -> Forecast:
+        """
+        Gets the weather forecast for a given location for a given date range.
+        """
+        key = self._full_forecast_key(location)
+        full_forecast = await call_async(self._forecast_cache, self._forecast_cache.get, key)
+        if full_forecast is None:
+            full_forecast = await self._single_flight.do(key, self._fetch_full_forecast, key, location)
+        return full_forecast.between(start_date, end_date)
+
+    async def _fetch_full_forecast(self, key: str, location: Location) -> Forecast:
+        try:
+            client_data = await self._client.get_forecast(location)
+        except ClientError as ex:
+            raise WeatherStationError(f"Client error: {ex}")
+
+        full_forecast = self._build_full_forecast(client_data)
+        await call_async(self._forecast_cache, self._forecast_cache.set, key, full_forecast, self._forecast_ttl)
+        return full_forecast
+
+    async def aclose(self) -> None:
+        """
+        Closes the client connections
+        """
+        await self._client.aclose()
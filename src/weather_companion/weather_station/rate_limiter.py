@@ -0,0 +1,153 @@
+"""
+Upstream quota rate limiting.
+A token bucket refilled at the calls per minute of the quota, callers waiting for a token
+are served by priority: interactive requests first, background refreshes and prefetches last.
+
+The priority of the calls is taken from the context, see request_priority.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Callable, Iterator, List
+
+# Waiters that are not served poll between these intervals (seconds), threaded waiters are also notified
+MIN_POLL_INTERVAL = 0.005
+MAX_POLL_INTERVAL = 0.5
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+    PREFETCH = 2
+
+
+_request_priority = contextvars.ContextVar("request_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: Priority) -> Iterator[None]:
+    """
+    Upstream calls made inside the context (and the asyncio tasks created in it) use this priority
+    """
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+def current_priority() -> Priority:
+    return _request_priority.get()
+
+
+class RateLimiter:
+    """
+    Thread safe token bucket rate limiter with a priority queue of waiters.
+    Can be shared by threaded and asyncio callers.
+    """
+
+    def __init__(self, calls_per_minute: float, burst: int = None, clock: Callable[[], float] = time.monotonic):
+        """
+        burst is the bucket capacity, the calls that can be made at once, defaults to a sixth of the quota
+        """
+        if calls_per_minute <= 0:
+            raise ValueError("calls per minute should be a positive number")
+        self._rate = calls_per_minute / 60
+        self._capacity = burst if burst is not None else max(1, int(calls_per_minute / 6))
+        self._clock = clock
+        self._tokens = float(self._capacity)
+        self._updated_at = clock()
+        self._paused_until = 0.0
+        self._waiters: List[list] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def acquire(self, priority: Priority = None, timeout: float = None) -> bool:
+        """
+        Waits for a token, returns False if it could not be acquired before timeout seconds
+        priority defaults to the priority of the context
+        """
+        waiter = self._enqueue(priority)
+        deadline = self._deadline(timeout)
+        with self._condition:
+            while True:
+                wait = self._try_acquire(waiter, deadline)
+                if wait is None:
+                    return waiter[-1]
+                self._condition.wait(wait)
+
+    async def acquire_async(self, priority: Priority = None, timeout: float = None) -> bool:
+        """
+        Asyncio version of acquire, does not block the event loop
+        """
+        waiter = self._enqueue(priority)
+        deadline = self._deadline(timeout)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_acquire(waiter, deadline)
+                if wait is None:
+                    return waiter[-1]
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            with self._condition:
+                self._remove(waiter)
+            raise
+
+    def pause(self, seconds: float) -> None:
+        """
+        No tokens are given during the next seconds, used when the upstream answers it is rate limiting us
+        """
+        with self._condition:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+            self._tokens = 0.0
+
+    def _enqueue(self, priority: Priority) -> list:
+        priority = priority if priority is not None else current_priority()
+        # [priority, sequence, acquired], the sequence keeps the order of arrival for the same priority
+        waiter = [int(priority), next(self._sequence), False]
+        with self._condition:
+            heapq.heappush(self._waiters, waiter)
+        return waiter
+
+    def _deadline(self, timeout: float) -> float:
+        return self._clock() + timeout if timeout is not None else float("inf")
+
+    def _try_acquire(self, waiter: list, deadline: float):
+        """
+        Must be called holding the condition lock.
+        Returns None once the waiter is done (acquired or timed out), otherwise the seconds to wait before retrying
+        """
+        now = self._clock()
+        self._refill(now)
+        if self._waiters[0] is waiter and self._tokens >= 1 and now >= self._paused_until:
+            heapq.heappop(self._waiters)
+            self._tokens -= 1
+            waiter[-1] = True
+            self._condition.notify_all()
+            return None
+
+        if now >= deadline:
+            self._remove(waiter)
+            return None
+
+        next_token_at = max(self._paused_until, now + max(0.0, 1 - self._tokens) / self._rate)
+        wait = max(next_token_at - now, MIN_POLL_INTERVAL)
+        return min(wait, deadline - now, MAX_POLL_INTERVAL)
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - max(self._updated_at, self._paused_until))
+        self._tokens = min(self._capacity, self._tokens + elapsed * self._rate)
+        self._updated_at = now
+
+    def _remove(self, waiter: list) -> None:
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+            self._condition.notify_all()
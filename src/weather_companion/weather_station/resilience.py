@@ -0,0 +1,159 @@
+"""
+Upstream resilience policies used by the OpenWeatherMap clients:
+    - RetryPolicy: per call deadline and retries with jittered exponential backoff
+    - RetryBudget: caps the retries to a ratio of the requests, so retries do not multiply the load of a degraded upstream
+    - CircuitBreaker: fails fast while the upstream keeps failing, and probes it again after a while
+"""
+
+import random
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+
+class RetryPolicy(NamedTuple):
+    # Seconds for the whole call, retries included
+    deadline: float = 10.0
+    max_retries: int = 2
+    # Backoff of the n-th retry is a random value between 0 and min(max_delay, base_delay * 2**n)
+    base_delay: float = 0.1
+    max_delay: float = 2.0
+
+    def backoff(self, retry: int) -> float:
+        """
+        Returns the seconds to wait before the retry number retry (starting at 0)
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+
+class RetryBudget:
+    """
+    Thread safe retry budget: every request deposits ratio tokens, every retry withdraws one.
+    The budget starts with min_tokens, and while it is below min_tokens it also refills with time,
+    refill_rate tokens per second, so low traffic can still retry.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.2,
+        min_tokens: float = 10,
+        max_tokens: float = 100,
+        refill_rate: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._ratio = ratio
+        self._min_tokens = min_tokens
+        self._max_tokens = max_tokens
+        self._refill_rate = refill_rate
+        self._clock = clock
+        self._tokens = min_tokens
+        self._refilled_at = clock()
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._max_tokens, self._tokens + self._ratio)
+
+    def withdraw(self) -> bool:
+        """
+        Returns True if a retry is allowed
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _refill(self) -> None:
+        now = self._clock()
+        if self._tokens < self._min_tokens:
+            self._tokens = min(self._min_tokens, self._tokens + (now - self._refilled_at) * self._refill_rate)
+        self._refilled_at = now
+
+
+class Admission(NamedTuple):
+    """
+    Request allowed by the circuit breaker
+    """
+
+    # Number of the probe of a half open circuit, None for the requests of a closed circuit
+    probe: Optional[int] = None
+
+
+class CircuitBreaker:
+    """
+    Thread safe circuit breaker.
+    Opens after failure_threshold consecutive failures, while open requests are not allowed.
+    After reset_timeout seconds a single probe request is allowed (half open), it closes the circuit if it succeeds.
+    A probe without outcome after reset_timeout seconds (cancelled or abandoned) is replaced by a new one.
+    The admission of the probe identifies it, only the request holding it can release the probe.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic
+    ):
+        if failure_threshold < 1:
+            raise ValueError("failure threshold should be a positive number")
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CircuitBreaker.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started_at = 0.0
+        self._probe = 0
+
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> Optional[Admission]:
+        """
+        Returns the admission of the request, None if it is not allowed
+        """
+        with self._lock:
+            if self._state == CircuitBreaker.CLOSED:
+                return Admission()
+            now = self._clock()
+            if self._state == CircuitBreaker.OPEN and now - self._opened_at >= self._reset_timeout:
+                self._state = CircuitBreaker.HALF_OPEN
+                return self._start_probe(now)
+            if self._state == CircuitBreaker.HALF_OPEN and now - self._probe_started_at >= self._reset_timeout:
+                # The probe in flight never recorded its outcome, it was lost
+                return self._start_probe(now)
+            # Open, or half open with the probe request in flight
+            return None
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CircuitBreaker.CLOSED
+            self._failures = 0
+
+    def release_probe(self, admission: Admission) -> None:
+        """
+        Gives back the probe of a half open circuit that ended without reaching the upstream
+        (quota exhausted, deadline exceeded, cancelled), so the next request probes again.
+        No-op unless the admission is the one of the probe in flight.
+        """
+        with self._lock:
+            if self._state == CircuitBreaker.HALF_OPEN and admission.probe == self._probe:
+                self._probe_started_at = float("-inf")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == CircuitBreaker.HALF_OPEN or self._failures >= self._failure_threshold:
+                self._state = CircuitBreaker.OPEN
+                self._opened_at = self._clock()
+
+    def _start_probe(self, now: float) -> Admission:
+        self._probe += 1
+        self._probe_started_at = now
+        return Admission(probe=self._probe)
@@ -0,0 +1,88 @@
+"""
+Request coalescing: while a call for a key is in flight, later calls with the same key
+wait for it and share its result (or its error) instead of starting a new one.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Thread safe request coalescing, for threaded callers
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, function: Callable[..., Any], *args) -> Any:
+        """
+        Calls function(*args), unless a call for the same key is in flight, then waits for its result.
+        Errors raised by the call are raised to every caller.
+        """
+        with self._lock:
+            future = self._calls.get(key, None)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = function(*args)
+        except BaseException as ex:
+            future.set_exception(ex)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self) -> int:
+        """
+        Returns the number of calls in flight
+        """
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """
+    Request coalescing for asyncio callers, must be used from a single event loop
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, function: Callable[..., Awaitable[Any]], *args) -> Any:
+        """
+        Awaits function(*args), unless a call for the same key is in flight, then waits for its result.
+        Errors raised by the call are raised to every caller.
+        The call runs in its own task, cancelling one of the callers does not cancel it for the others.
+        """
+        task = self._calls.get(key, None)
+        if task is None:
+            task = asyncio.ensure_future(function(*args))
+            self._calls[key] = task
+            task.add_done_callback(lambda done_task: self._forget(key, done_task))
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        """
+        Returns the number of calls in flight
+        """
+        return len(self._calls)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key, None) is task:
+            del self._calls[key]
+        # Mark the error as retrieved, every caller may have been cancelled before the call ended
+        if not task.cancelled():
+            task.exception()
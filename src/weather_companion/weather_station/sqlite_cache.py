@@ -0,0 +1,137 @@
+"""
+SQLite implementation of the WeatherCache.
+The cache lives in a local file in WAL mode, so every worker process of a host shares it:
+a result fetched by one worker serves all the others.
+"""
+
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from .cache import CacheEntry, CacheStats, WeatherCache
+
+# Eviction runs once every EVICTION_INTERVAL writes, the cache may exceed max_size by that many entries
+EVICTION_INTERVAL = 100
+# Access times are updated at most once per ACCESS_RESOLUTION seconds, so most reads do not write
+ACCESS_RESOLUTION = 1.0
+
+
+class SQLiteWeatherCache(WeatherCache):
+    """
+    Cache shared between processes, stored in a SQLite file.
+    Values are pickled, the least recently used entries are evicted when max_size is reached.
+    Hit, miss and eviction counters are the ones of the current process.
+    """
+
+    # Disk I/O, and waits up to busy_timeout for the other processes
+    blocking = True
+
+    def __init__(
+        self,
+        path: str,
+        max_size: int = 10000,
+        clock: Callable[[], float] = time.time,
+        busy_timeout: float = 5.0,
+    ):
+        """
+        path is the SQLite database file, created if it does not exist
+        busy_timeout is the number of seconds to wait for the locks held by other processes
+        """
+        if max_size < 1:
+            raise ValueError("max size should be a positive number")
+        self._max_size = max_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS weather_cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                kept_until REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS weather_cache_accessed_at ON weather_cache (accessed_at)")
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._stale_hits = 0
+        self._writes = 0
+
+    def get(self, key: str) -> Any:
+        entry = self._get_entry(key, allow_stale=False)
+        return entry.value if entry is not None else None
+
+    def get_entry(self, key: str) -> Optional[CacheEntry]:
+        return self._get_entry(key, allow_stale=True)
+
+    def set(self, key: str, value: Any, ttl: float, stale_ttl: float = 0) -> None:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            now = self._clock()
+            expires_at = now + ttl
+            self._connection.execute(
+                "INSERT OR REPLACE INTO weather_cache (key, value, expires_at, kept_until, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, data, expires_at, expires_at + stale_ttl, now),
+            )
+            self._writes += 1
+            if self._writes % EVICTION_INTERVAL == 0:
+                self._evict(now)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            (size,) = self._connection.execute("SELECT COUNT(*) FROM weather_cache").fetchone()
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                size=size,
+                stale_hits=self._stale_hits,
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _get_entry(self, key: str, allow_stale: bool) -> Optional[CacheEntry]:
+        with self._lock:
+            now = self._clock()
+            row = self._connection.execute(
+                "SELECT value, expires_at, kept_until, accessed_at FROM weather_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[2] <= now:
+                self._misses += 1
+                return None
+
+            data, expires_at, _, accessed_at = row
+            is_stale = expires_at <= now
+            if is_stale and not allow_stale:
+                self._misses += 1
+                return None
+
+            if now - accessed_at >= ACCESS_RESOLUTION:
+                self._connection.execute("UPDATE weather_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            if is_stale:
+                self._stale_hits += 1
+            else:
+                self._hits += 1
+
+        return CacheEntry(value=pickle.loads(data), expires_in=expires_at - now)
+
+    def _evict(self, now: float) -> None:
+        # Entries no longer kept are dropped, then the least recently used ones over max size are evicted
+        self._connection.execute("DELETE FROM weather_cache WHERE kept_until <= ?", (now,))
+        cursor = self._connection.execute(
+            "DELETE FROM weather_cache WHERE key IN "
+            "(SELECT key FROM weather_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self._max_size,),
+        )
+        self._evictions += cursor.rowcount
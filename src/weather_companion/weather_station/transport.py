@@ -0,0 +1,123 @@
+"""
+HTTP transports used by the OpenWeatherMap clients.
+Connections are pooled and kept alive, requests have connect/read timeouts
+and the number of concurrent upstream requests is bounded.
+"""
+
+import asyncio
+import threading
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10.0
+DEFAULT_POOL_SIZE = 20
+DEFAULT_MAX_CONCURRENT_REQUESTS = 20
+
+
+class HTTPTransport:
+    """
+    Pooled, keep-alive HTTP transport, based on a requests Session.
+    Thread safe, requests over max_concurrent_requests wait for a free slot.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+    ):
+        """
+        Timeouts are in seconds, pool_size is the number of connections kept alive per host
+        """
+        self._check_is_positive(max_concurrent_requests, "max concurrent requests")
+        self._check_is_positive(pool_size, "pool size")
+        self._timeout = (connect_timeout, read_timeout)
+        self._semaphore = threading.BoundedSemaphore(max_concurrent_requests)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def get(self, url: str, timeout: float = None) -> requests.Response:
+        """
+        Sends a GET request, raises the requests exceptions on connection errors or timeouts
+        timeout, in seconds, shortens the read timeout of this request
+        """
+        connect_timeout, read_timeout = self._timeout
+        if timeout is not None:
+            read_timeout = min(read_timeout, timeout)
+        if not self._semaphore.acquire(timeout=timeout):
+            raise TimeoutError("Timed out waiting for a free request slot")
+        try:
+            return self._session.get(url, timeout=(connect_timeout, read_timeout))
+        finally:
+            self._semaphore.release()
+
+    def close(self) -> None:
+        """
+        Closes all the pooled connections
+        """
+        self._session.close()
+
+    @staticmethod
+    def _check_is_positive(value: int, variable_name: str) -> None:
+        if value < 1:
+            raise ValueError(f"{variable_name} should be a positive number")
+
+
+class AsyncHTTPTransport:
+    """
+    Asyncio version of the HTTPTransport, based on an httpx AsyncClient.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+    ):
+        """
+        Timeouts are in seconds, pool_size is the number of connections kept alive
+        """
+        HTTPTransport._check_is_positive(max_concurrent_requests, "max concurrent requests")
+        HTTPTransport._check_is_positive(pool_size, "pool size")
+        self._timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self._max_concurrent_requests = max_concurrent_requests
+        self._semaphore = None
+        self._http_client = None
+
+    async def get(self, url: str, timeout: float = None) -> httpx.Response:
+        """
+        Sends a GET request, raises the httpx exceptions on connection errors or timeouts
+        timeout, in seconds, shortens the read timeout of this request
+        """
+        request_timeout = self._timeout
+        if timeout is not None:
+            request_timeout = httpx.Timeout(min(self._timeout.read, timeout), connect=self._timeout.connect)
+        async with self._get_semaphore():
+            return await self._get_http_client().get(url, timeout=request_timeout)
+
+    async def aclose(self) -> None:
+        """
+        Closes all the pooled connections
+        """
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    # Semaphore and client are created lazily, they must be bound to the running event loop
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrent_requests)
+        return self._semaphore
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+        return self._http_client
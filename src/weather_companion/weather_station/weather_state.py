@@ -1,7 +1,9 @@
 """
 Defines weather state class and Builder
+PackedWeatherState is the compact form of a weather state, used to hold many of them in caches
 """
 
+import struct
 from typing import Dict, NamedTuple
 
 
@@ -168,3 +170,41 @@ class WeatherStateBuilder:
     def _check_is_positive_number_if_not_none(value, variable_name: str):
         if value is not None and value < 0:
             raise ValueError(f"{variable_name} should be a positive number")
+
+
+class PackedWeatherState(bytes):
+    """
+    Weather state packed in a bytes object: a bitmask of the present fields and their float64 values.
+    A state with the 4 mandatory and 4 optional fields takes about 128 bytes, the WeatherState tuple and its boxed
+    values about 250 (see benchmarks/weather_state_memory.py). Values are kept exactly, ints come back as floats.
+    """
+
+    __slots__ = ()
+
+    _MASK = struct.Struct("<H")
+    _VALUE_SIZE = 8
+
+    @classmethod
+    def pack(cls, weather_state: WeatherState) -> "PackedWeatherState":
+        mask = 0
+        values = []
+        for position, value in enumerate(weather_state):
+            if value is not None:
+                mask |= 1 << position
+                values.append(value)
+        return cls(cls._MASK.pack(mask) + struct.pack(f"<{len(values)}d", *values))
+
+    def unpack(self) -> WeatherState:
+        """
+        Returns the regular weather state
+        """
+        (mask,) = self._MASK.unpack_from(self)
+        values = iter(
+            struct.unpack_from(f"<{(len(self) - self._MASK.size) // self._VALUE_SIZE}d", self, self._MASK.size)
+        )
+        return WeatherState._make(
+            next(values) if mask & (1 << position) else None for position in range(len(WeatherState._fields))
+        )
+
+    def __repr__(self) -> str:
+        return f"PackedWeatherState({self.unpack()!r})"
@@ -1,6 +1,8 @@
 from datetime import date
+from typing import Tuple
 
 from .forecast import Forecast
+from .freshness import Freshness, digest
 from .location import Location
 from .weather_state import WeatherState
 
@@ -35,3 +37,72 @@ class WeatherStation:
         Throws WeatherStationError if the weather station is unable to provide the weather forecast.
         """
         raise NotImplementedError
+
+    def get_current_state_with_freshness(self, location: Location) -> Tuple[WeatherState, Freshness]:
+        """
+        Gets the current weather state for a given location, and its freshness for conditional requests.
+        Results are not fresh unless the weather station caches them.
+        """
+        weather_state = self.get_current_state(location)
+        return weather_state, Freshness(digest(weather_state))
+
+    def get_forecast_with_freshness(
+        self, location: Location, start_date: date, end_date: date
+    ) -> Tuple[Forecast, Freshness]:
+        """
+        Gets the weather forecast for a given location for a given date range, and its freshness.
+        Results are not fresh unless the weather station caches them.
+        """
+        forecast = self.get_forecast(location, start_date, end_date)
+        return forecast, Freshness(digest(forecast))
+
+    def close(self) -> None:
+        """
+        Releases the resources held by the weather station (connections, background threads...)
+        """
+        pass
+
+
+class AsyncWeatherStation:
+    """
+    Defines an asyncio interface for weather forecast providers.
+    Same contract as WeatherStation, but the methods must be awaited.
+    """
+
+    async def get_current_state(self, location: Location) -> WeatherState:
+        """
+        Gets the current weather state for a given location.
+        Throws WeatherStationError if the weather station is unable to provide the weather state.
+        """
+        raise NotImplementedError
+
+    async def get_forecast(self, location: Location, start_date: date, end_date: date) -> Forecast:
+        """
+        Gets the weather forecast for a given location for a given date range
+        Throws WeatherStationError if the weather station is unable to provide the weather forecast.
+        """
+        raise NotImplementedError
+
+    async def get_current_state_with_freshness(self, location: Location) -> Tuple[WeatherState, Freshness]:
+        """
+        Gets the current weather state for a given location, and its freshness for conditional requests.
+        Results are not fresh unless the weather station caches them.
+        """
+        weather_state = await self.get_current_state(location)
+        return weather_state, Freshness(digest(weather_state))
+
+    async def get_forecast_with_freshness(
+        self, location: Location, start_date: date, end_date: date
+    ) -> Tuple[Forecast, Freshness]:
+        """
+        Gets the weather forecast for a given location for a given date range, and its freshness.
+        Results are not fresh unless the weather station caches them.
+        """
+        forecast = await self.get_forecast(location, start_date, end_date)
+        return forecast, Freshness(digest(forecast))
+
+    async def aclose(self) -> None:
+        """
+        Releases the resources held by the weather station (connections, background tasks...)
+        """
+        pass
@@ -0,0 +1,109 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import utils
+from weather_companion.weather_station import Freshness
+from weather_companion.weather_station.fake_owm_server import FakeOWMServer
+
+# app.api builds the app of the environment on import
+os.environ.setdefault("WEATHER_CLIENT_API_KEY", "test-key")
+from app import api  # noqa: E402
+
+APIKEY = "8fdce8a4-7d6b-11ee-b962-0242ac120001"
+START_TIME = int(datetime(2023, 11, 1, tzinfo=timezone.utc).timestamp())
+FRESHNESS = Freshness(digest="digest", max_age=42.9)
+WEATHER_ENDPOINTS = [
+    ("/weather-companion/weather/current", {}),
+    ("/weather-companion/weather/forecast", {"start_date": "2023-11-01", "end_date": "2023-11-03"}),
+    ("/weather-companion/weather/forecast/daily", {"start_date": "2023-11-01", "end_date": "2023-11-03"}),
+]
+
+
+@pytest.fixture
+def client():
+    with FakeOWMServer(start_time=START_TIME) as server:
+        app = api.create_app("key", bookmark_prefetch_interval=0, weather_client_base_url=server.base_url)
+        with TestClient(app) as test_client:
+            yield test_client
+
+
+def test_cache_validators_should_derive_the_etag_from_the_freshness_and_representation():
+    headers = utils._cache_validators(FRESHNESS, "forecast", 1.5, 2.5)
+
+    assert headers["Cache-Control"] == "max-age=42"
+    assert headers["ETag"].startswith('"') and headers["ETag"].endswith('"')
+    assert headers == utils._cache_validators(FRESHNESS, "forecast", 1.5, 2.5)
+    assert headers["ETag"] != utils._cache_validators(FRESHNESS, "daily", 1.5, 2.5)["ETag"]
+    assert headers["ETag"] != utils._cache_validators(Freshness(digest="other"), "forecast", 1.5, 2.5)["ETag"]
+    assert utils._cache_validators(Freshness(digest="digest"))["Cache-Control"] == "max-age=0"
+
+
+def test_is_not_modified_should_match_the_etags_of_if_none_match():
+    headers = utils._cache_validators(FRESHNESS)
+    etag = headers["ETag"]
+
+    assert utils._is_not_modified(etag, headers)
+    assert utils._is_not_modified(f"W/{etag}", headers)
+    assert utils._is_not_modified(f'"other", {etag}', headers)
+    assert utils._is_not_modified(f'"other",W/{etag}', headers)
+    assert utils._is_not_modified("*", headers)
+    assert not utils._is_not_modified(None, headers)
+    assert not utils._is_not_modified('"other"', headers)
+    assert not utils._is_not_modified(etag.strip('"'), headers)
+
+
+@pytest.mark.parametrize("path, params", WEATHER_ENDPOINTS)
+def test_weather_endpoints_should_answer_not_modified_if_an_etag_matches(client, path, params):
+    query = {"lat": -34.61, "long": -58.38, "apikey": APIKEY, **params}
+    response = client.get(path, params=query)
+    etag = response.headers["ETag"]
+
+    assert response.status_code == 200
+    assert response.json()
+    assert response.headers["Cache-Control"].startswith("max-age=")
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        not_modified = client.get(path, params=query, headers={"If-None-Match": if_none_match})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert not_modified.headers["ETag"] == etag
+    modified = client.get(path, params=query, headers={"If-None-Match": '"other"'})
+    assert modified.status_code == 200
+    assert modified.json() == response.json()
+    assert modified.headers["ETag"] == etag
+
+
+def test_forecast_etag_should_depend_on_the_endpoint(client):
+    query = {"lat": -34.61, "long": -58.38, "apikey": APIKEY, "start_date": "2023-11-01", "end_date": "2023-11-03"}
+
+    forecast = client.get("/weather-companion/weather/forecast", params=query)
+    daily = client.get("/weather-companion/weather/forecast/daily", params=query)
+
+    assert forecast.headers["ETag"] != daily.headers["ETag"]
+    not_modified = client.get(
+        "/weather-companion/weather/forecast/daily", params=query, headers={"If-None-Match": forecast.headers["ETag"]}
+    )
+    assert not_modified.status_code == 200
+
+
+def test_journal_and_bookmark_routes_should_use_the_sqlite_repositories(tmp_path):
+    app = api.create_app(
+        "key",
+        bookmark_prefetch_interval=0,
+        repository_backend=api.SQLITE_REPOSITORY_BACKEND,
+        repository_path=str(tmp_path / "weather_companion.db"),
+    )
+    entry = {"note": "sunny", "date": "2023-11-01", "location": {"latitude": -34.61, "longitude": -58.38}}
+    bookmark = {"name": "home", "location": {"latitude": -34.61, "longitude": -58.38}}
+
+    with TestClient(app) as test_client:
+        entry_id = test_client.post("/weather-companion/journal/entries", params={"apikey": APIKEY}, json=entry).json()
+        added = test_client.post("/weather-companion/bookmarks", params={"apikey": APIKEY}, json=bookmark)
+        journal = test_client.get("/weather-companion/journal/entries", params={"apikey": APIKEY})
+        bookmarks = test_client.get("/weather-companion/bookmarks", params={"apikey": APIKEY})
+
+    assert added.status_code == 200
+    assert journal.json() == {"entries": [{"id": entry_id, "journal_entry": entry}]}
+    assert bookmarks.json() == {"bookmarks": [bookmark]}
@@ -0,0 +1,154 @@
+import json
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+from app import encoders
+from app.model import (
+    DailyForecast,
+    DailySummary,
+    Forecast,
+    ForecastItem,
+    Journal,
+    JournalEntry,
+    JournalItem,
+    Location,
+    LocationForecast,
+    WeatherState,
+)
+from weather_companion import weather_journal as wj
+from weather_companion import weather_station as ws
+
+TZ = timezone(timedelta(hours=-3))
+LOCATION = ws.Location(-34.61, -58.38)
+
+
+def _render(model) -> dict:
+    # FastAPI encoding of the returned models, the path the encoders replace
+    return json.loads(json.dumps(jsonable_encoder(model, exclude_none=True)))
+
+
+def _encoded(content) -> dict:
+    return json.loads(encoders.dumps(content))
+
+
+def _location(location: ws.Location) -> Location:
+    return Location(**location.to_dict())
+
+
+def _forecast_items(forecast: ws.Forecast):
+    return [
+        ForecastItem(date_time=date_time, weather_state=WeatherState(**weather_state.to_dict()))
+        for date_time, weather_state in forecast
+    ]
+
+
+def _forecast(start: datetime) -> ws.Forecast:
+    forecast = ws.Forecast()
+    # All the optional fields, none of them, and zeros that are left out as the missing ones
+    forecast.add(
+        ws.WeatherState(
+            temperature=21.5,
+            humidity=60,
+            feels_like=20.25,
+            pressure=1015,
+            wind_speed=3.5,
+            wind_gust=7.25,
+            wind_direction=270,
+            clouds=40,
+            rain_1h=0.5,
+            rain_3h=1.25,
+            snow_1h=0.1,
+            snow_3h=0.3,
+        ),
+        start,
+    )
+    forecast.add(ws.WeatherState(temperature=-2, humidity=0, feels_like=-5.5, pressure=990), start + timedelta(hours=3))
+    forecast.add(
+        ws.WeatherState(
+            temperature=0, humidity=80, feels_like=0, pressure=1000, wind_speed=0, clouds=0, rain_3h=None, snow_3h=2
+        ),
+        start + timedelta(hours=6),
+    )
+    return forecast
+
+
+def test_encode_weather_state_should_write_the_same_json_as_the_model():
+    weather_states = [
+        ws.WeatherState(temperature=21.5, humidity=60, feels_like=20.25, pressure=1015, wind_gust=7.25, rain_3h=1),
+        ws.WeatherState(temperature=0, humidity=0, feels_like=0, pressure=990, wind_speed=0, rain_1h=None),
+    ]
+
+    for weather_state in weather_states:
+        model = WeatherState(**weather_state.to_dict())
+        assert _encoded(encoders.encode_weather_state(weather_state)) == _render(model)
+
+
+def test_encode_forecast_should_write_the_same_json_as_the_model():
+    for start in (datetime(2023, 11, 10, 21, tzinfo=TZ), datetime(2023, 11, 10, 21, tzinfo=timezone.utc)):
+        forecast = _forecast(start)
+        model = Forecast(forecast=_forecast_items(forecast), location=_location(LOCATION))
+
+        encoded = _encoded(encoders.encode_forecast(LOCATION, forecast))
+
+        assert encoded == _render(model)
+        assert "rain_3h" not in encoded["forecast"][2]["weather_state"]
+
+
+def test_encode_forecast_should_write_the_date_time_offsets():
+    forecast = _forecast(datetime(2023, 11, 10, 21, tzinfo=TZ))
+    utc_forecast = _forecast(datetime(2023, 11, 10, 21, tzinfo=timezone.utc))
+
+    items = _encoded(encoders.encode_forecast(LOCATION, forecast))["forecast"]
+    utc_items = _encoded(encoders.encode_forecast(LOCATION, utc_forecast))["forecast"]
+
+    assert items[1]["date_time"] == "2023-11-11T00:00:00-03:00"
+    assert utc_items[1]["date_time"] == "2023-11-11T00:00:00Z"
+
+
+def test_encode_daily_forecast_should_write_the_same_json_as_the_model():
+    daily_forecast = ws.aggregate_daily(_forecast(datetime(2023, 11, 10, 21, tzinfo=TZ)))
+    model = DailyForecast(
+        days=[DailySummary(**daily_summary._asdict()) for daily_summary in daily_forecast],
+        location=_location(LOCATION),
+    )
+
+    encoded = _encoded(encoders.encode_daily_forecast(LOCATION, daily_forecast))
+
+    assert encoded == _render(model)
+    # The second day has no wind gust
+    assert "max_wind_gust" in encoded["days"][0]
+    assert "max_wind_gust" not in encoded["days"][1]
+
+
+def test_encode_location_forecast_should_write_the_same_json_as_the_model():
+    forecast = _forecast(datetime(2023, 11, 10, 21, tzinfo=TZ))
+    location = LOCATION.to_dict()
+
+    assert _encoded(encoders.encode_location_forecast(0, location, forecast, None)) == _render(
+        LocationForecast(index=0, location=_location(LOCATION), forecast=_forecast_items(forecast))
+    )
+    assert _encoded(encoders.encode_location_forecast(1, location, None, "error")) == _render(
+        LocationForecast(index=1, location=_location(LOCATION), error="error")
+    )
+
+
+def test_encode_journal_should_write_the_same_json_as_the_model():
+    journal = [
+        (1, wj.JournalEntry(location=LOCATION, date=date(2023, 11, 10), note=wj.Note("sunny"))),
+        (7, wj.JournalEntry(location=ws.Location(40.71, -74.01), date=date(2024, 2, 29), note=wj.Note("ñandú, ☂"))),
+    ]
+    model = Journal(
+        entries=[
+            JournalItem(
+                id=entry_id,
+                journal_entry=JournalEntry(
+                    note=entry.note().content(), date=entry.date(), location=_location(entry.location())
+                ),
+            )
+            for entry_id, entry in journal
+        ]
+    )
+
+    assert _encoded(encoders.encode_journal(journal)) == _render(model)
+    assert _encoded(encoders.encode_journal_entry(journal[1][1])) == _render(model.entries[1].journal_entry)
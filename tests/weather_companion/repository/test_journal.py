@@ -0,0 +1,150 @@
+import random
+from datetime import date
+
+import pytest
+
+from weather_companion.repository import (
+    InMemoryJournalRepository,
+    JournalOrder,
+    JournalRepository,
+    RepositoryError,
+)
+from weather_companion.weather_journal import (
+    AndFilter,
+    AuthorID,
+    DateRangeFilter,
+    JournalEntry,
+    LocationProximityFilter,
+    Note,
+    NoteContentFilter,
+)
+from weather_companion.weather_station import Location
+
+AUTHOR = AuthorID("author")
+OTHER_AUTHOR = AuthorID("other")
+
+
+def _entry(content: str) -> JournalEntry:
+    return JournalEntry(location=Location(10, 20), date=date(2023, 1, 1), note=Note(content))
+
+
+def test_should_allocate_unique_ids_across_authors():
+    repository = InMemoryJournalRepository()
+
+    assert repository.add(_entry("first"), AUTHOR) == 0
+    assert repository.add(_entry("second"), OTHER_AUTHOR) == 1
+    assert repository.add(_entry("third"), AUTHOR) == 2
+
+    repository.remove(2, AUTHOR)
+    # Ids of removed entries are not reused
+    assert repository.add(_entry("fourth"), AUTHOR) == 3
+
+
+def test_should_list_the_entries_of_an_author_in_insertion_order():
+    repository = InMemoryJournalRepository()
+    repository.add(_entry("first"), AUTHOR)
+    repository.add(_entry("second"), OTHER_AUTHOR)
+    repository.add(_entry("third"), AUTHOR)
+
+    repository.update(0, AUTHOR, _entry("updated"))
+
+    assert repository.get_all_entries(AUTHOR) == [(0, _entry("updated")), (2, _entry("third"))]
+    assert repository.get_all_entries(AuthorID("other")) == [(1, _entry("second"))]
+    assert repository.get_all_entries(AuthorID("nobody")) == []
+
+
+def test_should_not_access_the_entries_of_other_authors():
+    repository = InMemoryJournalRepository()
+    entry_id = repository.add(_entry("first"), AUTHOR)
+
+    with pytest.raises(RepositoryError):
+        repository.get(entry_id, OTHER_AUTHOR)
+    with pytest.raises(RepositoryError):
+        repository.update(entry_id, OTHER_AUTHOR, _entry("updated"))
+    with pytest.raises(RepositoryError):
+        repository.remove(entry_id, OTHER_AUTHOR)
+    assert repository.get(entry_id, AUTHOR) == _entry("first")
+
+
+def test_should_remove_entries():
+    repository = InMemoryJournalRepository()
+    entry_id = repository.add(_entry("first"), AUTHOR)
+
+    repository.remove(entry_id, AUTHOR)
+
+    assert repository.get_all_entries(AUTHOR) == []
+    with pytest.raises(RepositoryError):
+        repository.get(entry_id, AUTHOR)
+    with pytest.raises(RepositoryError):
+        repository.remove(entry_id, AUTHOR)
+
+
+def _dated_entry(content: str, day: int) -> JournalEntry:
+    return JournalEntry(location=Location(10, 20), date=date(2023, 1, day), note=Note(content))
+
+
+def test_should_query_the_entries_that_match_a_filter():
+    repository = InMemoryJournalRepository()
+    repository.add(_dated_entry("Sunny", 3), AUTHOR)
+    repository.add(_dated_entry("sunny", 1), OTHER_AUTHOR)
+    repository.add(_dated_entry("rainy", 2), AUTHOR)
+    repository.add(_dated_entry("sunny again", 1), AUTHOR)
+    repository.add(_dated_entry("sunny", 9), AUTHOR)
+    entry_filter = AndFilter([NoteContentFilter("sunny"), DateRangeFilter(date(2023, 1, 1), date(2023, 1, 5))])
+
+    assert repository.query(AUTHOR, entry_filter) == [
+        (0, _dated_entry("Sunny", 3)),
+        (3, _dated_entry("sunny again", 1)),
+    ]
+    assert repository.query(AUTHOR, entry_filter, order=JournalOrder.NEWEST_FIRST, limit=1) == [
+        (3, _dated_entry("sunny again", 1))
+    ]
+    assert [entry_id for entry_id, _ in repository.query(AUTHOR, order=JournalOrder.DATE_ASCENDING)] == [3, 2, 0, 4]
+    assert [entry_id for entry_id, _ in repository.query(AUTHOR, order=JournalOrder.DATE_DESCENDING, limit=2)] == [4, 0]
+    assert repository.query(AuthorID("nobody"), entry_filter) == []
+
+
+def test_default_query_should_filter_the_entire_journal():
+    class ListJournalRepository(JournalRepository):
+        def __init__(self, entries):
+            self._entries = entries
+
+        def get_all_entries(self, author_id):
+            return list(self._entries)
+
+    entries = [(0, _dated_entry("a", 2)), (1, _dated_entry("b", 1)), (2, _dated_entry("c", 1))]
+    repository = ListJournalRepository(entries)
+
+    assert repository.query(AUTHOR) == entries
+    assert repository.query(AUTHOR, NoteContentFilter("B")) == [entries[1]]
+    assert repository.query(AUTHOR, order=JournalOrder.DATE_DESCENDING) == [entries[0], entries[1], entries[2]]
+    assert repository.query(AUTHOR, order=JournalOrder.NEWEST_FIRST, limit=2) == [entries[2], entries[1]]
+
+
+def test_proximity_queries_should_return_the_entries_within_the_distance():
+    random.seed(0)
+    repository = InMemoryJournalRepository()
+    locations = [Location(random.uniform(-36, -33), random.uniform(-60, -57)) for _ in range(500)]
+    for i, location in enumerate(locations):
+        repository.add(JournalEntry(location=location, date=date(2023, 1, 1), note=Note(f"note {i}")), AUTHOR)
+    # Moved and removed entries leave the location index
+    repository.update(0, AUTHOR, JournalEntry(location=Location(10, 10), date=date(2023, 1, 1), note=Note("moved")))
+    repository.remove(1, AUTHOR)
+
+    center = Location(-34.6, -58.4)
+    for max_distance in (0, 20, 100, 1000):
+        proximity_filter = LocationProximityFilter(center, max_distance)
+        expected = [
+            (entry_id, entry)
+            for entry_id, entry in repository.get_all_entries(AUTHOR)
+            if center.distance_to(entry.location()) <= max_distance
+        ]
+        assert repository.query(AUTHOR, proximity_filter) == expected
+        assert repository.query(AUTHOR, AndFilter([NoteContentFilter("note"), proximity_filter])) == expected
+        newest = repository.query(AUTHOR, proximity_filter, limit=3, order=JournalOrder.NEWEST_FIRST)
+        assert newest == expected[::-1][:3]
+    assert repository.query(AUTHOR, LocationProximityFilter(Location(10, 10), 1)) == [
+        (0, JournalEntry(location=Location(10, 10), date=date(2023, 1, 1), note=Note("moved")))
+    ]
+    assert repository.query(OTHER_AUTHOR, LocationProximityFilter(center, 100)) == []
+    assert repository.query(AUTHOR, LocationProximityFilter(Location(80, 80), 100)) == []
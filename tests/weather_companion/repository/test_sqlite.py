@@ -0,0 +1,216 @@
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from weather_companion.repository import (
+    InMemoryJournalRepository,
+    JournalOrder,
+    RepositoryError,
+    SQLiteJournalRepository,
+    SQLiteLocationBookmarkRepository,
+)
+from weather_companion.repository.sqlite import _SQLiteDatabase
+from weather_companion.weather_journal import (
+    AndFilter,
+    AuthorID,
+    Bookmark,
+    DateRangeFilter,
+    JournalEntry,
+    LocationProximityFilter,
+    Note,
+    NoteContentFilter,
+)
+from weather_companion.weather_station import Location
+
+AUTHOR = AuthorID("author")
+OTHER_AUTHOR = AuthorID("other")
+
+
+def _entry(content: str, day: int = 1) -> JournalEntry:
+    return JournalEntry(location=Location(10.5, -20.25), date=date(2023, 1, day), note=Note(content))
+
+
+def test_should_add_get_update_and_remove_journal_entries(tmp_path):
+    repository = SQLiteJournalRepository(str(tmp_path / "weather_companion.db"))
+    first_id = repository.add(_entry("first"), AUTHOR)
+    second_id = repository.add(_entry("second"), OTHER_AUTHOR)
+    third_id = repository.add(_entry("third", day=2), AUTHOR)
+    assert first_id < second_id < third_id
+
+    repository.update(first_id, AUTHOR, _entry("updated", day=3))
+    repository.remove(third_id, AUTHOR)
+
+    assert repository.get(first_id, AUTHOR) == _entry("updated", day=3)
+    assert repository.get_all_entries(AUTHOR) == [(first_id, _entry("updated", day=3))]
+    assert repository.get_all_entries(OTHER_AUTHOR) == [(second_id, _entry("second"))]
+    # Ids of removed entries are not reused
+    assert repository.add(_entry("fourth"), AUTHOR) > third_id
+    repository.close()
+
+
+def test_should_not_access_the_journal_entries_of_other_authors(tmp_path):
+    repository = SQLiteJournalRepository(str(tmp_path / "weather_companion.db"))
+    entry_id = repository.add(_entry("first"), AUTHOR)
+
+    with pytest.raises(RepositoryError):
+        repository.get(entry_id, OTHER_AUTHOR)
+    with pytest.raises(RepositoryError):
+        repository.update(entry_id, OTHER_AUTHOR, _entry("updated"))
+    with pytest.raises(RepositoryError):
+        repository.remove(entry_id, OTHER_AUTHOR)
+    repository.close()
+
+
+def test_journal_entries_should_survive_a_restart(tmp_path):
+    path = str(tmp_path / "weather_companion.db")
+    repository = SQLiteJournalRepository(path)
+    entry_id = repository.add(_entry("first"), AUTHOR)
+    repository.close()
+
+    restarted_repository = SQLiteJournalRepository(path)
+    assert restarted_repository.get_all_entries(AUTHOR) == [(entry_id, _entry("first"))]
+    restarted_repository.close()
+
+
+def test_writes_should_be_committed_in_groups(tmp_path):
+    path = str(tmp_path / "weather_companion.db")
+    repository = SQLiteJournalRepository(path, commit_delay=60, max_batch=3)
+    other_worker_repository = SQLiteJournalRepository(path, busy_timeout=0)
+    writers = [threading.Thread(target=repository.add, args=(_entry(note), AUTHOR)) for note in ("first", "second")]
+
+    for writer in writers:
+        writer.start()
+    # Seen at once by the writer, the writes wait for their group to be committed
+    deadline = time.monotonic() + 5
+    while len(repository.get_all_entries(AUTHOR)) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert all(writer.is_alive() for writer in writers)
+    assert other_worker_repository.get_all_entries(AUTHOR) == []
+
+    repository.add(_entry("third"), AUTHOR)
+    for writer in writers:
+        writer.join(timeout=5)
+    assert not any(writer.is_alive() for writer in writers)
+    assert len(other_worker_repository.get_all_entries(AUTHOR)) == 3
+    repository.close()
+    other_worker_repository.close()
+
+
+def test_writes_should_return_once_committed_after_the_commit_delay(tmp_path):
+    path = str(tmp_path / "weather_companion.db")
+    repository = SQLiteJournalRepository(path, commit_delay=0.01)
+    other_worker_repository = SQLiteJournalRepository(path)
+
+    entry_id = repository.add(_entry("first"), AUTHOR)
+    # Durable and seen by the other workers as soon as the write returns
+    assert other_worker_repository.get(entry_id, AUTHOR) == _entry("first")
+    other_worker_repository.add(_entry("second"), AUTHOR)
+    assert len(repository.get_all_entries(AUTHOR)) == 2
+    repository.close()
+    other_worker_repository.close()
+
+
+def test_writes_should_fail_if_their_group_commit_fails(tmp_path):
+    # Deferred foreign keys are checked by the COMMIT
+    schema = (
+        "PRAGMA foreign_keys = ON",
+        "CREATE TABLE parents (id INTEGER PRIMARY KEY)",
+        "CREATE TABLE children (parent INTEGER REFERENCES parents (id) DEFERRABLE INITIALLY DEFERRED)",
+    )
+    database = _SQLiteDatabase(
+        str(tmp_path / "weather_companion.db"), schema, commit_delay=0.01, max_batch=10, busy_timeout=0
+    )
+
+    with pytest.raises(RepositoryError):
+        database.write("INSERT INTO children (parent) VALUES (1)")
+    # The group is rolled back, the next writes open a new one
+    assert database.read("SELECT COUNT(*) FROM children") == [(0,)]
+    database.write("INSERT INTO parents (id) VALUES (1)")
+    database.write("INSERT INTO children (parent) VALUES (1)")
+    assert database.read("SELECT COUNT(*) FROM children") == [(1,)]
+    database.close()
+
+
+def test_queries_should_return_the_same_entries_as_the_in_memory_repository(tmp_path):
+    repository = SQLiteJournalRepository(str(tmp_path / "weather_companion.db"))
+    in_memory_repository = InMemoryJournalRepository()
+    entries = [
+        JournalEntry(location=Location(-34.6, -58.4), date=date(2023, 1, 3), note=Note("Sunny in Buenos Aires")),
+        JournalEntry(location=Location(-34.9, -57.9), date=date(2023, 1, 1), note=Note("Rainy in La Plata")),
+        JournalEntry(location=Location(-33.0, -60.6), date=date(2023, 1, 2), note=Note("SUNNY in Rosario")),
+        JournalEntry(location=Location(-34.6, -58.4), date=date(2023, 2, 1), note=Note("Ñandúes under the sun")),
+        JournalEntry(location=Location(40.4, -3.7), date=date(2023, 1, 2), note=Note("Sunny in Madrid")),
+    ]
+    for entry in entries:
+        repository.add(entry, AUTHOR)
+        in_memory_repository.add(entry, AUTHOR)
+    repository.add(entries[0], OTHER_AUTHOR)
+    in_memory_repository.add(entries[0], OTHER_AUTHOR)
+
+    near_buenos_aires = LocationProximityFilter(Location(-34.6, -58.4), 100)
+    january = DateRangeFilter(date(2023, 1, 1), date(2023, 1, 31))
+    queries = [
+        (None, None),
+        (NoteContentFilter(" sunny "), None),
+        (NoteContentFilter("ñandú"), None),
+        (near_buenos_aires, None),
+        (january, 2),
+        (AndFilter([near_buenos_aires, january]), None),
+        (AndFilter([NoteContentFilter("sun"), january]), 1),
+    ]
+    for entry_filter, limit in queries:
+        for order in JournalOrder:
+            result = repository.query(AUTHOR, entry_filter, limit, order)
+            expected = in_memory_repository.query(AUTHOR, entry_filter, limit, order)
+            # Ids of the SQLite repository start at 1
+            assert result == [(entry_id + 1, entry) for entry_id, entry in expected]
+    repository.close()
+
+
+def test_proximity_queries_should_look_up_the_bounding_box_in_the_location_index(tmp_path):
+    repository = SQLiteJournalRepository(str(tmp_path / "weather_companion.db"))
+    repository.add(_entry("first"), AUTHOR)
+    statements = []
+    repository._database._connection.set_trace_callback(statements.append)
+
+    assert repository.query(AUTHOR, LocationProximityFilter(Location(10.5, -20.25), 10)) == [(1, _entry("first"))]
+
+    repository._database._connection.set_trace_callback(None)
+    (statement,) = [statement for statement in statements if statement.startswith("SELECT")]
+    plan = repository._database.read("EXPLAIN QUERY PLAN " + statement)
+    assert any("journal_entries_author_location (author=? AND latitude>? AND latitude<?)" in row[3] for row in plan)
+    repository.close()
+
+
+def test_should_add_get_and_remove_bookmarks(tmp_path):
+    path = str(tmp_path / "weather_companion.db")
+    repository = SQLiteLocationBookmarkRepository(path)
+    repository.add(Bookmark("home"), Location(10, 20), AUTHOR)
+    repository.add(Bookmark("work"), Location(11, 21), AUTHOR)
+    repository.add(Bookmark("home"), Location(30, 40), OTHER_AUTHOR)
+
+    with pytest.raises(RepositoryError):
+        repository.add(Bookmark("home"), Location(50, 50), AUTHOR)
+    assert repository.get(Bookmark("home"), OTHER_AUTHOR) == Location(30, 40)
+    assert repository.get_all_bookmarks(AUTHOR) == [
+        (Bookmark("home"), Location(10, 20)),
+        (Bookmark("work"), Location(11, 21)),
+    ]
+
+    repository.remove(Bookmark("home"), AUTHOR)
+    with pytest.raises(RepositoryError):
+        repository.get(Bookmark("home"), AUTHOR)
+    with pytest.raises(RepositoryError):
+        repository.remove(Bookmark("home"), AUTHOR)
+    assert repository.get_all_locations() == [Location(11, 21), Location(30, 40)]
+    repository.close()
+
+    # Journal and bookmarks can share the database file
+    journal_repository = SQLiteJournalRepository(path)
+    journal_repository.add(_entry("first"), AUTHOR)
+    assert SQLiteLocationBookmarkRepository(path).get_all_bookmarks(OTHER_AUTHOR) == [
+        (Bookmark("home"), Location(30, 40))
+    ]
+    journal_repository.close()
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import date
+
+from weather_companion import system
+from weather_companion.repository import (
+    InMemoryJournalRepository,
+    InMemoryLocationBookmarkRepository,
+)
+from weather_companion.weather_journal import AuthorID, Bookmark
+from weather_companion.weather_station import (
+    Forecast,
+    Location,
+    Priority,
+    WeatherState,
+    WeatherStation,
+    WeatherStationError,
+    current_priority,
+)
+
+
+class RecordingWeatherStationMock(WeatherStation):
+    """
+    Records the requested locations and the priority of the requests, fails for the failing latitudes
+    """
+
+    def __init__(self, failing_latitudes=()) -> None:
+        self.current_state_requests = []
+        self.forecast_requests = []
+        self.priorities = set()
+        self._failing_latitudes = failing_latitudes
+
+    def get_current_state(self, location: Location) -> WeatherState:
+        self.current_state_requests.append(location)
+        self.priorities.add(current_priority())
+        if location.latitude in self._failing_latitudes:
+            raise WeatherStationError("test")
+        return WeatherState(temperature=10, humidity=20, feels_like=11, pressure=1024)
+
+    def get_forecast(self, location: Location, start_date: date, end_date: date) -> Forecast:
+        self.forecast_requests.append(location)
+        return Forecast()
+
+
+def _weather_companion(weather_station: WeatherStation, bookmarks: dict) -> system.WeatherCompanion:
+    weather_companion = system.WeatherCompanion(
+        weather_station=weather_station,
+        journal_repository=InMemoryJournalRepository(),
+        bookmark_repository=InMemoryLocationBookmarkRepository(),
+    )
+    for i, (author, location) in enumerate(bookmarks):
+        weather_companion.add_bookmark(Bookmark(f"bookmark{i}"), location, AuthorID(author))
+    return weather_companion
+
+
+def test_prefetch_should_read_each_bookmarked_cell_once_with_prefetch_priority():
+    weather_station = RecordingWeatherStationMock(failing_latitudes=(30,))
+    bookmarks = [("a", Location(10, 20)), ("b", Location(10.001, 20.001)), ("b", Location(30, 20))]
+    prefetcher = system.BookmarkPrefetcher(_weather_companion(weather_station, bookmarks))
+
+    assert asyncio.run(prefetcher.prefetch()) == (2, 1)
+    assert weather_station.current_state_requests == [Location(10, 20), Location(30, 20)]
+    assert weather_station.forecast_requests == [Location(10, 20)]
+    assert weather_station.priorities == {Priority.PREFETCH}
+
+
+def test_prefetch_should_round_robin_the_cells_within_the_budget():
+    weather_station = RecordingWeatherStationMock()
+    bookmarks = [("a", Location(latitude, 0)) for latitude in range(5)]
+    prefetcher = system.BookmarkPrefetcher(_weather_companion(weather_station, bookmarks), max_cells_per_cycle=2)
+
+    for _ in range(3):
+        asyncio.run(prefetcher.prefetch())
+
+    assert [location.latitude for location in weather_station.current_state_requests] == [0, 1, 2, 3, 4, 0]
+
+
+def test_prefetcher_should_prefetch_in_background_until_stopped():
+    weather_station = RecordingWeatherStationMock()
+    prefetcher = system.BookmarkPrefetcher(
+        _weather_companion(weather_station, [("a", Location(10, 20))]), interval=0.01
+    )
+
+    async def run_for_a_while() -> None:
+        prefetcher.start()
+        await asyncio.sleep(0.1)
+        await prefetcher.stop()
+
+    asyncio.run(run_for_a_while())
+    requests = len(weather_station.current_state_requests)
+    assert requests > 1
+    asyncio.run(asyncio.sleep(0.05))
+    assert len(weather_station.current_state_requests) == requests
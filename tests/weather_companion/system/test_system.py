@@ -1,4 +1,7 @@
-from datetime import date
+import asyncio
+import sqlite3
+import threading
+from datetime import date, datetime
 
 import pytest
 
@@ -6,11 +9,14 @@ from weather_companion import system
 from weather_companion.repository import (
     InMemoryJournalRepository,
     InMemoryLocationBookmarkRepository,
+    JournalOrder,
 )
-from weather_companion.weather_journal import AuthorID, JournalEntry, Note
+from weather_companion.weather_journal import AuthorID, Bookmark, JournalEntry, Note
 from weather_companion.weather_station import (
+    AsyncWeatherStation,
     Forecast,
     Location,
+    SQLiteWeatherCache,
     WeatherState,
     WeatherStation,
     WeatherStationError,
@@ -22,6 +28,7 @@ class WeatherStationMock(WeatherStation):
         self.weather_state = None
         self.exception = None
         self.forecast = None
+        self.closed = False
 
     def get_current_state(self, location: Location) -> WeatherState:
         if self.exception:
@@ -33,6 +40,60 @@ class WeatherStationMock(WeatherStation):
             raise self.exception
         return self.forecast
 
+    def close(self) -> None:
+        self.closed = True
+
+
+class AsyncWeatherStationMock(AsyncWeatherStation):
+    def __init__(self):
+        self.weather_state = None
+        self.exception = None
+        self.closed = False
+
+    async def get_current_state(self, location: Location) -> WeatherState:
+        if self.exception:
+            raise self.exception
+        return self.weather_state
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+class BlockingJournalRepositoryMock(InMemoryJournalRepository):
+    """
+    In memory journal repository that declares itself blocking, and records the threads of the calls
+    """
+
+    blocking = True
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def add(self, entry: JournalEntry, author_id: AuthorID) -> int:
+        self.threads.append(threading.get_ident())
+        return super().add(entry, author_id)
+
+    def query(self, author_id: AuthorID, entry_filter=None, limit=None, order=JournalOrder.OLDEST_FIRST):
+        self.threads.append(threading.get_ident())
+        return super().query(author_id, entry_filter, limit, order)
+
+
+class BlockingBookmarkRepositoryMock(InMemoryLocationBookmarkRepository):
+    blocking = True
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def get(self, bookmark: Bookmark, author_id: AuthorID) -> Location:
+        self.threads.append(threading.get_ident())
+        return super().get(bookmark, author_id)
+
+    def get_all_bookmarks(self, author_id: AuthorID):
+        self.threads.append(threading.get_ident())
+        return super().get_all_bookmarks(author_id)
+
 
 def test_should_get_current_weather_state():
     weather_station = WeatherStationMock()
@@ -69,6 +130,128 @@ def test_should_raise_exception_if_error_getting_current_weather_state():
         weather_companion.get_current_state(location)
 
 
+def test_should_get_current_weather_state_from_async_weather_station():
+    async_weather_station = AsyncWeatherStationMock()
+    state = WeatherState(temperature=10, humidity=20, feels_like=11, pressure=1024)
+    async_weather_station.weather_state = state
+    weather_companion = system.WeatherCompanion(
+        weather_station=WeatherStationMock(),
+        journal_repository=InMemoryJournalRepository(),
+        bookmark_repository=InMemoryLocationBookmarkRepository(),
+        async_weather_station=async_weather_station,
+    )
+    location = Location(latitude=10, longitude=20)
+    result = asyncio.run(weather_companion.get_current_state_async(location))
+    assert result == state
+
+
+def test_should_get_current_weather_state_async_from_sync_weather_station():
+    weather_station = WeatherStationMock()
+    state = WeatherState(temperature=10, humidity=20, feels_like=11, pressure=1024)
+    weather_station.weather_state = state
+    weather_companion = system.WeatherCompanion(
+        weather_station=weather_station,
+        journal_repository=InMemoryJournalRepository(),
+        bookmark_repository=InMemoryLocationBookmarkRepository(),
+    )
+    location = Location(latitude=10, longitude=20)
+    result = asyncio.run(weather_companion.get_current_state_async(location))
+    assert result == state
+
+
+def test_should_raise_exception_if_error_getting_current_weather_state_async():
+    async_weather_station = AsyncWeatherStationMock()
+    async_weather_station.exception = WeatherStationError("test")
+    weather_companion = system.WeatherCompanion(
+        weather_station=WeatherStationMock(),
+        journal_repository=InMemoryJournalRepository(),
+        bookmark_repository=InMemoryLocationBookmarkRepository(),
+        async_weather_station=async_weather_station,
+    )
+    location = Location(latitude=10, longitude=20)
+
+    with pytest.raises(system.WeatherCompanionError):
+        asyncio.run(weather_companion.get_current_state_async(location))
+
+
+class PerLocationWeatherStationMock(WeatherStation):
+    """
+    Fails for the locations in failing_latitudes, records the requested locations
+    """
+
+    def __init__(self, failing_latitudes=()):
+        self.requested_locations = []
+        self._failing_latitudes = failing_latitudes
+
+    def get_current_state(self, location: Location) -> WeatherState:
+        self.requested_locations.append(location)
+        if location.latitude in self._failing_latitudes:
+            raise WeatherStationError("test")
+        return WeatherState(temperature=location.latitude, humidity=20, feels_like=11, pressure=1024)
+
+
+def test_should_get_current_states_for_a_batch_of_locations():
+    weather_station = PerLocationWeatherStationMock(failing_latitudes=(30,))
+    weather_companion = system.WeatherCompanion(
+        weather_station=weather_station,
+        journal_repository=InMemoryJournalRepository(),
+        bookmark_repository=InMemoryLocationBookmarkRepository(),
+    )
+    locations = [Location(10, 20), Location(30, 20), Location(10.001, 20.002), Location(-10, 20)]
+
+    results = weather_companion.get_current_states(locations, max_concurrency=2)
+
+    assert [result.location for result in results] == locations
+    assert [result.weather_state.temperature for result in results if result.error is None] == [10, 10, -10]
+    assert results[1].weather_state is None
+    assert results[1].error == "Unable to get current weather state"
+    # Nearby locations share the fetch of their grid cell
+    assert len(weather_station.requested_locations) == 3
+
+
+def test_should_get_current_states_for_a_batch_of_locations_async():
+    weather_station = PerLocationWeatherStationMock(failing_latitudes=(30,))
+    weather_companion = system.WeatherCompanion(
+        weather_station=weather_station,
+        journal_repository=InMemoryJournalRepository(),
+        bookmark_repository=InMemoryLocationBookmarkRepository(),
+    )
+    locations = [Location(10, 20), Location(30, 20), Location(10.001, 20.002)]
+
+    results = asyncio.run(weather_companion.get_current_states_async(locations))
+
+    assert [result.error for result in results] == [None, "Unable to get current weather state", None]
+    assert results[2].weather_state == results[0].weather_state
+    assert len(weather_station.requested_locations) == 2
+    assert asyncio.run(weather_companion.get_current_states_async([])) == []
+
+
+def test_should_get_current_states_for_all_the_bookmarks_of_an_author():
+    weather_station = PerLocationWeatherStationMock(failing_latitudes=(30,))
+    bookmark_repository = InMemoryLocationBookmarkRepository()
+    weather_companion = system.WeatherCompanion(
+        weather_station=weather_station,
+        journal_repository=InMemoryJournalRepository(),
+        bookmark_repository=bookmark_repository,
+    )
+    author = AuthorID("author")
+    weather_companion.add_bookmark(Bookmark("home"), Location(10, 20), author)
+    weather_companion.add_bookmark(Bookmark("work"), Location(10.001, 20), author)
+    weather_companion.add_bookmark(Bookmark("beach"), Location(30, 20), author)
+    weather_companion.add_bookmark(Bookmark("other"), Location(40, 20), AuthorID("other"))
+
+    results = asyncio.run(weather_companion.get_current_weather_states_for_bookmarks_async(author))
+
+    assert [(bookmark.name(), result.location) for bookmark, result in results] == [
+        ("home", Location(10, 20)),
+        ("work", Location(10.001, 20)),
+        ("beach", Location(30, 20)),
+    ]
+    assert [result.error is None for _, result in results] == [True, True, False]
+    assert len(weather_station.requested_locations) == 2
+    assert weather_companion.get_current_weather_states_for_bookmarks(AuthorID("nobody")) == []
+
+
 def test_should_get_forecast():
     forecast = Forecast()
     weather_state = WeatherState(
@@ -79,7 +262,7 @@ def test_should_get_forecast():
         feels_like=11,
         pressure=1024,
     )
-    forecast.add(weather_state, date_time="2020-01-01")
+    forecast.add(weather_state, date_time=datetime(2020, 1, 1))
 
     weather_station = WeatherStationMock()
     weather_station.forecast = forecast
@@ -94,6 +277,184 @@ def test_should_get_forecast():
     assert result == forecast
 
 
+def test_should_get_daily_forecast():
+    forecast = Forecast()
+    for hour, temperature in [(9, 10), (15, 20), (21, 12)]:
+        weather_state = WeatherState(temperature=temperature, humidity=20, feels_like=11, pressure=1024)
+        forecast.add(weather_state, date_time=datetime(2020, 1, 1, hour))
+
+    weather_station = WeatherStationMock()
+    weather_station.forecast = forecast
+    weather_companion = system.WeatherCompanion(
+        weather_station=weather_station,
+        journal_repository=InMemoryJournalRepository(),
+        bookmark_repository=InMemoryLocationBookmarkRepository(),
+    )
+
+    location = Location(latitude=10, longitude=20)
+    days = asyncio.run(weather_companion.get_daily_forecast_async(location, date(2020, 1, 1), date(2020, 1, 1)))
+    assert len(days) == 1
+    assert (days[0].min_temperature, days[0].max_temperature, days[0].mean_temperature) == (10, 20, 14)
+
+
+class SlowForecastWeatherStationMock(AsyncWeatherStation):
+    """
+    Forecasts take latitude milliseconds, fails for the locations in failing_latitudes, records the fetches in flight
+    """
+
+    def __init__(self, failing_latitudes=()):
+        self.requested_locations = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._failing_latitudes = failing_latitudes
+
+    async def get_forecast(self, location: Location, start_date: date, end_date: date) -> Forecast:
+        self.requested_locations.append(location)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(location.latitude / 1000)
+        finally:
+            self.in_flight -= 1
+        if location.latitude in self._failing_latitudes:
+            raise WeatherStationError("test")
+        forecast = Forecast()
+        forecast.add(WeatherState(temperature=location.latitude, humidity=20, feels_like=11, pressure=1024), start_date)
+        return forecast
+
+
+def test_should_stream_forecasts_for_a_batch_of_locations_in_completion_order():
+    weather_station = SlowForecastWeatherStationMock(failing_latitudes=(20,))
+    weather_companion = system.WeatherCompanion(
+        weather_station=WeatherStationMock(),
+        async_weather_station=weather_station,
+        journal_repository=InMemoryJournalRepository(),
+        bookmark_repository=InMemoryLocationBookmarkRepository(),
+    )
+    locations = [Location(40, 20), Location(20, 20), Location(10, 20), Location(40.001, 20), Location(30, 20)]
+
+    async def stream():
+        iterator = weather_companion.iter_forecasts_async(
+            locations, datetime(2020, 1, 1), datetime(2020, 1, 2), max_concurrency=2
+        )
+        return [result async for result in iterator]
+
+    results = asyncio.run(stream())
+
+    assert [result.index for result in results] == [1, 2, 0, 3, 4]
+    assert [result.location for result in results] == [locations[index] for index in [1, 2, 0, 3, 4]]
+    assert results[0].forecast is None
+    assert results[0].error == "Unable to get weather forecast"
+    assert [weather_state.temperature for _, weather_state in results[2].forecast] == [40]
+    # Nearby locations share the fetch of their grid cell, fetches in flight are bounded
+    assert len(weather_station.requested_locations) == 4
+    assert weather_station.max_in_flight == 2
+
+
+def test_should_cancel_the_forecast_fetches_when_the_stream_is_closed():
+    weather_station = SlowForecastWeatherStationMock()
+    weather_companion = system.WeatherCompanion(
+        weather_station=WeatherStationMock(),
+        async_weather_station=weather_station,
+        journal_repository=InMemoryJournalRepository(),
+        bookmark_repository=InMemoryLocationBookmarkRepository(),
+    )
+    locations = [Location(1, 20), Location(50, 20), Location(60, 20), Location(70, 20)]
+
+    async def first_result():
+        iterator = weather_companion.iter_forecasts_async(
+            locations, datetime(2020, 1, 1), datetime(2020, 1, 2), max_concurrency=2
+        )
+        result = await iterator.__anext__()
+        await iterator.aclose()
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(first_result()).index == 0
+    # The slow fetch in flight is cancelled, the rest never start
+    assert weather_station.in_flight == 0
+    assert len(weather_station.requested_locations) == 2
+
+
+def test_should_get_forecast_with_freshness_async_from_sync_weather_station():
+    forecast = Forecast()
+    forecast.add(
+        WeatherState(temperature=10, humidity=20, feels_like=11, pressure=1024), date_time=datetime(2020, 1, 1)
+    )
+    weather_station = WeatherStationMock()
+    weather_station.forecast = forecast
+    weather_companion = system.WeatherCompanion(
+        weather_station=weather_station,
+        journal_repository=InMemoryJournalRepository(),
+        bookmark_repository=InMemoryLocationBookmarkRepository(),
+    )
+    location = Location(latitude=10, longitude=20)
+
+    result, freshness = asyncio.run(
+        weather_companion.get_forecast_with_freshness_async(location, date(2020, 1, 1), date(2020, 1, 2))
+    )
+    assert result == forecast
+    # Not cached results are not fresh
+    assert freshness.max_age == 0
+
+    weather_station.exception = WeatherStationError("test")
+    with pytest.raises(system.WeatherCompanionError):
+        asyncio.run(weather_companion.get_current_state_with_freshness_async(location))
+
+
+def test_aclose_should_close_both_weather_stations_and_their_cache(tmp_path):
+    weather_station = WeatherStationMock()
+    async_weather_station = AsyncWeatherStationMock()
+    weather_cache = SQLiteWeatherCache(str(tmp_path / "weather_cache.db"))
+    weather_companion = system.WeatherCompanion(
+        weather_station=weather_station,
+        async_weather_station=async_weather_station,
+        journal_repository=InMemoryJournalRepository(),
+        bookmark_repository=InMemoryLocationBookmarkRepository(),
+        weather_cache=weather_cache,
+    )
+
+    asyncio.run(weather_companion.aclose())
+    assert weather_station.closed
+    assert async_weather_station.closed
+    with pytest.raises(sqlite3.ProgrammingError):
+        weather_cache.stats()
+
+
+def test_async_methods_should_call_blocking_repositories_off_the_event_loop():
+    weather_station = AsyncWeatherStationMock()
+    weather_station.weather_state = WeatherState(temperature=10, humidity=20, feels_like=11, pressure=1024)
+    journal_repository = BlockingJournalRepositoryMock()
+    bookmark_repository = BlockingBookmarkRepositoryMock()
+    weather_companion = system.WeatherCompanion(
+        weather_station=WeatherStationMock(),
+        async_weather_station=weather_station,
+        journal_repository=journal_repository,
+        bookmark_repository=bookmark_repository,
+    )
+    author = AuthorID("author")
+    entry = JournalEntry(location=Location(10, 20), date=date(2023, 1, 1), note=Note("sunny"))
+    bookmark_repository.add(Bookmark("home"), Location(10, 20), author)
+
+    async def use_repositories():
+        entry_id = await weather_companion.add_journal_entry_async(entry, author)
+        entries = await weather_companion.query_journal_entries_async(author)
+        bookmark_weather_state = await weather_companion.get_current_weather_state_for_bookmark_async(
+            Bookmark("home"), author
+        )
+        bookmarks = await weather_companion.get_current_weather_states_for_bookmarks_async(author)
+        return entry_id, entries, bookmark_weather_state, bookmarks
+
+    entry_id, entries, bookmark_weather_state, bookmarks = asyncio.run(use_repositories())
+
+    assert entries == [(entry_id, entry)]
+    assert bookmark_weather_state == weather_station.weather_state
+    assert [bookmark.name() for bookmark, _ in bookmarks] == ["home"]
+    assert len(journal_repository.threads) == 2
+    assert len(bookmark_repository.threads) == 2
+    assert threading.get_ident() not in journal_repository.threads + bookmark_repository.threads
+
+
 def test_should_raise_exception_if_error_getting_forecast():
     weather_station = WeatherStationMock()
     weather_station.exception = WeatherStationError("test")
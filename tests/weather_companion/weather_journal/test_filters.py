@@ -10,7 +10,7 @@ from weather_companion.weather_journal.filters import (
     LocationProximityFilter,
     NoteContentFilter,
 )
-from weather_companion.weather_station import Location
+from weather_companion.weather_station import DistanceAccuracy, Location
 
 now = datetime.now()
 
@@ -95,3 +95,45 @@ def test_should_return_filtered_entries_by_location_proximity(journal):
     filter_by_location_proximity = LocationProximityFilter(location, 1000)
     filtered_entries = list(filter(filter_by_location_proximity.condition, journal))
     assert len(filtered_entries) == 2
+
+
+def test_location_proximity_bounding_box_should_contain_the_locations_within_the_distance():
+    center = Location(latitude=-34.6, longitude=-58.4)
+    location_filter = LocationProximityFilter(location=center, max_distance=500)
+    min_latitude, max_latitude, min_longitude, max_longitude = location_filter.bounding_box()
+
+    # Locations every 0.5 degrees around the circle of 500 km
+    for latitude in range(-45 * 2, -25 * 2):
+        for longitude in range(-68 * 2, -48 * 2):
+            location = Location(latitude=latitude / 2, longitude=longitude / 2)
+            if center.distance_to(location) <= 500:
+                assert min_latitude <= location.latitude <= max_latitude
+                assert min_longitude <= location.longitude <= max_longitude
+    assert max_latitude - min_latitude < 10
+    assert LocationProximityFilter(location=Location(89, 0), max_distance=500).bounding_box()[2:] == (-180, 180)
+
+
+def test_location_proximity_should_match_the_geodesic_distance_near_the_boundary():
+    center = Location(latitude=-34.6, longitude=-58.4)
+    location_filter = LocationProximityFilter(location=center, max_distance=100)
+
+    for step in range(-50, 51):
+        # Along the meridian and the parallel, from inside to outside of the circle, across the boundary
+        for location in (
+            Location(latitude=center.latitude + 0.9 + step / 1000, longitude=center.longitude),
+            Location(latitude=center.latitude, longitude=center.longitude + 1.09 + step / 1000),
+        ):
+            assert location_filter.contains(location) == (center.distance_to(location) <= 100)
+
+
+def test_location_proximity_should_check_many_locations_at_once():
+    center = Location(latitude=-34.6, longitude=-58.4)
+    locations = [Location(latitude=center.latitude + i / 100, longitude=center.longitude - i / 50) for i in range(200)]
+    latitudes = [location.latitude for location in locations]
+    longitudes = [location.longitude for location in locations]
+
+    for accuracy in DistanceAccuracy:
+        location_filter = LocationProximityFilter(location=center, max_distance=250, accuracy=accuracy)
+        assert location_filter.contains_all(latitudes, longitudes).tolist() == [
+            location_filter.contains(location) for location in locations
+        ]
@@ -0,0 +1,389 @@
+import asyncio
+import threading
+from datetime import date, datetime, timezone
+
+import pytest
+
+from weather_companion.weather_station import (
+    AsyncCachingWeatherStation,
+    AsyncWeatherStation,
+    CachingWeatherStation,
+    Forecast,
+    InMemoryWeatherCache,
+    Location,
+    PackedWeatherState,
+    WeatherState,
+    WeatherStation,
+    WeatherStationError,
+)
+from weather_companion.weather_station.freshness import digest
+
+WEATHER_STATE = WeatherState(temperature=10, humidity=20, feels_like=11, pressure=1024)
+
+
+class ClockMock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingWeatherStationMock(WeatherStation):
+    """
+    Weather station mock that counts the calls and records the requested locations
+    """
+
+    def __init__(self) -> None:
+        self.requested_locations = []
+        self.exception = None
+        self.closed = False
+
+    def get_current_state(self, location: Location) -> WeatherState:
+        self.requested_locations.append(location)
+        if self.exception:
+            raise self.exception
+        return WEATHER_STATE
+
+    def get_forecast(self, location: Location, start_date: date, end_date: date) -> Forecast:
+        self.requested_locations.append(location)
+        return Forecast()
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class BlockingCacheMock(InMemoryWeatherCache):
+    """
+    In memory cache that declares itself blocking, and records the threads of the calls
+    """
+
+    blocking = True
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.threads = []
+
+    def get_entry(self, key: str):
+        self.threads.append(threading.get_ident())
+        return super().get_entry(key)
+
+    def set(self, key: str, value, ttl: float, stale_ttl: float = 0) -> None:
+        self.threads.append(threading.get_ident())
+        super().set(key, value, ttl, stale_ttl)
+
+
+class AsyncCountingWeatherStationMock(AsyncWeatherStation):
+    def __init__(self) -> None:
+        self.requested_locations = []
+        self.closed = False
+
+    async def get_current_state(self, location: Location) -> WeatherState:
+        self.requested_locations.append(location)
+        return WEATHER_STATE
+
+    async def get_forecast(self, location: Location, start_date: date, end_date: date) -> Forecast:
+        self.requested_locations.append(location)
+        return Forecast()
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+def test_should_serve_close_locations_from_cache():
+    inner_station = CountingWeatherStationMock()
+    weather_station = CachingWeatherStation(weather_station=inner_station, precision=2)
+
+    assert weather_station.get_current_state(Location(51.5074, 0.1278)) == WEATHER_STATE
+    assert weather_station.get_current_state(Location(51.5071, 0.1281)) == WEATHER_STATE
+    assert inner_station.requested_locations == [Location(51.51, 0.13)]
+
+    stats = weather_station.stats()
+    assert stats.hits == 1
+    assert stats.misses == 1
+
+
+def test_should_cache_weather_states_packed():
+    cache = InMemoryWeatherCache()
+    weather_station = CachingWeatherStation(weather_station=CountingWeatherStationMock(), cache=cache)
+
+    weather_station.get_current_state(Location(51.5074, 0.1278))
+    assert isinstance(cache.get("current:51.51:0.13"), PackedWeatherState)
+    cached_state = weather_station.get_current_state(Location(51.5074, 0.1278))
+    assert isinstance(cached_state, WeatherState)
+    assert cached_state == WEATHER_STATE
+
+
+def test_should_fetch_again_once_ttl_expires():
+    clock = ClockMock()
+    inner_station = CountingWeatherStationMock()
+    weather_station = CachingWeatherStation(
+        weather_station=inner_station, cache=InMemoryWeatherCache(clock=clock), current_state_ttl=60
+    )
+    location = Location(51.5074, 0.1278)
+
+    weather_station.get_current_state(location)
+    clock.now += 59
+    weather_station.get_current_state(location)
+    assert len(inner_station.requested_locations) == 1
+
+    clock.now += 1
+    weather_station.get_current_state(location)
+    assert len(inner_station.requested_locations) == 2
+
+
+def test_should_cache_forecasts_per_date_range():
+    inner_station = CountingWeatherStationMock()
+    weather_station = CachingWeatherStation(weather_station=inner_station)
+    location = Location(51.5074, 0.1278)
+
+    weather_station.get_forecast(location, date(2023, 1, 1), date(2023, 1, 2))
+    weather_station.get_forecast(location, date(2023, 1, 1), date(2023, 1, 2))
+    weather_station.get_forecast(location, date(2023, 1, 1), date(2023, 1, 3))
+    assert len(inner_station.requested_locations) == 2
+
+
+def test_should_evict_least_recently_used_entries():
+    inner_station = CountingWeatherStationMock()
+    weather_station = CachingWeatherStation(weather_station=inner_station, cache=InMemoryWeatherCache(max_size=2))
+
+    weather_station.get_current_state(Location(10, 10))
+    weather_station.get_current_state(Location(20, 20))
+    weather_station.get_current_state(Location(10, 10))
+    weather_station.get_current_state(Location(30, 30))  # evicts (20, 20)
+    weather_station.get_current_state(Location(10, 10))
+    weather_station.get_current_state(Location(20, 20))
+
+    assert inner_station.requested_locations == [Location(10, 10), Location(20, 20), Location(30, 30), Location(20, 20)]
+    assert weather_station.stats().evictions == 2
+    assert weather_station.stats().size == 2
+
+
+def test_should_return_the_freshness_of_cached_results():
+    clock = ClockMock()
+    inner_station = CountingWeatherStationMock()
+    weather_station = CachingWeatherStation(
+        weather_station=inner_station, cache=InMemoryWeatherCache(clock=clock), current_state_ttl=60, stale_ttl=60
+    )
+
+    weather_state, freshness = weather_station.get_current_state_with_freshness(Location(51.5074, 0.1278))
+    assert weather_state == WEATHER_STATE
+    assert freshness.max_age == 60
+
+    clock.now += 20
+    cached_state, cached_freshness = weather_station.get_current_state_with_freshness(Location(51.5071, 0.1281))
+    assert cached_state == WEATHER_STATE
+    assert cached_freshness == freshness._replace(max_age=40)
+    assert len(inner_station.requested_locations) == 1
+
+    # Stale results are not fresh, other cells have other digests
+    clock.now += 50
+    assert weather_station.get_current_state_with_freshness(Location(51.5074, 0.1278))[1].max_age == 0
+    assert weather_station.get_current_state_with_freshness(Location(10, 10))[1].digest != freshness.digest
+    weather_station.close()
+
+
+def test_freshness_digest_should_change_with_the_values():
+    forecast = Forecast()
+    forecast.add(WEATHER_STATE, datetime(2023, 1, 1, tzinfo=timezone.utc))
+    other_forecast = Forecast()
+    other_forecast.add(WEATHER_STATE._replace(temperature=11), datetime(2023, 1, 1, tzinfo=timezone.utc))
+
+    assert digest(WEATHER_STATE) == digest(PackedWeatherState.pack(WEATHER_STATE))
+    assert digest(WEATHER_STATE) != digest(WEATHER_STATE._replace(rain_1h=0.0))
+    assert digest(WEATHER_STATE) != digest(WEATHER_STATE, "current:10.0:10.0")
+    assert digest(forecast) == digest(forecast.between(date(2023, 1, 1), date(2023, 1, 1)))
+    assert digest(forecast) != digest(other_forecast)
+
+
+def test_async_should_return_the_freshness_of_cached_forecasts():
+    inner_station = AsyncCountingWeatherStationMock()
+    weather_station = AsyncCachingWeatherStation(weather_station=inner_station, forecast_ttl=120)
+    location = Location(51.5074, 0.1278)
+
+    async def get_forecasts_with_freshness():
+        return [
+            await weather_station.get_forecast_with_freshness(location, date(2023, 1, 1), date(2023, 1, 2))
+            for _ in range(2)
+        ]
+
+    (forecast, freshness), (cached_forecast, cached_freshness) = asyncio.run(get_forecasts_with_freshness())
+    assert len(forecast) == 0
+    assert 119 < cached_freshness.max_age <= freshness.max_age == 120
+    assert cached_freshness.digest == freshness.digest
+    assert len(inner_station.requested_locations) == 1
+
+
+def test_should_not_cache_errors():
+    inner_station = CountingWeatherStationMock()
+    inner_station.exception = WeatherStationError("test")
+    weather_station = CachingWeatherStation(weather_station=inner_station)
+
+    for _ in range(2):
+        with pytest.raises(WeatherStationError):
+            weather_station.get_current_state(Location(10, 10))
+    assert len(inner_station.requested_locations) == 2
+
+
+def test_async_should_serve_close_locations_from_cache():
+    inner_station = AsyncCountingWeatherStationMock()
+    weather_station = AsyncCachingWeatherStation(weather_station=inner_station, precision=2)
+
+    async def get_states():
+        first = await weather_station.get_current_state(Location(51.5074, 0.1278))
+        second = await weather_station.get_current_state(Location(51.5071, 0.1281))
+        return first, second
+
+    assert asyncio.run(get_states()) == (WEATHER_STATE, WEATHER_STATE)
+    assert inner_station.requested_locations == [Location(51.51, 0.13)]
+
+
+def test_async_should_call_a_blocking_cache_off_the_event_loop():
+    cache = BlockingCacheMock()
+    inner_station = AsyncCountingWeatherStationMock()
+    weather_station = AsyncCachingWeatherStation(weather_station=inner_station, cache=cache)
+
+    async def get_states():
+        return [await weather_station.get_current_state(Location(10, 10)) for _ in range(2)]
+
+    assert asyncio.run(get_states()) == [WEATHER_STATE] * 2
+    assert len(inner_station.requested_locations) == 1
+    # Miss, store and hit
+    assert len(cache.threads) == 3
+    assert threading.get_ident() not in cache.threads
+
+
+def test_async_concurrent_misses_should_be_coalesced():
+    class SlowWeatherStationMock(AsyncCountingWeatherStationMock):
+        async def get_current_state(self, location: Location) -> WeatherState:
+            await asyncio.sleep(0.01)
+            return await super().get_current_state(location)
+
+    inner_station = SlowWeatherStationMock()
+    weather_station = AsyncCachingWeatherStation(weather_station=inner_station)
+
+    async def get_states():
+        return await asyncio.gather(*[weather_station.get_current_state(Location(10, 10)) for _ in range(20)])
+
+    assert asyncio.run(get_states()) == [WEATHER_STATE] * 20
+    assert len(inner_station.requested_locations) == 1
+
+
+def test_should_serve_stale_entries_while_refreshing_in_background():
+    clock = ClockMock()
+    inner_station = CountingWeatherStationMock()
+    weather_station = CachingWeatherStation(
+        weather_station=inner_station, cache=InMemoryWeatherCache(clock=clock), current_state_ttl=60, stale_ttl=60
+    )
+    location = Location(10, 10)
+
+    weather_station.get_current_state(location)
+    clock.now += 90
+    inner_station.exception = WeatherStationError("test")
+    assert weather_station.get_current_state(location) == WEATHER_STATE
+    weather_station.close()
+    assert len(inner_station.requested_locations) == 2
+    assert weather_station.stats().stale_hits == 1
+
+    # Failed refresh keeps the stale entry, until the stale ttl ends
+    inner_station.exception = None
+    assert weather_station.get_current_state(location) == WEATHER_STATE
+    weather_station.close()
+    clock.now += 10
+    weather_station.get_current_state(location)
+    assert len(inner_station.requested_locations) == 3
+    assert weather_station.stats().hits == 1
+
+
+def test_should_refresh_hot_entries_ahead_of_expiry():
+    clock = ClockMock()
+    inner_station = CountingWeatherStationMock()
+    weather_station = CachingWeatherStation(
+        weather_station=inner_station,
+        cache=InMemoryWeatherCache(clock=clock),
+        current_state_ttl=60,
+        refresh_ahead=10,
+    )
+    location = Location(10, 10)
+
+    weather_station.get_current_state(location)
+    clock.now += 30
+    weather_station.get_current_state(location)
+    weather_station.close()
+    assert len(inner_station.requested_locations) == 1
+
+    clock.now += 25
+    weather_station.get_current_state(location)
+    weather_station.close()
+    assert len(inner_station.requested_locations) == 2
+
+    # Refreshed entry expires 60 seconds after the refresh
+    clock.now += 40
+    weather_station.get_current_state(location)
+    assert len(inner_station.requested_locations) == 2
+
+
+def test_async_should_refresh_stale_entries_once_per_key():
+    clock = ClockMock()
+    inner_station = AsyncCountingWeatherStationMock()
+    weather_station = AsyncCachingWeatherStation(
+        weather_station=inner_station, cache=InMemoryWeatherCache(clock=clock), current_state_ttl=60, stale_ttl=60
+    )
+    location = Location(10, 10)
+
+    async def get_states():
+        await weather_station.get_current_state(location)
+        clock.now += 90
+        states = [await weather_station.get_current_state(location) for _ in range(10)]
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return states
+
+    assert asyncio.run(get_states()) == [WEATHER_STATE] * 10
+    assert len(inner_station.requested_locations) == 2
+    assert weather_station.stats().stale_hits == 10
+
+
+def test_close_should_stop_the_refreshes_and_close_the_wrapped_weather_station():
+    clock = ClockMock()
+    inner_station = CountingWeatherStationMock()
+    weather_station = CachingWeatherStation(
+        weather_station=inner_station, cache=InMemoryWeatherCache(clock=clock), current_state_ttl=60, stale_ttl=60
+    )
+    weather_station.get_current_state(Location(10, 10))
+    clock.now += 90
+    weather_station.get_current_state(Location(10, 10))
+
+    weather_station.close()
+
+    assert len(inner_station.requested_locations) == 2
+    assert weather_station._refresh_executor is None
+    assert inner_station.closed
+
+
+def test_async_close_should_wait_for_the_cancelled_refreshes():
+    class HangingWeatherStationMock(AsyncCountingWeatherStationMock):
+        async def get_current_state(self, location: Location) -> WeatherState:
+            if self.requested_locations:
+                # The refresh never ends unless it is cancelled
+                await asyncio.Event().wait()
+            return await super().get_current_state(location)
+
+    clock = ClockMock()
+    inner_station = HangingWeatherStationMock()
+    weather_station = AsyncCachingWeatherStation(
+        weather_station=inner_station, cache=InMemoryWeatherCache(clock=clock), current_state_ttl=60, stale_ttl=60
+    )
+
+    async def refresh_and_close():
+        await weather_station.get_current_state(Location(10, 10))
+        clock.now += 90
+        await weather_station.get_current_state(Location(10, 10))
+        (refresh_task,) = weather_station._refresh_tasks.values()
+        await weather_station.aclose()
+        # Done before the loop is closed
+        assert refresh_task.cancelled()
+        assert weather_station._refresh_tasks == {}
+
+    asyncio.run(refresh_and_close())
+    assert inner_station.closed
@@ -0,0 +1,51 @@
+from datetime import date, datetime, timedelta, timezone
+
+from weather_companion.weather_station import (
+    DailySummary,
+    Forecast,
+    WeatherState,
+    aggregate_daily,
+)
+
+TZ = timezone(timedelta(hours=-3))
+
+
+def _weather_state(temperature: float, rain_3h: float = None, wind_gust: float = None) -> WeatherState:
+    return WeatherState(
+        temperature=temperature, humidity=40, feels_like=20, pressure=1020, rain_3h=rain_3h, wind_gust=wind_gust
+    )
+
+
+def test_aggregate_daily_should_summarize_each_local_day():
+    forecast = Forecast()
+    start = datetime(2023, 11, 10, 18, tzinfo=TZ)
+    temperatures = [10, 20, 14, 16, 30]
+    rain = [None, 1.5, 0.5, None, None]
+    gusts = [None, None, 7, 12, None]
+    for i, (temperature, rain_3h, wind_gust) in enumerate(zip(temperatures, rain, gusts)):
+        forecast.add(_weather_state(temperature, rain_3h, wind_gust), start + timedelta(hours=3 * i))
+
+    days = aggregate_daily(forecast)
+
+    # 18h and 21h on the 10th, the rest on the 11th, in the location timezone
+    assert days == [
+        DailySummary(date(2023, 11, 10), 10, 20, 15, 1.5, 0, None, 2),
+        DailySummary(date(2023, 11, 11), 14, 30, 20, 0.5, 0, 12, 3),
+    ]
+
+
+def test_aggregate_daily_should_group_days_with_mixed_timezones():
+    forecast = Forecast()
+    forecast.add(_weather_state(0), datetime(2023, 11, 10, 23, tzinfo=timezone.utc))
+    forecast.add(_weather_state(1), datetime(2023, 11, 11, 1, tzinfo=timezone(timedelta(hours=4))))
+    forecast.add(_weather_state(2), datetime(2023, 11, 11, 2, tzinfo=timezone.utc))
+
+    days = aggregate_daily(forecast)
+    assert [(day.date, day.min_temperature, day.max_temperature) for day in days] == [
+        (date(2023, 11, 10), 0, 0),
+        (date(2023, 11, 11), 1, 2),
+    ]
+
+
+def test_aggregate_daily_should_return_no_days_for_an_empty_forecast():
+    assert aggregate_daily(Forecast()) == []
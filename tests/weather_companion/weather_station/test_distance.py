@@ -0,0 +1,47 @@
+import numpy as np
+
+from weather_companion.weather_station import (
+    DistanceAccuracy,
+    Location,
+    great_circle_distances,
+    within_distance,
+)
+
+ORIGIN = Location(-34.6037, -58.3816)
+
+
+def _locations_around_origin():
+    rng = np.random.default_rng(0)
+    latitudes = ORIGIN.latitude + rng.uniform(-2, 2, 2000)
+    longitudes = ORIGIN.longitude + rng.uniform(-2, 2, 2000)
+    return latitudes, longitudes
+
+
+def test_great_circle_distances_should_match_the_distance_of_each_location():
+    latitudes, longitudes = _locations_around_origin()
+
+    distances = great_circle_distances(ORIGIN, latitudes, longitudes)
+
+    assert distances.shape == latitudes.shape
+    for latitude, longitude, distance in zip(latitudes[:50], longitudes[:50], distances[:50]):
+        assert abs(distance - ORIGIN.great_circle_distance_to(Location(latitude, longitude))) < 1e-9
+
+
+def test_geodesic_accuracy_should_give_the_same_results_as_the_geodesic_distance():
+    latitudes, longitudes = _locations_around_origin()
+
+    within = within_distance(ORIGIN, latitudes, longitudes, 150, DistanceAccuracy.GEODESIC)
+
+    expected = [
+        ORIGIN.distance_to(Location(latitude, longitude)) <= 150 for latitude, longitude in zip(latitudes, longitudes)
+    ]
+    assert within.tolist() == expected
+
+
+def test_spherical_accuracy_should_compare_the_great_circle_distance():
+    latitudes, longitudes = _locations_around_origin()
+
+    within = within_distance(ORIGIN, latitudes, longitudes, 150, DistanceAccuracy.SPHERICAL)
+
+    assert within.tolist() == (great_circle_distances(ORIGIN, latitudes, longitudes) <= 150).tolist()
+    assert within_distance(ORIGIN, [], [], 150).tolist() == []
@@ -0,0 +1,104 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from weather_companion.weather_station import (
+    AsyncOWMClient,
+    AsyncOWMWeatherStation,
+    ClientError,
+    Location,
+    OWMClient,
+    OWMWeatherStation,
+    RetryPolicy,
+    WeatherStationError,
+)
+from weather_companion.weather_station.fake_owm_server import FakeOWMServer
+
+NO_BACKOFF = RetryPolicy(max_retries=1, base_delay=0, max_delay=0)
+LOCATION = Location(latitude=-34.61, longitude=-58.38)
+START_TIME = int(datetime(2023, 11, 1, tzinfo=timezone.utc).timestamp())
+
+
+def test_weather_station_reads_the_current_state_and_forecast_from_the_fake_server():
+    with FakeOWMServer(start_time=START_TIME) as server:
+        weather_station = OWMWeatherStation(client=OWMClient(api_key="key", base_url=server.base_url))
+
+        weather_state = weather_station.get_current_state(LOCATION)
+        forecast = weather_station.get_forecast(LOCATION, date(2023, 11, 1), date(2023, 11, 10))
+
+    status, current_state = server.respond("weather", {"lat": str(LOCATION.latitude), "lon": str(LOCATION.longitude)})
+    assert status == 200
+    assert weather_state.temperature == current_state["main"]["temp"]
+    assert len(forecast) == 40
+    assert forecast.get_dates()[0] == datetime(2023, 11, 1, tzinfo=timezone.utc)
+
+
+def test_generated_responses_are_deterministic_for_the_seed_and_location():
+    query = {"lat": "10.5", "lon": "20.5"}
+    server = FakeOWMServer(seed=1, start_time=START_TIME)
+    same_seed_server = FakeOWMServer(seed=1, start_time=START_TIME)
+    other_seed_server = FakeOWMServer(seed=2, start_time=START_TIME)
+    try:
+        assert server.respond("forecast", query) == same_seed_server.respond("forecast", query)
+        assert server.respond("forecast", query) != other_seed_server.respond("forecast", query)
+        assert server.respond("forecast", {"cnt": "8", **query})[1]["cnt"] == 8
+    finally:
+        for fake_server in (server, same_seed_server, other_seed_server):
+            fake_server.stop()
+
+
+def test_fake_server_errors_are_raised_by_the_client():
+    with FakeOWMServer(error_rate=1.0, error_status=503) as server:
+        client = OWMClient(api_key="key", retry_policy=NO_BACKOFF, base_url=server.base_url)
+        with pytest.raises(ClientError):
+            client.get_current_state(LOCATION)
+
+        weather_station = OWMWeatherStation(client=client)
+        with pytest.raises(WeatherStationError):
+            weather_station.get_current_state(LOCATION)
+
+
+def test_fake_server_rejects_invalid_parameters():
+    server = FakeOWMServer()
+    try:
+        with pytest.raises(ValueError):
+            FakeOWMServer(error_rate=2)
+        assert server.respond("weather", {"lat": "north"})[0] == 400
+    finally:
+        server.stop()
+
+
+def test_async_weather_station_reads_from_the_fake_server():
+    async def get_forecast(base_url: str):
+        weather_station = AsyncOWMWeatherStation(client=AsyncOWMClient(api_key="key", base_url=base_url))
+        try:
+            return await weather_station.get_forecast(LOCATION, date(2023, 11, 1), date(2023, 11, 2))
+        finally:
+            await weather_station.aclose()
+
+    with FakeOWMServer(start_time=START_TIME, latency=0.01) as server:
+        forecast = asyncio.run(get_forecast(server.base_url))
+
+    assert len(forecast) == 16
+    assert forecast.get_dates()[-1] == datetime(2023, 11, 2, 21, tzinfo=timezone.utc)
+
+
+def test_recorded_responses_are_replayed(tmp_path):
+    recording_path = str(tmp_path / "owm.json")
+    start_date, end_date = date(2023, 11, 1), date(2023, 11, 1) + timedelta(days=5)
+    with FakeOWMServer(start_time=START_TIME, seed=7) as upstream:
+        with FakeOWMServer(record_path=recording_path, upstream_url=upstream.base_url) as recorder:
+            weather_station = OWMWeatherStation(client=OWMClient(api_key="key", base_url=recorder.base_url))
+            recorded_state = weather_station.get_current_state(LOCATION)
+            recorded_forecast = weather_station.get_forecast(LOCATION, start_date, end_date)
+
+    with FakeOWMServer(replay_path=recording_path) as replayer:
+        # The api key is not part of the recordings
+        weather_station = OWMWeatherStation(
+            client=OWMClient(api_key="other-key", retry_policy=NO_BACKOFF, base_url=replayer.base_url)
+        )
+        assert weather_station.get_current_state(LOCATION) == recorded_state
+        assert list(weather_station.get_forecast(LOCATION, start_date, end_date)) == list(recorded_forecast)
+        with pytest.raises(WeatherStationError):
+            weather_station.get_current_state(Location(latitude=0, longitude=0))
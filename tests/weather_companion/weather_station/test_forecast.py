@@ -0,0 +1,100 @@
+import math
+import pickle
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from weather_companion.weather_station import Forecast, PackedWeatherState, WeatherState
+
+START = datetime(2023, 11, 10, tzinfo=timezone.utc)
+
+
+def _weather_state(temperature: float, rain_3h: float = None) -> WeatherState:
+    return WeatherState(temperature=temperature, humidity=40, feels_like=20, pressure=1020, rain_3h=rain_3h)
+
+
+def _forecast(n_items: int) -> Forecast:
+    forecast = Forecast()
+    forecast.add_all(
+        [_weather_state(i) for i in range(n_items)], [START + timedelta(hours=3 * i) for i in range(n_items)]
+    )
+    return forecast
+
+
+def test_forecast_should_keep_the_weather_states_sorted_by_date_time():
+    forecast = Forecast()
+    for i in [3, 0, 2, 1]:
+        forecast.add(_weather_state(i), START + timedelta(hours=3 * i))
+
+    assert len(forecast) == 4
+    assert forecast.get_dates() == [START + timedelta(hours=3 * i) for i in range(4)]
+    assert [weather_state.temperature for _, weather_state in forecast] == [0, 1, 2, 3]
+
+
+def test_forecast_should_reject_duplicated_date_times():
+    forecast = _forecast(4)
+
+    with pytest.raises(ValueError):
+        forecast.add(_weather_state(10), START + timedelta(hours=3))
+    with pytest.raises(ValueError):
+        forecast.add_all([_weather_state(10)], [START])
+    assert len(forecast) == 4
+
+
+def test_add_all_should_reject_a_date_time_per_weather_state_mismatch():
+    forecast = _forecast(4)
+    later = START + timedelta(days=1)
+
+    with pytest.raises(ValueError):
+        forecast.add_all([_weather_state(10), _weather_state(11)], [later])
+    with pytest.raises(ValueError):
+        forecast.add_all([_weather_state(10)], [later, later + timedelta(hours=3)])
+    assert len(forecast) == 4
+    assert all(len(column) == 4 for column in forecast.columns().values())
+
+
+def test_forecast_should_lookup_days_and_date_ranges():
+    forecast = _forecast(40)
+
+    assert [state.temperature for state in forecast.get_weather_states_for_date(date(2023, 11, 11))] == list(
+        range(8, 16)
+    )
+    assert forecast.get_weather_states_for_date(date(2023, 12, 1)) == []
+
+    two_days = forecast.between(date(2023, 11, 11), date(2023, 11, 12))
+    assert [state.temperature for _, state in two_days] == list(range(8, 24))
+    assert len(forecast.between(date(2023, 11, 1), date(2023, 11, 9))) == 0
+
+
+def test_forecast_should_lookup_days_with_mixed_timezones():
+    forecast = Forecast()
+    forecast.add(_weather_state(0), datetime(2023, 11, 10, 23, tzinfo=timezone.utc))
+    # Earlier in time, but a day later in its timezone
+    forecast.add(_weather_state(1), datetime(2023, 11, 11, 1, tzinfo=timezone(timedelta(hours=4))))
+
+    assert [state.temperature for state in forecast.get_weather_states_for_date(date(2023, 11, 11))] == [1]
+    assert [state.temperature for _, state in forecast.between(date(2023, 11, 10), date(2023, 11, 10))] == [0]
+
+
+def test_forecast_columns_should_be_sorted_views_with_nan_for_missing_values():
+    forecast = Forecast()
+    forecast.add(_weather_state(2, rain_3h=0.5), START + timedelta(hours=3))
+    forecast.add(_weather_state(1), START)
+
+    columns = forecast.columns()
+    assert list(columns["timestamp"]) == [START.timestamp(), (START + timedelta(hours=3)).timestamp()]
+    assert list(columns["temperature"]) == [1, 2]
+    assert math.isnan(columns["rain_3h"][0]) and columns["rain_3h"][1] == 0.5
+    assert columns["temperature"].readonly
+
+
+def test_packed_weather_state_should_unpack_to_the_same_weather_state():
+    weather_state = WeatherState(
+        temperature=21.53, humidity=40, feels_like=-2.5, pressure=1042, wind_direction=120, rain_3h=0.3
+    )
+
+    packed = PackedWeatherState.pack(weather_state)
+    assert len(packed) < len(pickle.dumps(weather_state))
+    assert packed.unpack() == weather_state
+    assert packed.unpack().wind_speed is None
+    assert pickle.loads(pickle.dumps(packed)).unpack() == weather_state
@@ -25,3 +25,13 @@ def test_should_fail_if_latitude_or_longitude_invalid():
     with pytest.raises(ValueError) as e:
         Location(0, -181)
     assert str(e.value) == "Coordinate must be between -90 and 90"
+
+
+def test_great_circle_distance_should_approximate_the_geodesic_distance():
+    buenos_aires = Location(-34.6037, -58.3816)
+    montevideo = Location(-34.9011, -56.1645)
+
+    assert buenos_aires.great_circle_distance_to(buenos_aires) == 0
+    assert buenos_aires.great_circle_distance_to(montevideo) == pytest.approx(
+        buenos_aires.distance_to(montevideo), rel=0.01
+    )
@@ -1,15 +1,22 @@
+import asyncio
 import os
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta, timezone
 
 import pytest
 
 from weather_companion.weather_station import (
+    AsyncOWMClient,
+    AsyncOWMWeatherStation,
     ClientError,
+    DailySummary,
+    HTTPTransport,
     Location,
     OWMClient,
     OWMWeatherStation,
     WeatherStationError,
+    aggregate_daily,
 )
+from weather_companion.weather_station.forecast_parser import parse_forecast_items
 
 
 class OpenWeatherMapClientMock(OWMClient):
@@ -31,6 +38,85 @@ class OpenWeatherMapClientMock(OWMClient):
         return self._current_state_response
 
 
+class AsyncOpenWeatherMapClientMock(AsyncOWMClient):
+    """
+    Mocks the AsyncOWMClient class. Used to test the AsyncOWMWeatherStation class.
+    """
+
+    def __init__(self) -> None:
+        self._current_state_response = None
+        self._error = None
+
+    def set_current_state_response(self, response: dict, error: Exception = None) -> None:
+        self._current_state_response = response
+        self._error = error
+
+    async def get_current_state(self, location: Location) -> dict:
+        if self._error:
+            raise self._error
+        return self._current_state_response
+
+
+class ResponseMock:
+    def __init__(self, status_code: int, body: dict, headers: dict = None) -> None:
+        self.status_code = status_code
+        self.text = str(body)
+        self.headers = headers if headers is not None else {}
+        self._body = body
+
+    def json(self) -> dict:
+        return self._body
+
+
+class HTTPTransportMock(HTTPTransport):
+    """
+    Mocks the HTTPTransport class, records the requested urls
+    """
+
+    def __init__(self, response: ResponseMock = None, error: Exception = None) -> None:
+        self.requested_urls = []
+        self.closed = False
+        self._response = response
+        self._error = error
+
+    def get(self, url: str, timeout: float = None) -> ResponseMock:
+        self.requested_urls.append(url)
+        if self._error:
+            raise self._error
+        return self._response
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_client_should_request_through_transport():
+    transport = HTTPTransportMock(response=ResponseMock(200, {"main": {}}))
+    client = OWMClient(api_key="key", transport=transport)
+
+    response = client.get_current_state(Location(51.5074, 0.1278))
+    assert response == {"main": {}}
+    assert len(transport.requested_urls) == 1
+    assert "/weather?lat=51.5074&lon=0.1278&appid=key" in transport.requested_urls[0]
+
+
+def test_client_should_fail_if_transport_returns_error_status_or_times_out():
+    client = OWMClient(api_key="key", transport=HTTPTransportMock(response=ResponseMock(500, {})))
+    with pytest.raises(ClientError):
+        client.get_forecast(Location(51.5074, 0.1278))
+
+    client = OWMClient(api_key="key", transport=HTTPTransportMock(error=TimeoutError("read timeout")))
+    with pytest.raises(ClientError):
+        client.get_forecast(Location(51.5074, 0.1278))
+
+
+def test_weather_station_close_should_close_the_client_transport():
+    transport = HTTPTransportMock()
+    weather_station = OWMWeatherStation(client=OWMClient(api_key="key", transport=transport))
+
+    weather_station.close()
+    assert transport.closed
+
+
 def test_get_current_state_response_should_include_mandatory_data():
     client = OpenWeatherMapClientMock()
     weather_station = OWMWeatherStation(client=client)
@@ -138,6 +224,86 @@ def test_get_current_state_should_fail_if_mandatory_data_missing():
             weather_station.get_current_state(location)
 
 
+def test_async_get_current_state_response_should_include_mandatory_data():
+    client = AsyncOpenWeatherMapClientMock()
+    weather_station = AsyncOWMWeatherStation(client=client)
+
+    client.set_current_state_response({"main": {"temp": 23, "humidity": 40, "feels_like": 21, "pressure": 1042}})
+    weather_state = asyncio.run(weather_station.get_current_state(Location(51.5074, 0.1278)))
+    assert weather_state.temperature == 23
+    assert weather_state.humidity == 40
+    assert weather_state.feels_like == 21
+    assert weather_state.pressure == 1042
+
+
+def test_async_get_current_state_should_fail_if_error_raised_by_client():
+    client = AsyncOpenWeatherMapClientMock()
+    weather_station = AsyncOWMWeatherStation(client=client)
+
+    client.set_current_state_response(None, ClientError("some error message"))
+    with pytest.raises(WeatherStationError) as e:
+        asyncio.run(weather_station.get_current_state(Location(51.5074, 0.1278)))
+    assert str(e.value).startswith("Client error:")
+
+
+class ForecastClientMock(OWMClient):
+    """
+    Mocks the forecast requests of the OWMClient, counts the calls
+    """
+
+    def __init__(self, forecast_response: dict) -> None:
+        self.forecast_calls = 0
+        self._forecast_response = forecast_response
+
+    def get_forecast(self, location: Location) -> dict:
+        self.forecast_calls += 1
+        return self._forecast_response
+
+
+def _forecast_response(start: datetime, n_items: int) -> dict:
+    items = []
+    for i in range(n_items):
+        date_time = start + timedelta(hours=3 * i)
+        items.append(
+            {"dt": int(date_time.timestamp()), "main": {"temp": i, "humidity": 40, "feels_like": 21, "pressure": 1042}}
+        )
+    return {"city": {"timezone": 0}, "list": items}
+
+
+def test_get_forecast_should_fetch_once_and_slice_date_ranges():
+    start = datetime(2023, 11, 10, tzinfo=timezone.utc)
+    client = ForecastClientMock(_forecast_response(start, 40))
+    weather_station = OWMWeatherStation(client=client)
+    location = Location(51.5074, 0.1278)
+
+    first_day = weather_station.get_forecast(location, start.date(), start.date())
+    two_days = weather_station.get_forecast(
+        location, start.date() + timedelta(days=1), start.date() + timedelta(days=2)
+    )
+    assert client.forecast_calls == 1
+
+    assert len(first_day) == 8
+    assert [state.temperature for _, state in first_day] == list(range(8))
+    assert len(two_days) == 16
+    assert [state.temperature for _, state in two_days] == list(range(8, 24))
+
+
+def test_get_forecast_should_fetch_again_once_expired():
+    client = ForecastClientMock(_forecast_response(datetime(2023, 11, 10), 40))
+    weather_station = OWMWeatherStation(client=client, forecast_ttl=0)
+    location = Location(51.5074, 0.1278)
+
+    weather_station.get_forecast(location, date(2023, 11, 10), date(2023, 11, 10))
+    weather_station.get_forecast(location, date(2023, 11, 10), date(2023, 11, 10))
+    assert client.forecast_calls == 2
+
+
+def test_get_forecast_should_fail_if_forecast_data_is_missing():
+    weather_station = OWMWeatherStation(client=ForecastClientMock({"city": {"timezone": 0}, "list": []}))
+    with pytest.raises(WeatherStationError):
+        weather_station.get_forecast(Location(51.5074, 0.1278), date(2023, 11, 10), date(2023, 11, 10))
+
+
 def _test_get_forecast_should_include_mandatory_data():
     # read api key from env variable
     api_key = os.environ.get("OPEN_WEATHER_MAP_API_KEY", None)
@@ -154,3 +320,88 @@ def _test_get_forecast_should_include_mandatory_data():
     print([str(d) for d in forecast.get_dates()])
     print(forecast.get_weather_states_for_date(date.today()))
     raise Exception("test not implemented")
+
+
+def _full_forecast_item(date_time: datetime, i: int) -> dict:
+    return {
+        "dt": int(date_time.timestamp()),
+        "main": {"temp": i, "humidity": 40, "feels_like": 21.5, "pressure": 1042},
+        "wind": {"speed": 3.5, "gust": 5, "deg": 10 * i},
+        "clouds": {"all": i},
+        "rain": {"3h": 0.5},
+        "snow": {"1h": 0.1, "3h": 0.2},
+    }
+
+
+def _parse_item_by_item(weather_station: OWMWeatherStation, client_data: dict) -> list:
+    states = []
+    for data in client_data["list"]:
+        date_time = weather_station._get_forecast_datetime(data, timezone(timedelta(hours=-3)))
+        states.append((date_time, weather_station._build_weather_state(data)))
+    return states
+
+
+def test_get_forecast_batch_parsing_should_match_item_by_item_parsing():
+    start = datetime(2023, 11, 10)
+    items = [_full_forecast_item(start + timedelta(hours=3 * i), i) for i in range(36)]
+    client_data = {"city": {"timezone": -3 * 3600}, "list": items}
+    weather_station = OWMWeatherStation(client=ForecastClientMock(client_data))
+
+    forecast = weather_station.get_forecast(Location(51.5074, 0.1278), date(2023, 11, 1), date(2023, 11, 30))
+    assert list(forecast) == _parse_item_by_item(weather_station, client_data)
+
+
+@pytest.mark.parametrize(
+    "invalid_item, error",
+    [
+        ({"main": {"temp": 1, "humidity": 40, "feels_like": 21}}, "pressure is mandatory"),
+        ({"main": {"temp": 1, "humidity": 140, "feels_like": 21, "pressure": 1}}, "humidity should be a value"),
+        (
+            {"main": {"temp": 1, "humidity": 40, "feels_like": 21, "pressure": 1}, "wind": {"deg": 400}},
+            "wind direction",
+        ),
+        ({"main": {"temp": 1, "humidity": 40, "feels_like": 21, "pressure": 1}}, "missing forecast date"),
+    ],
+)
+def test_get_forecast_batch_parsing_should_raise_the_item_by_item_errors(invalid_item, error):
+    start = datetime(2023, 11, 10)
+    items = [_full_forecast_item(start + timedelta(hours=3 * i), i) for i in range(8)]
+    if error != "missing forecast date":
+        invalid_item["dt"] = items[4]["dt"]
+    # The first invalid item, in payload order, is the one reported
+    items[4] = invalid_item
+    items[6]["main"].pop("temp")
+    weather_station = OWMWeatherStation(client=ForecastClientMock({"city": {"timezone": 0}, "list": items}))
+
+    with pytest.raises(WeatherStationError) as e:
+        weather_station.get_forecast(Location(51.5074, 0.1278), date(2023, 11, 10), date(2023, 11, 10))
+    assert error in str(e.value)
+
+
+def test_get_forecast_should_use_the_local_date_times_of_the_location():
+    # 2023-11-10 22:00 and 2023-11-11 01:00 UTC, both on 2023-11-10 at UTC-3
+    start = datetime(2023, 11, 10, 22, tzinfo=timezone.utc)
+    client_data = _forecast_response(start, 2)
+    client_data["city"]["timezone"] = -3 * 3600
+    weather_station = OWMWeatherStation(client=ForecastClientMock(client_data))
+
+    forecast = weather_station.get_forecast(Location(-34.6037, -58.3816), date(2023, 11, 10), date(2023, 11, 11))
+
+    local_timezone = timezone(timedelta(hours=-3))
+    assert forecast.get_dates() == [
+        datetime(2023, 11, 10, 19, tzinfo=local_timezone),
+        datetime(2023, 11, 10, 22, tzinfo=local_timezone),
+    ]
+    assert aggregate_daily(forecast) == [DailySummary(date(2023, 11, 10), 0, 1, 0.5, 0, 0, None, 2)]
+
+
+def test_get_forecast_should_fail_if_a_forecast_date_is_repeated():
+    start = datetime(2023, 11, 10, tzinfo=timezone.utc)
+    items = [_full_forecast_item(start + timedelta(hours=3 * i), i) for i in range(8)]
+    items[5]["dt"] = items[4]["dt"]
+    assert parse_forecast_items(items, timezone.utc) is None
+    weather_station = OWMWeatherStation(client=ForecastClientMock({"city": {"timezone": 0}, "list": items}))
+
+    with pytest.raises(WeatherStationError) as e:
+        weather_station.get_forecast(Location(51.5074, 0.1278), date(2023, 11, 10), date(2023, 11, 10))
+    assert "already exists" in str(e.value)
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from weather_companion.weather_station import (
+    Location,
+    OWMClient,
+    Priority,
+    RateLimitedError,
+    RateLimiter,
+    RetryPolicy,
+    request_priority,
+)
+
+from .test_resilience import ClockMock, ResponseMock, ScriptedTransportMock
+
+
+def test_rate_limiter_should_allow_a_burst_and_then_refill_at_the_quota_rate():
+    clock = ClockMock()
+    rate_limiter = RateLimiter(calls_per_minute=60, burst=2, clock=clock)
+
+    assert rate_limiter.acquire(timeout=0)
+    assert rate_limiter.acquire(timeout=0)
+    assert not rate_limiter.acquire(timeout=0)
+
+    clock.now += 1
+    assert rate_limiter.acquire(timeout=0)
+    assert not rate_limiter.acquire(timeout=0)
+
+
+def test_rate_limiter_should_not_give_tokens_while_paused():
+    clock = ClockMock()
+    rate_limiter = RateLimiter(calls_per_minute=60, burst=5, clock=clock)
+
+    rate_limiter.pause(10)
+    clock.now += 9
+    assert not rate_limiter.acquire(timeout=0)
+
+    clock.now += 2
+    assert rate_limiter.acquire(timeout=0)
+
+
+def test_rate_limiter_should_serve_waiters_by_priority():
+    rate_limiter = RateLimiter(calls_per_minute=600, burst=1)
+    assert rate_limiter.acquire()
+    served = []
+    lock = threading.Lock()
+
+    def acquire(priority: Priority) -> None:
+        rate_limiter.acquire(priority=priority)
+        with lock:
+            served.append(priority)
+
+    threads = [threading.Thread(target=acquire, args=(priority,)) for priority in reversed(Priority)]
+    for thread in threads:
+        thread.start()
+        # Waiters are queued in reverse priority order
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+
+    assert served == sorted(Priority)
+
+
+def test_rate_limiter_should_take_the_priority_from_the_context():
+    clock = ClockMock()
+    rate_limiter = RateLimiter(calls_per_minute=60, burst=1, clock=clock)
+
+    async def acquire_in_background() -> bool:
+        with request_priority(Priority.PREFETCH):
+            return await rate_limiter.acquire_async(timeout=0)
+
+    assert asyncio.run(acquire_in_background())
+    assert not asyncio.run(rate_limiter.acquire_async(timeout=0))
+
+
+def test_client_should_pause_the_rate_limiter_when_the_api_answers_429():
+    rate_limiter = RateLimiter(calls_per_minute=60, burst=5)
+    transport = ScriptedTransportMock(ResponseMock(429, {"cod": 429}, headers={"Retry-After": "30"}))
+    retry_policy = RetryPolicy(deadline=0.2, max_retries=2, base_delay=0, max_delay=0)
+    client = OWMClient(api_key="1234", transport=transport, retry_policy=retry_policy, rate_limiter=rate_limiter)
+
+    with pytest.raises(RateLimitedError):
+        client.get_current_state(Location(1, 1))
+
+    # The retry waited for the pause until the deadline, instead of calling the api again
+    assert transport.requests == 1
+    assert not rate_limiter.acquire(timeout=0)
+
+
+def test_rate_limiter_should_validate_the_quota():
+    with pytest.raises(ValueError):
+        RateLimiter(calls_per_minute=0)
@@ -0,0 +1,285 @@
+import asyncio
+
+import pytest
+
+from weather_companion.weather_station import (
+    AsyncHTTPTransport,
+    AsyncOWMClient,
+    CircuitBreaker,
+    CircuitOpenError,
+    ClientError,
+    HTTPTransport,
+    Location,
+    OWMClient,
+    OWMWeatherStation,
+    RateLimiter,
+    RetryBudget,
+    RetryPolicy,
+    WeatherStationError,
+)
+
+NO_BACKOFF = RetryPolicy(max_retries=2, base_delay=0, max_delay=0)
+
+
+class ClockMock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ResponseMock:
+    def __init__(self, status_code: int, body: dict = None, headers: dict = None) -> None:
+        self.status_code = status_code
+        self.text = str(body)
+        self.headers = headers if headers is not None else {}
+        self._body = body
+
+    def json(self) -> dict:
+        return self._body
+
+
+class ScriptedTransportMock(HTTPTransport):
+    """
+    Returns the scripted responses (or raises the scripted errors) in order, counts the requests
+    """
+
+    def __init__(self, *outcomes) -> None:
+        self.requests = 0
+        self._outcomes = list(outcomes)
+
+    def get(self, url: str, timeout: float = None) -> ResponseMock:
+        self.requests += 1
+        outcome = self._outcomes.pop(0) if len(self._outcomes) > 1 else self._outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def test_circuit_breaker_should_open_after_consecutive_failures_and_probe_after_reset_timeout():
+    clock = ClockMock()
+    circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+
+    circuit_breaker.record_failure()
+    assert circuit_breaker.allow_request()
+    circuit_breaker.record_failure()
+    assert circuit_breaker.state() == CircuitBreaker.OPEN
+    assert not circuit_breaker.allow_request()
+
+    clock.now += 30
+    assert circuit_breaker.allow_request()
+    assert circuit_breaker.state() == CircuitBreaker.HALF_OPEN
+    assert not circuit_breaker.allow_request()
+
+    circuit_breaker.record_success()
+    assert circuit_breaker.state() == CircuitBreaker.CLOSED
+
+
+def test_retry_budget_should_limit_retries():
+    retry_budget = RetryBudget(ratio=0.5, min_tokens=1)
+    assert retry_budget.withdraw()
+    assert not retry_budget.withdraw()
+    retry_budget.deposit()
+    retry_budget.deposit()
+    assert retry_budget.withdraw()
+
+
+def test_client_should_retry_server_errors_and_timeouts():
+    transport = ScriptedTransportMock(ResponseMock(503), TimeoutError("read timeout"), ResponseMock(200, {"main": {}}))
+    client = OWMClient(api_key="key", transport=transport, retry_policy=NO_BACKOFF)
+
+    assert client.get_current_state(Location(10, 10)) == {"main": {}}
+    assert transport.requests == 3
+
+
+def test_client_should_not_retry_client_errors():
+    transport = ScriptedTransportMock(ResponseMock(401))
+    client = OWMClient(api_key="key", transport=transport, retry_policy=NO_BACKOFF)
+
+    with pytest.raises(ClientError):
+        client.get_current_state(Location(10, 10))
+    assert transport.requests == 1
+
+
+def test_client_should_stop_retrying_when_budget_is_exhausted():
+    transport = ScriptedTransportMock(ResponseMock(500))
+    client = OWMClient(
+        api_key="key", transport=transport, retry_policy=NO_BACKOFF, retry_budget=RetryBudget(ratio=0, min_tokens=1)
+    )
+
+    with pytest.raises(ClientError):
+        client.get_current_state(Location(10, 10))
+    assert transport.requests == 2
+
+
+def test_client_should_fail_fast_while_circuit_is_open():
+    transport = ScriptedTransportMock(ResponseMock(500))
+    client = OWMClient(
+        api_key="key",
+        transport=transport,
+        retry_policy=NO_BACKOFF,
+        circuit_breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60),
+    )
+    weather_station = OWMWeatherStation(client=client)
+
+    with pytest.raises(WeatherStationError):
+        weather_station.get_current_state(Location(10, 10))
+    assert transport.requests == 3
+
+    with pytest.raises(CircuitOpenError):
+        client.get_current_state(Location(10, 10))
+    with pytest.raises(WeatherStationError):
+        weather_station.get_current_state(Location(10, 10))
+    assert transport.requests == 3
+
+
+def test_retry_budget_should_refill_with_time_at_low_traffic():
+    clock = ClockMock()
+    retry_budget = RetryBudget(ratio=0.1, min_tokens=2, refill_rate=0.5, clock=clock)
+    assert retry_budget.withdraw()
+    assert retry_budget.withdraw()
+    assert not retry_budget.withdraw()
+
+    clock.now += 2
+    assert retry_budget.withdraw()
+    assert not retry_budget.withdraw()
+
+    # Time only refills up to min_tokens
+    clock.now += 3600
+    assert retry_budget.withdraw()
+    assert retry_budget.withdraw()
+    assert not retry_budget.withdraw()
+
+
+class HangingTransportMock(AsyncHTTPTransport):
+    """
+    Never answers, the requests wait until they are cancelled
+    """
+
+    def __init__(self) -> None:
+        self.requests = 0
+
+    async def get(self, url: str, timeout: float = None) -> ResponseMock:
+        self.requests += 1
+        await asyncio.Event().wait()
+
+
+def test_circuit_breaker_should_replace_a_cancelled_probe_after_reset_timeout():
+    clock = ClockMock()
+    circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    circuit_breaker.record_failure()
+    clock.now += 30
+    client = AsyncOWMClient(
+        api_key="test", transport=HangingTransportMock(), retry_policy=NO_BACKOFF, circuit_breaker=circuit_breaker
+    )
+
+    async def cancel_probe():
+        probe = asyncio.ensure_future(client.get_current_state(Location(10, 20)))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(cancel_probe())
+
+    clock.now += 30
+    assert circuit_breaker.allow_request()
+    assert circuit_breaker.state() == CircuitBreaker.HALF_OPEN
+    assert not circuit_breaker.allow_request()
+
+
+def test_circuit_breaker_should_only_release_the_probe_to_its_holder():
+    clock = ClockMock()
+    circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    closed_admission = circuit_breaker.allow_request()
+    circuit_breaker.record_failure()
+    clock.now += 30
+    lost_probe = circuit_breaker.allow_request()
+    clock.now += 30
+    probe = circuit_breaker.allow_request()
+
+    # A request admitted while closed, or a replaced probe, do not release the probe in flight
+    circuit_breaker.release_probe(closed_admission)
+    circuit_breaker.release_probe(lost_probe)
+    assert not circuit_breaker.allow_request()
+
+    circuit_breaker.release_probe(probe)
+    assert circuit_breaker.allow_request()
+    assert not circuit_breaker.allow_request()
+
+
+def test_circuit_breaker_should_not_admit_a_second_probe_when_an_older_call_fails():
+    clock = ClockMock()
+    circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    client = AsyncOWMClient(
+        api_key="test", transport=HangingTransportMock(), retry_policy=NO_BACKOFF, circuit_breaker=circuit_breaker
+    )
+
+    async def cancel_older_call():
+        # Admitted while the circuit is closed
+        older_call = asyncio.ensure_future(client.get_current_state(Location(10, 20)))
+        await asyncio.sleep(0.01)
+        circuit_breaker.record_failure()
+        clock.now += 30
+        assert circuit_breaker.allow_request()
+        older_call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await older_call
+
+    asyncio.run(cancel_older_call())
+
+    assert circuit_breaker.state() == CircuitBreaker.HALF_OPEN
+    assert not circuit_breaker.allow_request()
+
+
+def test_circuit_breaker_should_close_when_the_probe_is_rate_limited():
+    clock = ClockMock()
+    circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1, clock=clock)
+    transport = ScriptedTransportMock(ResponseMock(500), ResponseMock(429, headers={"Retry-After": "0"}))
+    client = OWMClient(
+        api_key="key", transport=transport, retry_policy=RetryPolicy(max_retries=0), circuit_breaker=circuit_breaker
+    )
+
+    with pytest.raises(ClientError):
+        client.get_current_state(Location(10, 10))
+    assert circuit_breaker.state() == CircuitBreaker.OPEN
+
+    clock.now += 1
+    with pytest.raises(ClientError):
+        client.get_current_state(Location(10, 10))
+    # A 429 answer proves the upstream is alive
+    assert circuit_breaker.state() == CircuitBreaker.CLOSED
+    clock.now = 2000
+    assert circuit_breaker.allow_request()
+
+
+class ExhaustedRateLimiterMock(RateLimiter):
+    def __init__(self) -> None:
+        super().__init__(calls_per_minute=1)
+
+    def acquire(self, priority=None, timeout: float = None) -> bool:
+        return False
+
+
+def test_circuit_breaker_should_probe_again_when_the_probe_finds_the_quota_exhausted():
+    clock = ClockMock()
+    circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1, clock=clock)
+    transport = ScriptedTransportMock(ResponseMock(200, {"main": {}}))
+    client = OWMClient(
+        api_key="key",
+        transport=transport,
+        retry_policy=RetryPolicy(max_retries=0),
+        circuit_breaker=circuit_breaker,
+        rate_limiter=ExhaustedRateLimiterMock(),
+    )
+    circuit_breaker.record_failure()
+    clock.now += 1
+
+    with pytest.raises(ClientError):
+        client.get_current_state(Location(10, 10))
+    assert transport.requests == 0
+
+    # The probe never reached the upstream, the next call probes at once
+    assert circuit_breaker.allow_request()
+    assert not circuit_breaker.allow_request()
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from weather_companion.weather_station import AsyncSingleFlight, SingleFlight
+
+
+class BlockingFetchMock:
+    """
+    Counts the calls, each call blocks until release is set
+    """
+
+    def __init__(self, error: Exception = None) -> None:
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self._error = error
+
+    def __call__(self, value):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(timeout=5)
+        if self._error:
+            raise self._error
+        return value
+
+
+def _call_all_at_once(executor: ThreadPoolExecutor, n_calls: int, function, *args):
+    barrier = threading.Barrier(n_calls)
+
+    def call():
+        barrier.wait(timeout=5)
+        return function(*args)
+
+    return [executor.submit(call) for _ in range(n_calls)]
+
+
+def test_concurrent_calls_with_same_key_should_share_one_call():
+    single_flight = SingleFlight()
+    fetch = BlockingFetchMock()
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        futures = _call_all_at_once(executor, 10, single_flight.do, "key", fetch, "result")
+        fetch.started.wait(timeout=5)
+        # Give the waiters time to block on the call in flight
+        threading.Event().wait(0.1)
+        fetch.release.set()
+        results = [future.result() for future in futures]
+
+    assert results == ["result"] * 10
+    assert fetch.calls == 1
+    assert single_flight.in_flight() == 0
+
+
+def test_errors_should_be_raised_to_every_waiter():
+    single_flight = SingleFlight()
+    fetch = BlockingFetchMock(error=ValueError("upstream error"))
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = _call_all_at_once(executor, 5, single_flight.do, "key", fetch, "result")
+        fetch.started.wait(timeout=5)
+        threading.Event().wait(0.1)
+        fetch.release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+
+    assert fetch.calls == 1
+
+
+def test_calls_should_not_be_shared_once_finished():
+    single_flight = SingleFlight()
+    fetch = BlockingFetchMock()
+    fetch.release.set()
+
+    single_flight.do("key", fetch, 1)
+    single_flight.do("key", fetch, 2)
+    assert fetch.calls == 2
+
+
+def test_async_concurrent_calls_with_same_key_should_share_one_call():
+    single_flight = AsyncSingleFlight()
+    calls = []
+
+    async def fetch(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def run():
+        first = await asyncio.gather(*[single_flight.do("a", fetch, "a") for _ in range(10)])
+        second = await asyncio.gather(single_flight.do("b", fetch, "b"), single_flight.do("c", fetch, "c"))
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == ["a"] * 10
+    assert second == ["b", "c"]
+    assert calls == ["a", "b", "c"]
+    assert single_flight.in_flight() == 0
+
+
+def test_async_errors_should_be_raised_to_every_waiter():
+    single_flight = AsyncSingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream error")
+
+    async def run():
+        return await asyncio.gather(*[single_flight.do("key", fetch) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
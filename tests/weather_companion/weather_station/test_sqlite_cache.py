@@ -0,0 +1,83 @@
+from datetime import date
+
+from weather_companion.weather_station import (
+    CachingWeatherStation,
+    Location,
+    SQLiteWeatherCache,
+    WeatherState,
+    WeatherStation,
+)
+from weather_companion.weather_station.sqlite_cache import EVICTION_INTERVAL
+
+WEATHER_STATE = WeatherState(temperature=10, humidity=20, feels_like=11, pressure=1024, rain_1h=0.5)
+
+
+class ClockMock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingWeatherStationMock(WeatherStation):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def get_current_state(self, location: Location) -> WeatherState:
+        self.calls += 1
+        return WEATHER_STATE
+
+
+def test_should_share_entries_between_caches_on_the_same_file(tmp_path):
+    path = str(tmp_path / "weather_cache.db")
+    first_worker_cache = SQLiteWeatherCache(path)
+    second_worker_cache = SQLiteWeatherCache(path)
+
+    first_worker_cache.set("key", WEATHER_STATE, ttl=60)
+    assert second_worker_cache.get("key") == WEATHER_STATE
+    assert second_worker_cache.get("other key") is None
+    assert second_worker_cache.stats().hits == 1
+    assert second_worker_cache.stats().misses == 1
+
+
+def test_one_worker_fetch_should_serve_the_others(tmp_path):
+    path = str(tmp_path / "weather_cache.db")
+    inner_station = CountingWeatherStationMock()
+    first_worker = CachingWeatherStation(weather_station=inner_station, cache=SQLiteWeatherCache(path))
+    second_worker = CachingWeatherStation(weather_station=inner_station, cache=SQLiteWeatherCache(path))
+
+    assert first_worker.get_current_state(Location(10, 10)) == WEATHER_STATE
+    assert second_worker.get_current_state(Location(10, 10)) == WEATHER_STATE
+    assert inner_station.calls == 1
+
+
+def test_should_expire_and_keep_stale_entries(tmp_path):
+    clock = ClockMock()
+    cache = SQLiteWeatherCache(str(tmp_path / "weather_cache.db"), clock=clock)
+
+    cache.set("key", WEATHER_STATE, ttl=60, stale_ttl=30)
+    clock.now += 70
+    assert cache.get("key") is None
+    entry = cache.get_entry("key")
+    assert entry.value == WEATHER_STATE
+    assert entry.expires_in == -10
+
+    clock.now += 20
+    assert cache.get_entry("key") is None
+
+
+def test_should_evict_least_recently_used_entries(tmp_path):
+    clock = ClockMock()
+    cache = SQLiteWeatherCache(str(tmp_path / "weather_cache.db"), max_size=10, clock=clock)
+
+    cache.set("recently used", date(2023, 1, 1), ttl=600)
+    for i in range(EVICTION_INTERVAL - 1):
+        clock.now += 1
+        cache.get("recently used")
+        cache.set(f"key {i}", i, ttl=600)
+
+    assert cache.stats().size == 10
+    assert cache.stats().evictions == EVICTION_INTERVAL - 10
+    assert cache.get("recently used") == date(2023, 1, 1)
+    assert cache.get("key 0") is None